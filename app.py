@@ -1,15 +1,34 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime, timedelta
+import numpy as np
+from datetime import datetime
 import io
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.base import MIMEBase
-from email import encoders
-import subprocess
-import platform
-import base64
+import os
+import tempfile
+
+# Only what the page needs before any upload is imported here; the comparison,
+# export and email modules are imported where they are first used
+from po_compare.alerts import ALERT_FLAG, ALERT_THRESHOLD_DAYS, RULE_FIELDS, RULE_THRESHOLDS, AlertRules
+from po_compare.parsing import EXCEL_ENGINES, SCHEMA_VERSION, read_po_file, resolve_excel_engine
+
+# Changes with read_po_file's output so cached frames are not reused
+PARSE_CACHE_VERSION = SCHEMA_VERSION
+
+# Everything besides the two input files, duplicate policy and alert rules that changes compare_po_lines output
+COMPARE_SETTINGS = ('v3', ALERT_THRESHOLD_DAYS)
+
+# How a PO line repeated within one week is matched (see compare_po_lines);
+# the keys are po_compare.diff.DUPLICATE_POLICIES, in the same order
+DUPLICATE_LABELS = {
+    'first': "First row in the file",
+    'earliest': "Earliest ComDate",
+    'latest': "Latest ComDate",
+    'all': "Every schedule line"
+}
+
+WEEKLY_MODE = "Weekly comparison (2 files)"
+UPLOAD_BASELINE = "Upload a file"
+TIMELINE_MODE = "Multi-week timeline (N files)"
 
 # Page configuration
 st.set_page_config(
@@ -18,6 +37,27 @@ st.set_page_config(
     layout="wide"
 )
 
+
+@st.cache_resource
+def start_prewarm():
+    """Load the reader, diff engine and writers in the background, once per server process
+
+    The first upload then does not wait for openpyxl/calamine imports and
+    pandas' first-call setup. Set PO_COMPARE_PREWARM=0 to turn it off.
+    """
+    if os.environ.get('PO_COMPARE_PREWARM', '1') == '0':
+        return None
+    import threading
+
+    from po_compare.warmup import prewarm
+
+    thread = threading.Thread(target=prewarm, name='po-compare-prewarm', daemon=True)
+    thread.start()
+    return thread
+
+
+start_prewarm()
+
 st.title("📊 PO Line Comparison Tool")
 st.markdown("Upload two Excel files to compare PO lines between previous week and current week")
 
@@ -60,266 +100,504 @@ with st.sidebar:
             st.success("✅ **No password required!**\n\nWill create a draft in Outlook with the attachment. You can review and send.")
         elif ".eml" in email_method:
             st.success("✅ **No password required!**\n\nWill download a .eml file that you can open in any email client (Outlook, Mail, Gmail, etc.)")
+    
+    st.header("📂 File Reading")
+    excel_engine = st.selectbox(
+        "Excel reader",
+        options=EXCEL_ENGINES,
+        help="'auto' uses the fast calamine reader when installed (pip install python-calamine), otherwise openpyxl/xlrd"
+    )
 
-# File uploaders
-col1, col2 = st.columns(2)
+mode = st.radio(
+    "Mode",
+    options=[WEEKLY_MODE, TIMELINE_MODE],
+    horizontal=True,
+    help="Timeline mode compares any number of weekly snapshots in one pass"
+)
 
-with col1:
-    st.subheader("Previous Week File")
-    prev_week_file = st.file_uploader(
-        "Upload previous week Excel file",
-        type=['xlsx', 'xls'],
-        key='prev_week'
+with st.sidebar:
+    # The timeline keeps one row per line, so 'all' is weekly-only
+    duplicate_policy = st.selectbox(
+        "Repeated PO lines",
+        options=[policy for policy in DUPLICATE_LABELS if mode == WEEKLY_MODE or policy != 'all'],
+        format_func=DUPLICATE_LABELS.get,
+        help="Which row is compared when a PO line appears more than once in a week (schedule lines)"
     )
 
-with col2:
-    st.subheader("Current Week File")
-    curr_week_file = st.file_uploader(
-        "Upload current week Excel file",
+
+def default_alert_rules():
+    """Rules from the JSON file in PO_COMPARE_ALERT_RULES, or the built-in 'pushed > 7 days' rule"""
+    path = os.environ.get('PO_COMPARE_ALERT_RULES')
+    if path:
+        try:
+            return AlertRules.from_file(path).rules
+        except (OSError, ValueError) as e:
+            st.sidebar.warning(f"⚠️ Could not load alert rules from {path}: {str(e)}")
+    return AlertRules().rules
+
+
+def rules_from_editor(rules_df):
+    """Rule dicts from the editor's rows, leaving out empty cells and empty rows"""
+    rules = []
+    for row in rules_df.to_dict('records'):
+        rule = {field: value for field, value in row.items() if pd.notna(value) and str(value).strip() != ''}
+        if rule:
+            rules.append(rule)
+    return rules
+
+
+with st.sidebar:
+    with st.expander("🚨 Alert rules"):
+        st.caption("A line gets an alert when every condition set in a row holds; "
+                   "Alert_Rule names the first row that matched. Push count and "
+                   "cumulative days need the push history.")
+        # Explicit dtypes: a column left empty in every rule would otherwise be float and not editable as text
+        rules_df = pd.DataFrame(default_alert_rules(), columns=RULE_FIELDS).astype(
+            {field: 'string' if field not in RULE_THRESHOLDS else float for field in RULE_FIELDS}
+        )
+        edited_rules = st.data_editor(
+            rules_df,
+            num_rows='dynamic',
+            hide_index=True,
+            key='alert_rules',
+            column_config={
+                'name': st.column_config.TextColumn("Name"),
+                'po_type': st.column_config.TextColumn("PO types", help="Comma-separated; empty = all"),
+                'pn_pattern': st.column_config.TextColumn("PN regex", help="Empty = all parts"),
+                'days_pushed_over': st.column_config.NumberColumn("Pushed > days"),
+                'pulled_in_over': st.column_config.NumberColumn("Pulled in > days"),
+                'push_count_at_least': st.column_config.NumberColumn("Pushes ≥"),
+                'cum_days_over': st.column_config.NumberColumn("Cum. days >")
+            }
+        )
+    try:
+        alert_rules = AlertRules(rules_from_editor(edited_rules))
+    except ValueError as e:
+        st.error(f"Invalid alert rules, using the default: {str(e)}")
+        alert_rules = AlertRules()
+
+# Cache key part for everything the sidebar changes about the comparison
+compare_settings = COMPARE_SETTINGS + (duplicate_policy, alert_rules.key())
+
+@st.cache_resource
+def get_baseline_store():
+    """Stored weekly snapshots, or None when they cannot be kept (no pyarrow, unwritable dir)
+
+    Set PO_COMPARE_BASELINE_DIR to keep them somewhere other than baselines/
+    next to app.py, and PO_COMPARE_BASELINE_KEEP to change how many are kept.
+    """
+    from po_compare.baseline import BaselineStore
+
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    try:
+        return BaselineStore(
+            os.environ.get('PO_COMPARE_BASELINE_DIR', os.path.join(app_dir, 'baselines')),
+            keep=int(os.environ.get('PO_COMPARE_BASELINE_KEEP', '12'))
+        )
+    except (ImportError, OSError):
+        return None
+
+
+# File uploaders
+prev_week_file = curr_week_file = None
+baseline_digest = None
+snapshot_files = []
+
+if mode == TIMELINE_MODE:
+    st.subheader("Weekly Snapshots")
+    snapshot_files = st.file_uploader(
+        "Upload two or more weekly Excel files (ordered by file name, oldest first)",
         type=['xlsx', 'xls'],
-        key='curr_week'
+        accept_multiple_files=True,
+        key='snapshots'
     )
+else:
+    col1, col2 = st.columns(2)
+    
+    with col2:
+        st.subheader("Current Week File")
+        curr_week_file = st.file_uploader(
+            "Upload current week Excel file",
+            type=['xlsx', 'xls'],
+            key='curr_week'
+        )
+    
+    with col1:
+        st.subheader("Previous Week File")
+        # Stored weeks other than the current upload; the newest is the default baseline
+        from po_compare.cache import content_hash
+
+        baseline_store = get_baseline_store()
+        curr_upload_digest = content_hash(curr_week_file.getvalue()) if curr_week_file else None
+        baselines = {
+            entry['digest']: f"{entry['name']} (saved {entry['saved_at'][:16].replace('T', ' ')}, {entry['rows']} lines)"
+            for entry in (baseline_store.snapshots() if baseline_store else [])
+            if entry['digest'] != curr_upload_digest
+        }
+        if baselines:
+            # Keep showing the uploader while it holds a file
+            baseline_choice = st.selectbox(
+                "Compare against",
+                options=list(baselines) + [UPLOAD_BASELINE],
+                index=len(baselines) if st.session_state.get('prev_week') is not None else 0,
+                format_func=lambda choice: baselines.get(choice, choice),
+                help="Weeks you uploaded before are stored, so only the new week has to be uploaded"
+            )
+            if baseline_choice != UPLOAD_BASELINE:
+                baseline_digest = baseline_choice
+        if baseline_digest is None:
+            prev_week_file = st.file_uploader(
+                "Upload previous week Excel file",
+                type=['xlsx', 'xls'],
+                key='prev_week'
+            )
 
 
-def parse_excel_file(file):
-    """Parse Excel file and return DataFrame with standardized column names"""
+def parse_excel_file(file, engine='auto'):
+    """Parse Excel file and return DataFrame with standardized column names
+
+    ``engine`` is one of EXCEL_ENGINES; 'auto' uses the fast calamine reader
+    when it is installed.
+    """
     try:
-        df = pd.read_excel(file)
-        
-        # Map columns to standardized names
-        column_mapping = {
-            'Purch.doc.': 'PO_No',
-            'Item': 'PO_Line',
-            'Short text': 'PN',
-            'Order': 'PWO',
-            'Type': 'PO_Type',
-            'ComDate': 'ComDate'
-        }
+        read_engine = resolve_excel_engine(engine, getattr(file, 'name', ''))
+        if engine == 'calamine' and read_engine != 'calamine':
+            st.warning("⚠️ Fast reader not installed (pip install python-calamine), using " + read_engine)
         
-        # Rename columns if they exist
-        df.rename(columns=column_mapping, inplace=True)
+        df, missing_cols = read_po_file(file, engine=engine)
         
         # Check for required columns
-        required_cols = ['PO_No', 'PO_Line', 'PN', 'ComDate']
-        missing_cols = [col for col in required_cols if col not in df.columns]
         if missing_cols:
             st.warning(f"⚠️ Missing columns after mapping: {', '.join(missing_cols)}")
             st.info("Please ensure your Excel has: Purch.doc., Item, Short text, Order, Type, ComDate")
         
-        # Ensure ComDate is datetime
-        if 'ComDate' in df.columns:
-            df['ComDate'] = pd.to_datetime(df['ComDate'], errors='coerce')
-        
-        # Create unique identifier for each PO line
-        if 'PO_No' in df.columns and 'PO_Line' in df.columns:
-            df['PO_LineID'] = df['PO_No'].astype(str) + '_' + df['PO_Line'].astype(str)
-        
         return df
     except Exception as e:
         st.error(f"Error parsing file: {str(e)}")
         return None
 
 
-def compare_po_lines(prev_df, curr_df):
-    """Compare PO lines between two weeks and identify changes"""
-    
-    results = []
-    
-    # Get unique PO line IDs from both datasets
-    prev_lines = set(prev_df['PO_LineID'].unique())
-    curr_lines = set(curr_df['PO_LineID'].unique())
-    
-    # Lines that exist in both weeks
-    common_lines = prev_lines.intersection(curr_lines)
+@st.cache_resource
+def get_parse_cache():
+    """Process-wide parse cache shared by all sessions
+
+    Set PO_COMPARE_CACHE_DIR to enable the on-disk tier (Parquet) and
+    PO_COMPARE_CACHE_MAX_MB to cap its size.
+    """
+    from po_compare.cache import ParseCache
+
+    return ParseCache(
+        max_entries=8,
+        disk_dir=os.environ.get('PO_COMPARE_CACHE_DIR'),
+        disk_max_bytes=int(os.environ.get('PO_COMPARE_CACHE_MAX_MB', '2048')) * 1024 ** 2
+    )
+
+
+@st.cache_resource
+def get_comparison_cache():
+    """Process-wide cache of comparison results and exports per file pair"""
+    from po_compare.cache import ComparisonCache
+
+    return ComparisonCache(max_entries=8)
+
+
+@st.cache_resource
+def get_email_dispatcher(smtp_server, smtp_port, from_email, password):
+    """Background SMTP sender shared by all sessions using the same account"""
+    from po_compare.dispatch import EmailDispatcher
+
+    return EmailDispatcher(smtp_server, smtp_port, from_email, password)
+
+
+@st.cache_resource
+def get_history_store():
+    """Push-history store (SQLite), imported once from po_history.json if present
+
+    Set PO_HISTORY_DB to store the history somewhere other than next to app.py.
+    """
+    from po_compare.history import HistoryStore
+
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    store = HistoryStore(os.environ.get('PO_HISTORY_DB', os.path.join(app_dir, 'po_history.db')))
+    legacy_json = os.path.join(app_dir, 'po_history.json')
+    if store.is_empty() and os.path.exists(legacy_json):
+        store.import_legacy_json(legacy_json)
+    return store
+
+
+def run_comparison(prev_df, curr_df, prev_digest, curr_digest, incremental=False, duplicates='first',
+                   alert_rules=None):
+    """Compare two weeks against the push history, record the pushes found and the run in the change feed
+
+    Called once per comparison cache miss. ``incremental`` diffs only the
+    POs that changed since a stored baseline; ``duplicates`` is the policy
+    for repeated PO lines.
+    """
+    from po_compare.baseline import compare_incremental
+    from po_compare.diff import compare_po_lines
+    from po_compare.history import pair_run_id
+
+    run_id = pair_run_id(prev_digest, curr_digest)
+    compare = compare_incremental if incremental else compare_po_lines
+    try:
+        history = get_history_store()
+    except Exception as e:
+        st.warning(f"⚠️ Push history unavailable, re-pushes are estimated: {str(e)}")
+        history = None
+        results_df = compare(prev_df, curr_df, duplicates=duplicates, alert_rules=alert_rules)
+    else:
+        results_df = compare(prev_df, curr_df, history=history, run_id=run_id, duplicates=duplicates,
+                             alert_rules=alert_rules)
+        try:
+            history.record_run(results_df, run_id)
+        except Exception as e:
+            st.warning(f"⚠️ Could not record push history: {str(e)}")
     
-    # Lines only in current week (new lines)
-    new_lines = curr_lines - prev_lines
+    append_to_change_feed(results_df, run_id, duplicates, alert_rules, push_history=history is not None)
+    return results_df
+
+
+def append_to_change_feed(results_df, run_id, duplicates, alert_rules, push_history):
+    """Write the run to the change feed in PO_COMPARE_FEED_DIR, if set (see po_compare.changefeed)
+
+    The feed's run ID includes the settings, so other alert rules or another
+    duplicate policy add a new run; the same run recomputed (an evicted cache
+    entry, another session) is already in the feed and is not written again.
+    """
+    feed_dir = os.environ.get('PO_COMPARE_FEED_DIR')
+    if not feed_dir:
+        return
+    from po_compare.changefeed import feed_run_id, recorded_runs, run_settings, write_change_feed
+
+    settings = run_settings(duplicates, alert_rules, push_history)
+    feed_run = feed_run_id(run_id, settings)
+    try:
+        recorded = recorded_runs(feed_dir).get(feed_run)
+        if recorded:
+            st.info(f"ℹ️ This run is already in the change feed (written {recorded['run_date']})")
+        else:
+            write_change_feed(results_df, feed_dir, feed_run, settings=settings)
+    except Exception as e:
+        st.warning(f"⚠️ Could not write the change feed: {str(e)}")
+
+
+def parse_uploaded_file(uploaded_file, engine='auto'):
+    """Parse an uploaded file through the content-addressed parse cache
+
+    Returns the parsed DataFrame (or None) and the file's content hash.
+    """
+    from po_compare.cache import content_hash
+
+    data = uploaded_file.getvalue()
+    digest = content_hash(data)
     
-    # Check for pushed lines
-    pushed_count = 0
-    for line_id in common_lines:
-        prev_line = prev_df[prev_df['PO_LineID'] == line_id].iloc[0]
-        curr_line = curr_df[curr_df['PO_LineID'] == line_id].iloc[0]
-        
-        # Check if ComDate changed
-        if pd.notna(prev_line['ComDate']) and pd.notna(curr_line['ComDate']):
-            # Check if date changed at all (pushed OR pulled back)
-            if curr_line['ComDate'] != prev_line['ComDate']:
-                days_pushed = (curr_line['ComDate'] - prev_line['ComDate']).days
-                
-                result = {
-                    'PO_No': curr_line['PO_No'],
-                    'PO_Line': curr_line['PO_Line'],
-                    'PN': curr_line['PN'] if 'PN' in curr_line else '',
-                    'PWO': curr_line['PWO'] if 'PWO' in curr_line else '',
-                    'PO_Type': curr_line['PO_Type'] if 'PO_Type' in curr_line else '',
-                    'Prev_ComDate': prev_line['ComDate'],
-                    'Curr_ComDate': curr_line['ComDate'],
-                    'Days_Pushed': days_pushed,
-                    'Status': 'Pushed' if days_pushed > 0 else 'Pulled Back',
-                    'Alert': '🚨 ALERT' if days_pushed > 7 else ''
-                }
-                results.append(result)
-                if days_pushed > 0:
-                    pushed_count += 1
+    def parse():
+        buffer = io.BytesIO(data)
+        buffer.name = uploaded_file.name
+        return parse_excel_file(buffer, engine=engine)
     
-    # Check for split lines (same PO but multiple lines in current vs previous)
-    split_count = 0
-    if 'PN' in prev_df.columns and 'PN' in curr_df.columns:
-        for po_no in prev_df['PO_No'].unique():
-            prev_po_lines = prev_df[prev_df['PO_No'] == po_no]
-            curr_po_lines = curr_df[curr_df['PO_No'] == po_no]
-            
-            if len(curr_po_lines) > len(prev_po_lines):
-                # Check if it's a split (same PN but more lines)
-                prev_pns = set(prev_po_lines['PN'].unique())
-                curr_pns = set(curr_po_lines['PN'].unique())
-                
-                if prev_pns.intersection(curr_pns):  # Same part numbers exist
-                    for _, curr_line in curr_po_lines.iterrows():
-                        if curr_line['PO_LineID'] in new_lines:
-                            result = {
-                                'PO_No': curr_line['PO_No'],
-                                'PO_Line': curr_line['PO_Line'],
-                                'PN': curr_line['PN'] if 'PN' in curr_line else '',
-                                'PWO': curr_line['PWO'] if 'PWO' in curr_line else '',
-                                'PO_Type': curr_line['PO_Type'] if 'PO_Type' in curr_line else '',
-                                'Prev_ComDate': None,
-                                'Curr_ComDate': curr_line['ComDate'] if 'ComDate' in curr_line else None,
-                                'Days_Pushed': 0,
-                                'Status': 'Split',
-                                'Alert': ''
-                            }
-                            results.append(result)
-                            split_count += 1
+    df = get_parse_cache().get_or_parse(data, parse, version=PARSE_CACHE_VERSION, digest=digest)
+    return df, digest
+
+
+def load_baseline(digest):
+    """Parsed frame of a stored week, kept in the parse cache under its file's digest"""
+    return get_parse_cache().get_or_parse(
+        None, lambda: get_baseline_store().load(digest), version=PARSE_CACHE_VERSION, digest=digest
+    )
+
+
+def store_baseline(df, digest, name):
+    """Keep a parsed week for later comparisons; a failure only costs the re-upload"""
+    store = get_baseline_store()
+    if store is None:
+        return
+    try:
+        store.save(df, digest, name)
+    except OSError as e:
+        st.warning(f"⚠️ Could not store {name} as a baseline: {str(e)}")
+
+
+def configured_workers():
+    """Worker processes for parsing and email building: PO_COMPARE_WORKERS, or None for the CPU count"""
+    return int(os.environ['PO_COMPARE_WORKERS']) if os.environ.get('PO_COMPARE_WORKERS') else None
+
+
+def run_timeline(files, engine='auto', duplicates='first', alert_rules=None):
+    """Parse weekly snapshots in parallel and return (changes, trajectories, lines tracked)
+
+    Files are ordered by name; PO_COMPARE_WORKERS caps the parser processes.
+    """
+    from po_compare.timeline import build_timeline, parse_snapshots, push_trajectories, timeline_changes
+
+    files = sorted(files, key=lambda f: f.name)
+    parsed = parse_snapshots([(f.name, f.getvalue()) for f in files], engine=engine, max_workers=configured_workers())
     
-    # Check for re-pushed lines (pushed multiple times)
-    # Track if a line was pushed in previous comparisons (this would need historical data)
-    # For now, we'll mark lines pushed >7 days as potentially re-pushed
-    for result in results:
-        if result['Status'] == 'Pushed' and result['Days_Pushed'] > 7:
-            # This could indicate multiple pushes
-            result['Status'] = 'Re-Pushed (>7 days)'
+    for f, (df, missing_cols) in zip(files, parsed):
+        if missing_cols:
+            raise ValueError(f"{f.name} is missing columns after mapping: {', '.join(missing_cols)}")
     
-    return pd.DataFrame(results)
+    timeline_df = build_timeline([df for df, _ in parsed], labels=[f.name for f in files], duplicates=duplicates)
+    changes_df = timeline_changes(timeline_df, alert_rules=alert_rules)
+    return changes_df, push_trajectories(timeline_df, changes_df), timeline_df['PO_LineID'].nunique()
+
+
+PAGE_SIZES = [50, 100, 250, 500, 1000]
+FILE_ORDER = "(file order)"
+
+
+def fan_out(df, column, routes, default, filename, eml):
+    """Split results by the routing table and build every recipient's email; returns (messages, unrouted)"""
+    from po_compare.fanout import build_messages, partition_results
+
+    partitions, unrouted = partition_results(df, column, routes, default=default)
+    return build_messages(partitions, filename, eml=eml, max_workers=configured_workers()), unrouted
+
+
+def highlight_rows(df):
+    """Row background colours for the whole frame at once: red for alerts, yellow for splits"""
+    colors = np.where(
+        df['Alert'] == ALERT_FLAG, 'background-color: #ffcccc',
+        np.where(df['Status'] == 'Split', 'background-color: #ffffcc', '')
+    )
+    return pd.DataFrame(np.repeat(colors[:, None], df.shape[1], axis=1), index=df.index, columns=df.columns)
 
 
 def style_dataframe(df):
     """Apply styling to the results dataframe"""
-    def highlight_alerts(row):
-        if row['Alert'] == '🚨 ALERT':
-            return ['background-color: #ffcccc'] * len(row)
-        elif row['Status'] == 'Split':
-            return ['background-color: #ffffcc'] * len(row)
-        else:
-            return [''] * len(row)
+    return df.style.apply(highlight_rows, axis=None)
+
+
+def show_paged_table(df, key, height=500):
+    """Show one sorted page of ``df``; only that page is styled and sent to the browser"""
+    col1, col2, col3, col4 = st.columns([3, 2, 2, 2])
+    with col1:
+        sort_by = st.selectbox("Sort by", [FILE_ORDER] + list(df.columns), key=f"{key}_sort_by")
+    with col2:
+        descending = st.selectbox("Order", ["Ascending", "Descending"], key=f"{key}_order") == "Descending"
+    with col3:
+        page_size = st.selectbox("Rows per page", PAGE_SIZES, index=1, key=f"{key}_page_size")
+    
+    page_count = max(1, -(-len(df) // page_size))
+    with col4:
+        # Keyed on the page count, so a filter that shrinks the table starts again at page 1
+        page = st.number_input(
+            f"Page (of {page_count})", min_value=1, max_value=page_count, value=1,
+            key=f"{key}_page_{page_count}"
+        )
     
-    return df.style.apply(highlight_alerts, axis=1)
+    # Sort only the chosen column, then take the rows of the requested page
+    start = (page - 1) * page_size
+    if sort_by == FILE_ORDER:
+        positions = np.arange(len(df))[::-1] if descending else np.arange(len(df))
+    else:
+        positions = df[sort_by].reset_index(drop=True).sort_values(
+            ascending=not descending, kind='stable', na_position='last'
+        ).index.to_numpy()
+    page_df = df.iloc[positions[start:start + page_size]]
+    
+    st.dataframe(style_dataframe(page_df), use_container_width=True, height=height)
+    st.caption(f"Rows {min(start + 1, len(df))}–{start + len(page_df)} of {len(df)}")
+    return len(page_df)
 
 
-def send_email_with_attachment(to_email, subject, body, excel_data, filename, smtp_server, smtp_port, from_email, password):
-    """Send email with Excel attachment using SMTP"""
-    try:
-        # Create message
-        msg = MIMEMultipart()
-        msg['From'] = from_email
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        
-        # Add body as HTML
-        html_body = body.replace('\n', '<br>')
-        msg.attach(MIMEText(html_body, 'html'))
-        
-        # Add Excel attachment
-        part = MIMEBase('application', 'vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        part.set_payload(excel_data)
-        encoders.encode_base64(part)
-        part.add_header('Content-Disposition', f'attachment; filename={filename}')
-        msg.attach(part)
-        
-        # Connect to SMTP server and send email
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(from_email, password)
-            server.send_message(msg)
-        
-        return True, "Email sent successfully!"
-        
-    except smtplib.SMTPAuthenticationError:
-        return False, "Authentication failed. Please check your email and password."
-    except smtplib.SMTPException as e:
-        return False, f"SMTP error: {str(e)}"
-    except Exception as e:
-        return False, f"Error: {str(e)}"
+with st.sidebar:
+    if st.button("🧹 Clear cached files & results", help="Force the next run to re-parse and re-compare"):
+        get_parse_cache().clear()
+        get_comparison_cache().clear()
+    
+    st.header("🩺 Diagnostics")
+    profile_run = st.checkbox(
+        "Profile this run (cProfile)",
+        help="Profiles the next run and offers the .prof file for download (open with snakeviz or python -m pstats)"
+    )
 
+# Per-stage timings for this run; PO_COMPARE_DIAGNOSTICS_LOG appends them as JSON lines
+from po_compare.diagnostics import RunDiagnostics  # noqa: E402
 
-def send_via_outlook_mac(to_email, subject, body, excel_data, filename):
-    """Send email via Outlook on Mac using AppleScript"""
-    try:
-        import tempfile
-        import os
-        
-        # Save Excel file temporarily
-        temp_dir = tempfile.gettempdir()
-        temp_file = os.path.join(temp_dir, filename)
-        with open(temp_file, 'wb') as f:
-            f.write(excel_data)
-        
-        # Create AppleScript
-        applescript = f'''
-        tell application "Microsoft Outlook"
-            set newMessage to make new outgoing message with properties {{subject:"{subject}", content:"{body}"}}
-            make new recipient at newMessage with properties {{email address:{{address:"{to_email}"}}}}
-            make new attachment at newMessage with properties {{file:POSIX file "{temp_file}"}}
-            open newMessage
-        end tell
-        '''
-        
-        # Execute AppleScript
-        subprocess.run(['osascript', '-e', applescript], check=True)
-        
-        return True, "Outlook draft created with attachment! Please review and send."
-        
-    except Exception as e:
-        return False, f"Error: {str(e)}"
+diagnostics = RunDiagnostics(log_path=os.environ.get('PO_COMPARE_DIAGNOSTICS_LOG'), profile=profile_run)
 
+# Multi-week timeline
+if mode == TIMELINE_MODE:
+    if len(snapshot_files) >= 2:
+        from po_compare.cache import content_hash
+        from po_compare.export import write_excel
 
-def save_as_eml_file(to_email, subject, body, excel_data, filename):
-    """Save email with attachment as .eml file that can be opened in any email client"""
-    try:
-        # Create message
-        msg = MIMEMultipart()
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        msg['From'] = 'PO Comparison Tool'
+        with st.spinner(f"Processing {len(snapshot_files)} snapshots..."):
+            timeline_key = ('timeline',) + tuple(sorted(
+                (f.name, content_hash(f.getvalue())) for f in snapshot_files
+            )) + compare_settings
+            try:
+                with diagnostics.stage('timeline') as stage:
+                    changes_df, trajectories_df, lines_tracked = get_comparison_cache().get_or_compare(
+                        timeline_key,
+                        lambda: run_timeline(snapshot_files, engine=excel_engine, duplicates=duplicate_policy,
+                                             alert_rules=alert_rules)
+                    )
+                    stage['rows'] = len(changes_df)
+            except Exception as e:
+                st.error(f"Error building timeline: {str(e)}")
+                st.stop()
         
-        # Add body
-        msg.attach(MIMEText(body, 'plain'))
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Weeks", len(snapshot_files))
+        with col2:
+            st.metric("PO Lines Tracked", lines_tracked)
+        with col3:
+            st.metric("Week-over-Week Changes", len(changes_df))
+        with col4:
+            st.metric("Lines Pushed 2+ Times", int((trajectories_df['Pushes'] >= 2).sum()))
         
-        # Add Excel attachment
-        part = MIMEBase('application', 'vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        part.set_payload(excel_data)
-        encoders.encode_base64(part)
-        part.add_header('Content-Disposition', f'attachment; filename={filename}')
-        msg.attach(part)
+        st.subheader("📈 Push Trajectories")
+        st.dataframe(trajectories_df, use_container_width=True, height=400)
         
-        # Generate .eml content
-        eml_content = msg.as_bytes()
+        st.subheader("📋 Week-over-Week Changes")
+        with diagnostics.stage('render') as stage:
+            stage['rows'] = show_paged_table(changes_df, key='timeline_changes', height=400)
         
-        return True, eml_content
+        def export_timeline():
+            output = io.BytesIO()
+            write_excel({'Push Trajectories': trajectories_df, 'Weekly Changes': changes_df}, output)
+            return output
         
-    except Exception as e:
-        return False, str(e)
-
+        with diagnostics.stage('export_excel', rows=len(changes_df) + len(trajectories_df)):
+            timeline_excel = get_comparison_cache().get_or_export(timeline_key, ('excel',), export_timeline)
+        st.download_button(
+            label="📥 Download Timeline as Excel",
+            data=timeline_excel,
+            file_name=f"po_timeline_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
+    else:
+        st.info("👆 Please upload at least two weekly snapshots to build a timeline")
 
 # Main comparison logic
-if prev_week_file and curr_week_file:
+elif (prev_week_file or baseline_digest) and curr_week_file:
+    from po_compare.cache import ComparisonCache, content_hash
+    from po_compare.diff import count_duplicate_lines
+    from po_compare.emailing import format_email_content, save_as_eml_file, send_via_outlook_mac, summarize_results
+    from po_compare.export import export_to_excel
+    from po_compare.filters import ResultIndex
+
     with st.spinner("Processing files..."):
-        # Parse files
-        prev_df = parse_excel_file(prev_week_file)
-        curr_df = parse_excel_file(curr_week_file)
+        # Parse files (a stored baseline is read from its snapshot instead)
+        with diagnostics.stage('parse_previous') as stage:
+            if baseline_digest:
+                prev_df, prev_digest = load_baseline(baseline_digest), baseline_digest
+            else:
+                prev_df, prev_digest = parse_uploaded_file(prev_week_file, engine=excel_engine)
+            stage['rows'] = None if prev_df is None else len(prev_df)
+        with diagnostics.stage('parse_current') as stage:
+            curr_df, curr_digest = parse_uploaded_file(curr_week_file, engine=excel_engine)
+            stage['rows'] = None if curr_df is None else len(curr_df)
         
         if prev_df is not None and curr_df is not None:
+            with diagnostics.stage('store_baseline', rows=len(curr_df)):
+                if prev_week_file:
+                    store_baseline(prev_df, prev_digest, prev_week_file.name)
+                store_baseline(curr_df, curr_digest, curr_week_file.name)
+            
             st.success("Files loaded successfully!")
             
             # Show file summaries
@@ -329,58 +607,101 @@ if prev_week_file and curr_week_file:
             with col2:
                 st.metric("Current Week PO Lines", len(curr_df))
             
-            # Compare PO lines
-            results_df = compare_po_lines(prev_df, curr_df)
+            # Compare PO lines (memoized per file pair, so filter changes never recompute the diff)
+            comparison_cache = get_comparison_cache()
+            comparison_key = ComparisonCache.pair_key(prev_digest, curr_digest, compare_settings)
+            with diagnostics.stage('compare') as stage:
+                results_df = comparison_cache.get_or_compare(
+                    comparison_key,
+                    lambda: run_comparison(prev_df, curr_df, prev_digest, curr_digest,
+                                           incremental=bool(baseline_digest), duplicates=duplicate_policy,
+                                           alert_rules=alert_rules)
+                )
+                stage['rows'] = len(results_df)
+            
+            # Repeated PO lines (schedule lines) in either week, counted once per file pair
+            duplicate_counts = comparison_cache.get_or_export(
+                comparison_key, ('duplicates',),
+                lambda: (count_duplicate_lines(prev_df), count_duplicate_lines(curr_df))
+            )
+            if any(duplicate_counts):
+                st.info(
+                    f"ℹ️ Repeated PO lines: {duplicate_counts[0]} in the previous week, {duplicate_counts[1]} in the "
+                    f"current week. Matched by: {DUPLICATE_LABELS[duplicate_policy]} (change in the sidebar)."
+                )
             
             if not results_df.empty:
                 st.subheader("📋 Comparison Results")
                 
+                # Status/alert masks and counts, built once per comparison
+                with diagnostics.stage('index', rows=len(results_df)):
+                    result_index = comparison_cache.get_or_export(
+                        comparison_key, ('index',), lambda: ResultIndex(results_df)
+                    )
+                
                 # Summary metrics
                 col1, col2, col3, col4 = st.columns(4)
                 with col1:
-                    pushed_count = len(results_df[results_df['Status'] == 'Pushed'])
-                    st.metric("Pushed Lines", pushed_count)
+                    st.metric("Pushed Lines", result_index.status_counts.get('Pushed', 0))
                 with col2:
-                    split_count = len(results_df[results_df['Status'] == 'Split'])
-                    st.metric("Split Lines", split_count)
+                    st.metric("Split Lines", result_index.status_counts.get('Split', 0))
                 with col3:
-                    repushed_count = len(results_df[results_df['Status'].str.contains('Re-Pushed', na=False)])
-                    st.metric("Re-Pushed Lines", repushed_count)
+                    st.metric("Re-Pushed Lines", result_index.count_statuses('Re-Pushed'))
                 with col4:
-                    alert_count = len(results_df[results_df['Alert'] != ''])
-                    st.metric("🚨 Alerts (>7 days)", alert_count)
+                    st.metric("🚨 Alerts", result_index.alert_count)
                 
                 # Filter options
                 st.subheader("🔍 Filter Results")
                 status_filter = st.multiselect(
                     "Filter by Status",
-                    options=results_df['Status'].unique(),
-                    default=results_df['Status'].unique()
+                    options=result_index.statuses,
+                    default=result_index.statuses
                 )
                 
-                show_alerts_only = st.checkbox("Show only alerts (>7 days)")
+                show_alerts_only = st.checkbox("Show only alerts")
                 
-                # Apply filters
-                filtered_df = results_df[results_df['Status'].isin(status_filter)]
-                if show_alerts_only:
-                    filtered_df = filtered_df[filtered_df['Alert'] != '']
+                with st.expander("More filters"):
+                    col1, col2, col3 = st.columns(3)
+                    with col1:
+                        po_type_filter = st.multiselect("PO Type", options=list(result_index.po_types),
+                                                        help="Leave empty to show all types")
+                    with col2:
+                        pn_prefix = st.text_input("PN starts with").strip()
+                    with col3:
+                        min_days, max_days = result_index.days_range()
+                        if min_days < max_days:
+                            days_filter = st.slider("Days pushed", min_days, max_days, (min_days, max_days))
+                        else:
+                            days_filter = (min_days, max_days)
                 
-                # Display results
-                st.dataframe(
-                    style_dataframe(filtered_df),
-                    use_container_width=True,
-                    height=500
-                )
+                # Apply filters (mask lookups on the precomputed index)
+                with diagnostics.stage('filter') as stage:
+                    filtered_df = result_index.filter(
+                        statuses=status_filter,
+                        alerts_only=show_alerts_only,
+                        po_types=po_type_filter,
+                        pn_prefix=pn_prefix,
+                        days_range=None if days_filter == (min_days, max_days) else days_filter
+                    )
+                    stage['rows'] = len(filtered_df)
+                
+                # Display results, one page at a time
+                with diagnostics.stage('render') as stage:
+                    stage['rows'] = show_paged_table(filtered_df, key='results')
                 
                 # Download and Email results
                 st.subheader("💾 Export Results")
                 
-                # Convert to Excel
-                output = io.BytesIO()
-                with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                    filtered_df.to_excel(writer, index=False, sheet_name='Comparison Results')
-                
-                excel_data = output.getvalue()
+                # Convert to Excel (cached per filter combination). The cached export and email summary
+                # hold no file name or timestamp: those are added on every run, so a download is never
+                # stamped with the time the view was first exported. The export stays an in-memory file,
+                # which the download button, the .eml and the email queue all read in place
+                view_key = (tuple(sorted(status_filter)), show_alerts_only, tuple(sorted(po_type_filter)),
+                            pn_prefix, days_filter)
+                with diagnostics.stage('export_excel', rows=len(filtered_df)):
+                    excel_data = comparison_cache.get_or_export(
+                        comparison_key, ('excel',) + view_key, lambda: export_to_excel(filtered_df, io.BytesIO())
+                    )
                 filename = f"po_comparison_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
                 
                 col1, col2 = st.columns(2)
@@ -395,29 +716,10 @@ if prev_week_file and curr_week_file:
                 
                 with col2:
                     # Prepare email content
-                    results_summary = {
-                        'total': len(filtered_df),
-                        'pushed': len(filtered_df[filtered_df['Status'].str.contains('Pushed', na=False)]),
-                        'split': len(filtered_df[filtered_df['Status'] == 'Split']),
-                        'alerts': len(filtered_df[filtered_df['Alert'] != ''])
-                    }
-                    
-                    email_subject = f"PO Comparison Results - {datetime.now().strftime('%Y-%m-%d')}"
-                    email_body = f"""Hi,
-
-Please find attached the PO Line Comparison results:
-
-SUMMARY:
-- Total changes: {results_summary['total']}
-- Pushed lines: {results_summary['pushed']}
-- Split lines: {results_summary['split']}
-- Alerts (>7 days): {results_summary['alerts']}
-
-Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-
-Best regards,
-PO Line Comparison Tool
-"""
+                    with diagnostics.stage('email_content', rows=len(filtered_df)):
+                        email_subject, email_body = format_email_content(comparison_cache.get_or_export(
+                            comparison_key, ('email',) + view_key, lambda: summarize_results(filtered_df)
+                        ))
                     
                     # Email button based on selected method
                     if "Outlook" in email_method:
@@ -439,14 +741,16 @@ PO Line Comparison Tool
                                     st.info("💡 Make sure Microsoft Outlook is installed on your Mac")
                     
                     elif ".eml" in email_method:
-                        # Save as .eml file method
-                        success, result = save_as_eml_file(
-                            to_email=recipient_email,
-                            subject=email_subject,
-                            body=email_body,
-                            excel_data=excel_data,
-                            filename=filename
-                        )
+                        # Save as .eml file method (built from the cached export with this run's name and time)
+                        with diagnostics.stage('eml_file', rows=len(filtered_df)):
+                            success, result = save_as_eml_file(
+                                to_email=recipient_email,
+                                subject=email_subject,
+                                body=email_body,
+                                excel_data=excel_data,
+                                filename=filename,
+                                target=io.BytesIO()
+                            )
                         
                         if success:
                             eml_filename = f"po_email_{datetime.now().strftime('%Y%m%d_%H%M%S')}.eml"
@@ -468,32 +772,133 @@ PO Line Comparison Tool
                             if not from_email or not email_password:
                                 st.error("⚠️ Please enter your email and password in the SMTP Settings!")
                             else:
-                                with st.spinner("Sending email..."):
-                                    success, message = send_email_with_attachment(
-                                        to_email=recipient_email,
-                                        subject=email_subject,
-                                        body=email_body,
-                                        excel_data=excel_data,
-                                        filename=filename,
-                                        smtp_server=smtp_server,
-                                        smtp_port=smtp_port,
-                                        from_email=from_email,
-                                        password=email_password
+                                # Queued, not sent here: the dispatcher delivers in the background
+                                dispatcher = get_email_dispatcher(smtp_server, int(smtp_port), from_email, email_password)
+                                job_id = dispatcher.submit(
+                                    to_email=recipient_email,
+                                    subject=email_subject,
+                                    body=email_body,
+                                    excel_data=excel_data,
+                                    filename=filename
+                                )
+                                st.session_state.setdefault('email_jobs', []).append((dispatcher, job_id))
+                                st.success(f"📨 Email to {recipient_email} queued, sending in the background")
+                
+                # Fan-out: every buyer / owner gets one email with only their own lines
+                with st.expander("📬 Send each owner only their lines"):
+                    from po_compare.fanout import ROUTE_COLUMNS, read_routes, write_archive
+
+                    route_column = st.selectbox(
+                        "Route by", [col for col in ROUTE_COLUMNS if col in results_df.columns], key='route_column'
+                    )
+                    routes_file = st.file_uploader(
+                        "Routing table (optional CSV with columns: value, recipient)", type=['csv'], key='routes_file'
+                    )
+                    known_routes = read_routes(routes_file) if routes_file else {}
+                    
+                    # One row per value in the whole comparison, so the table stays put while filters change
+                    route_values = [str(value) for value in results_df[route_column].dropna().unique()]
+                    routes_editor_key = f"routes_{route_column}_{content_hash('|'.join(route_values).encode())[:12]}"
+                    routes_df = st.data_editor(
+                        pd.DataFrame({'Value': route_values, 'Recipient': [known_routes.get(v, '') for v in route_values]}),
+                        disabled=['Value'],
+                        hide_index=True,
+                        use_container_width=True,
+                        key=routes_editor_key
+                    )
+                    routes = {
+                        value: recipient.strip()
+                        for value, recipient in zip(routes_df['Value'], routes_df['Recipient'])
+                        if isinstance(recipient, str) and recipient.strip()
+                    }
+                    send_unrouted = st.checkbox(f"Send lines without a recipient to {recipient_email}", key='send_unrouted')
+                    default_recipient = recipient_email if send_unrouted else None
+                    
+                    if routes or default_recipient:
+                        smtp_fanout = "SMTP" in email_method
+                        fanout_key = ('fanout', route_column, tuple(sorted(routes.items())), default_recipient,
+                                      smtp_fanout) + view_key
+                        with diagnostics.stage('fanout', rows=len(filtered_df)):
+                            messages, unrouted = comparison_cache.get_or_export(
+                                comparison_key, fanout_key,
+                                lambda: fan_out(filtered_df, route_column, routes, default_recipient, filename,
+                                                eml=not smtp_fanout)
+                            )
+                        st.dataframe(
+                            pd.DataFrame({'Recipient': [m['to'] for m in messages], 'Lines': [m['rows'] for m in messages]}),
+                            hide_index=True, use_container_width=True
+                        )
+                        if unrouted:
+                            st.caption(f"{unrouted} lines have no recipient and are not sent")
+                        
+                        if smtp_fanout:
+                            if st.button(f"📧 Queue {len(messages)} emails via SMTP", key="send_fanout"):
+                                if not from_email or not email_password:
+                                    st.error("⚠️ Please enter your email and password in the SMTP Settings!")
+                                else:
+                                    dispatcher = get_email_dispatcher(smtp_server, int(smtp_port), from_email, email_password)
+                                    st.session_state.setdefault('email_jobs', []).extend(
+                                        (dispatcher, dispatcher.submit(m['to'], m['subject'], m['body'], m['excel'], m['filename']))
+                                        for m in messages
                                     )
-                                    
-                                    if success:
-                                        st.success(f"✅ {message}")
-                                        st.balloons()
-                                    else:
-                                        st.error(f"❌ {message}")
+                                    st.success(f"📨 {len(messages)} emails queued, sending in the background")
+                        elif messages:
+                            archive = io.BytesIO()
+                            write_archive(messages, archive)
+                            st.download_button(
+                                label=f"📦 Download {len(messages)} emails (.zip of .eml files)",
+                                data=archive,
+                                file_name=f"po_emails_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip",
+                                mime="application/zip"
+                            )
+                    else:
+                        st.caption("Enter a recipient for at least one value")
+                
+                # Per-message delivery status of this session's SMTP emails
+                email_jobs = st.session_state.get('email_jobs', [])
+                if "SMTP" in email_method and email_jobs:
+                    email_status = pd.DataFrame(
+                        [record for dispatcher, job_id in email_jobs for record in dispatcher.status([job_id])],
+                        columns=['to', 'subject', 'status', 'attempts', 'error', 'sent_at']
+                    )
+                    st.dataframe(email_status, use_container_width=True, hide_index=True)
+                    if email_status['status'].isin(['queued', 'sending', 'retrying']).any():
+                        st.button("🔄 Refresh send status", key="refresh_email_status")
                     
                 st.info("💡 Choose your preferred email method in the sidebar. The Excel file will be automatically attached!")
                 
+                cache_stats = comparison_cache.stats()
+                st.caption(
+                    f"Comparison cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses, "
+                    f"exports: {cache_stats['export_hits']} hits / {cache_stats['export_misses']} misses"
+                )
+                
             else:
                 st.info("No changes detected between the two weeks.")
 else:
-    st.info("👆 Please upload both Excel files to begin comparison")
+    if baseline_digest:
+        st.info("👆 Please upload the current week file to compare it with the stored baseline")
+    else:
+        st.info("👆 Please upload both Excel files to begin comparison")
 
+if diagnostics.records:
+    with st.expander("🩺 Run diagnostics"):
+        st.dataframe(diagnostics.to_frame(), use_container_width=True, hide_index=True)
+        st.caption("peak_rss_mb is the server's highest resident memory during the stage (other sessions "
+                   "running at the same time included); rss_growth_mb is what the stage still held when it "
+                   "ended. Cached stages take ~0 s.")
+    try:
+        diagnostics.write_log()
+    except OSError as e:
+        st.warning(f"⚠️ Could not write diagnostics log: {str(e)}")
+
+if profile_run:
+    profile_path = diagnostics.dump_profile(
+        os.path.join(tempfile.gettempdir(), f"po_compare_{diagnostics.run_id}.prof")
+    )
+    with open(profile_path, 'rb') as f:
+        st.sidebar.download_button("📥 Download profile (.prof)", data=f.read(),
+                                   file_name=os.path.basename(profile_path))
 # Footer
 st.markdown("---")
 st.markdown("### 📖 Instructions")
@@ -508,9 +913,9 @@ st.markdown("""
 3. **Review Results**: The app will automatically identify:
    - **Pushed Lines**: PO lines with later commit dates
    - **Split Lines**: PO lines that were divided into multiple lines
-   - **Re-Pushed Lines**: Lines pushed multiple times (>7 days indicates potential re-push)
+   - **Re-Pushed Lines**: Lines pushed again after a push recorded in an earlier comparison
 
-4. **Alerts**: Lines pushed more than 7 days are highlighted with 🚨 ALERT
+4. **Alerts**: Lines matching an alert rule (default: pushed more than 7 days; edit under 🚨 Alert rules in the sidebar) are highlighted with 🚨 ALERT
 
 5. **Export Options**:
    - **Download Excel**: Save results as Excel file
@@ -0,0 +1,140 @@
+"""
+Benchmark the comparison pipeline on generated data at several scales
+
+    python benchmark.py                              # 10k and 100k lines
+    python benchmark.py --scales 10000 100000 1000000 --repeat 3
+
+Times parse, compare, split detection, Excel export and email building for
+a generated weekly pair per scale, prints them next to the previous saved
+run and appends them to benchmarks/results.jsonl so regressions show up.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from generate_sample_data import generate_series, write_series
+from po_compare.diff import compare_po_lines, detect_splits
+from po_compare.emailing import build_email_content, save_as_eml_file
+from po_compare.export import export_to_excel
+from po_compare.parsing import read_po_file, standardize_po_frame
+
+DEFAULT_RESULTS = os.path.join('benchmarks', 'results.jsonl')
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _best_time(fn, repeat):
+    """Return (fastest wall time, result of the last call)"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run_scale(lines, seed=0, repeat=1, parse=True, engine='auto'):
+    """Benchmark one scale; returns a list of {stage, seconds, rows}"""
+    prev_src, curr_src = generate_series(lines, weeks=2, seed=seed)
+    timings = []
+
+    if parse:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            prev_path, curr_path = write_series([prev_src, curr_src], tmp_dir)
+            seconds, (prev_df, curr_df) = _best_time(
+                lambda: (read_po_file(prev_path, engine=engine)[0], read_po_file(curr_path, engine=engine)[0]),
+                repeat
+            )
+        timings.append({'stage': 'parse', 'seconds': seconds, 'rows': len(prev_df) + len(curr_df)})
+    else:
+        # Same frames read_po_file would produce, without the Excel round trip
+        prev_df, _ = standardize_po_frame(prev_src.copy())
+        curr_df, _ = standardize_po_frame(curr_src.copy())
+
+    rows = len(prev_df) + len(curr_df)
+    seconds, results_df = _best_time(lambda: compare_po_lines(prev_df, curr_df), repeat)
+    timings.append({'stage': 'compare', 'seconds': seconds, 'rows': rows})
+
+    seconds, _ = _best_time(lambda: detect_splits(prev_df, curr_df), repeat)
+    timings.append({'stage': 'split_detection', 'seconds': seconds, 'rows': rows})
+
+    seconds, excel_data = _best_time(lambda: export_to_excel(results_df), repeat)
+    timings.append({'stage': 'export_excel', 'seconds': seconds, 'rows': len(results_df)})
+
+    def build_email():
+        subject, body = build_email_content(results_df)
+        return save_as_eml_file('planner@example.com', subject, body, excel_data, 'po_comparison.xlsx')
+
+    seconds, _ = _best_time(build_email, repeat)
+    timings.append({'stage': 'email', 'seconds': seconds, 'rows': len(results_df)})
+    return timings
+
+
+def load_previous(path):
+    """Latest saved seconds per (scale, stage)"""
+    previous = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                record = json.loads(line)
+                previous[(record['scale'], record['stage'])] = record['seconds']
+    return previous
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the PO comparison pipeline on generated data.')
+    parser.add_argument('--scales', type=int, nargs='+', default=[10_000, 100_000], help='lines per week')
+    parser.add_argument('--repeat', type=int, default=1, help='runs per stage; the fastest is kept (default: 1)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed (default: 0)')
+    parser.add_argument('--engine', default='auto', help='Excel reader for the parse stage (default: auto)')
+    parser.add_argument('--no-parse', action='store_true', help='skip writing and parsing Excel files')
+    parser.add_argument('--output', default=DEFAULT_RESULTS, help=f'results file (default: {DEFAULT_RESULTS})')
+    args = parser.parse_args(argv)
+
+    previous = load_previous(args.output)
+    run = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'seed': args.seed
+    }
+
+    records = []
+    for scale in args.scales:
+        print(f"⏱️ {scale} lines...", file=sys.stderr)
+        for timing in run_scale(scale, seed=args.seed, repeat=args.repeat, parse=not args.no_parse, engine=args.engine):
+            records.append({**run, 'scale': scale, **timing})
+
+    report = pd.DataFrame(records)[['scale', 'stage', 'rows', 'seconds']]
+    report['previous'] = pd.Series([previous.get((r['scale'], r['stage'])) for r in records], dtype=float)
+    report['change'] = (report['seconds'] / report['previous'] - 1).map(
+        lambda change: '' if pd.isna(change) else f"{change:+.0%}"
+    )
+    print(report.to_string(index=False, na_rep='', float_format=lambda value: f"{value:.3f}"))
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'a') as f:
+        for record in records:
+            f.write(json.dumps(record) + '\n')
+    print(f"💾 {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,31 @@
 """
 Sample data generator for testing the PO Line Comparison Tool
 Run this script to generate sample Excel files for testing
+
+    python generate_sample_data.py                     # the small hand-made pair
+    python generate_sample_data.py --lines 100000      # a seeded, realistic pair at scale
+    python generate_sample_data.py --lines 50000 --weeks 6 --out-dir series/
 """
 
+import argparse
+import os
+
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 import random
 
+# Share of the previous week's lines affected each week (defaults for generate_series)
+DEFAULT_RATES = {
+    'push_rate': 0.10,       # ComDate moved later by 1-30 days
+    'pullback_rate': 0.03,   # ComDate moved earlier by 1-14 days
+    'split_rate': 0.01,      # line split: extra line on the same PO with the same PN
+    'new_rate': 0.02,        # lines on brand-new POs
+    'dup_rate': 0.001        # rows repeated with the same PO + Item (duplicate keys)
+}
+
+PO_TYPES = ['Standard', 'Rush', 'Consignment']
+
 def generate_sample_data():
     """Generate sample Excel files for testing"""
     
@@ -84,6 +103,114 @@ def generate_sample_data():
     print("   - 1 Alert (PO005 pushed 10 days)")
     print("\nYou can now upload these files to the Streamlit app for testing.")
 
+def _new_lines(rng, count, first_po, pn_pool, start_date):
+    """``count`` fresh lines on new POs numbered from ``first_po`` (1-4 lines per PO)"""
+    lines_per_po = rng.integers(1, 5, count)
+    po_no = first_po + np.repeat(np.arange(count), lines_per_po)[:count]
+    item = (pd.Series(po_no).groupby(po_no).cumcount().to_numpy() + 1) * 10
+    return pd.DataFrame({
+        'Purch.doc.': po_no,
+        'Item': item,
+        'Short text': np.char.add('PN-', rng.integers(0, pn_pool, count).astype(str)),
+        'Order': np.char.add('PWO-', (po_no % 1_000_000).astype(str)),
+        'Type': rng.choice(PO_TYPES, count, p=[0.8, 0.15, 0.05]),
+        'ComDate': start_date + pd.to_timedelta(rng.integers(0, 90, count), unit='D')
+    })
+
+
+def generate_series(lines, weeks=2, seed=0, push_rate=DEFAULT_RATES['push_rate'],
+                    pullback_rate=DEFAULT_RATES['pullback_rate'], split_rate=DEFAULT_RATES['split_rate'],
+                    new_rate=DEFAULT_RATES['new_rate'], dup_rate=DEFAULT_RATES['dup_rate']):
+    """Return ``weeks`` weekly extracts (Excel column names) starting from ``lines`` lines
+
+    Each week is derived from the previous one: a share of lines is pushed or
+    pulled back, some are split into a second line with the same PN, new POs
+    appear, and a few rows are repeated with the same key. The same seed
+    always produces the same series.
+    """
+    rng = np.random.default_rng(seed)
+    pn_pool = max(lines // 5, 1)
+    start_date = pd.Timestamp('2024-11-04')
+    first_po = 4_500_000_000
+
+    week = _new_lines(rng, lines, first_po, pn_pool, start_date)
+    next_po = week['Purch.doc.'].max() + 1
+    series = []
+    for week_no in range(weeks):
+        if week_no:
+            week = week.copy()
+            n = len(week)
+            roll = rng.random(n)
+            pushed = roll < push_rate
+            pulled = (roll >= push_rate) & (roll < push_rate + pullback_rate)
+            shift = np.zeros(n, dtype=int)
+            # Mostly short pushes with a long tail, capped at 30 days
+            shift[pushed] = np.minimum(rng.geometric(0.15, pushed.sum()), 30)
+            shift[pulled] = -rng.integers(1, 15, pulled.sum())
+            week['ComDate'] = week['ComDate'] + pd.to_timedelta(shift, unit='D')
+
+            # Splits: a copy of the line under the next free item number of its PO
+            split = week[rng.random(n) < split_rate].copy()
+            next_item = week.groupby('Purch.doc.')['Item'].max()
+            split['Item'] = (split['Purch.doc.'].map(next_item).to_numpy()
+                             + (split.groupby('Purch.doc.').cumcount().to_numpy() + 1) * 10)
+            split['ComDate'] = split['ComDate'] + pd.to_timedelta(rng.integers(0, 15, len(split)), unit='D')
+
+            new = _new_lines(rng, int(round(n * new_rate)), next_po, pn_pool, start_date + pd.Timedelta(weeks=week_no))
+            next_po = (new['Purch.doc.'].max() + 1) if len(new) else next_po
+            week = pd.concat([week, split, new], ignore_index=True)
+
+        # Duplicate keys are added to each emitted week only, not carried forward
+        dups = week[rng.random(len(week)) < dup_rate].copy()
+        dups['ComDate'] = dups['ComDate'] + pd.to_timedelta(rng.integers(1, 8, len(dups)), unit='D')
+        series.append(pd.concat([week, dups], ignore_index=True))
+    return series
+
+
+def write_series(series, out_dir='.', prefix='po_extract'):
+    """Write a generated series as Excel files; returns the paths
+
+    A pair is written as ``<prefix>_prev.xlsx`` / ``<prefix>_curr.xlsx`` (the
+    naming batch mode pairs up), longer series as ``<prefix>_week01.xlsx``...
+    """
+    from po_compare.export import write_excel
+
+    os.makedirs(out_dir, exist_ok=True)
+    names = ['prev', 'curr'] if len(series) == 2 else [f"week{i + 1:02d}" for i in range(len(series))]
+    paths = []
+    for name, df in zip(names, series):
+        path = os.path.join(out_dir, f"{prefix}_{name}.xlsx")
+        write_excel({'Sheet1': df}, path)
+        paths.append(path)
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate sample PO extracts for testing.')
+    parser.add_argument('--lines', type=int, help='lines in the first week (e.g. 10000 to 1000000); '
+                                                  'without it the small hand-made pair is written')
+    parser.add_argument('--weeks', type=int, default=2, help='number of weekly files (default: 2)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed (default: 0)')
+    parser.add_argument('--out-dir', default='.', help='output directory (default: current directory)')
+    parser.add_argument('--prefix', default='po_extract', help='file name prefix (default: po_extract)')
+    for name, default in DEFAULT_RATES.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=float, default=default,
+                            help=f"share of lines per week (default: {default})")
+    args = parser.parse_args(argv)
+
+    if args.lines is None:
+        generate_sample_data()
+        return
+
+    rates = {name: getattr(args, name) for name in DEFAULT_RATES}
+    series = generate_series(args.lines, weeks=args.weeks, seed=args.seed, **rates)
+    paths = write_series(series, args.out_dir, args.prefix)
+
+    print("✅ Sample files generated successfully!")
+    for path, df in zip(paths, series):
+        print(f"   - {path} ({len(df)} rows)")
+
+
 if __name__ == "__main__":
-    generate_sample_data()
+    main()
 
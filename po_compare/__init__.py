@@ -0,0 +1 @@
+"""Support package for the PO Line Comparison Tool (non-UI building blocks)"""
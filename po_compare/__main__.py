@@ -0,0 +1,5 @@
+import sys
+
+from po_compare.cli import main
+
+sys.exit(main())
@@ -0,0 +1,141 @@
+"""Declarative alert rules, compiled once into vectorized masks over a results frame
+
+A rule is a dict of conditions that must all hold; a line gets an alert when
+any rule matches, and Alert_Rule names the first rule (in order) that did:
+
+    [
+        {"name": "Pushed > 7 days", "days_pushed_over": 7},
+        {"name": "Rush pushed", "po_type": "Rush", "days_pushed_over": 0},
+        {"name": "Critical PN", "pn_pattern": "^PN-9", "days_pushed_over": 3},
+        {"name": "Pushed 3+ times", "push_count_at_least": 3},
+        {"name": "Pulled in > 14 days", "pulled_in_over": 14}
+    ]
+
+Every condition is one column expression over the whole frame. PO_Type and
+PN tests run once per distinct value (the columns are categorical), so the
+per-row cost of a rule does not depend on how it is written. Rules on
+Push_Count or Cum_Days_Pushed only match when the comparison ran with push
+history.
+"""
+
+import json
+import re
+
+import numpy as np
+import pandas as pd
+
+ALERT_FLAG = '🚨 ALERT'
+
+# Threshold of the default rule (and of the 'Re-Pushed (>7 days)' estimate without history)
+ALERT_THRESHOLD_DAYS = 7
+
+DEFAULT_RULES = [{'name': f'Pushed > {ALERT_THRESHOLD_DAYS} days', 'days_pushed_over': ALERT_THRESHOLD_DAYS}]
+
+# Filters narrow which lines a rule looks at; at least one threshold must be set
+RULE_FILTERS = ['po_type', 'pn_pattern']
+RULE_THRESHOLDS = ['days_pushed_over', 'pulled_in_over', 'push_count_at_least', 'cum_days_over']
+RULE_FIELDS = ['name'] + RULE_FILTERS + RULE_THRESHOLDS
+
+
+def _po_types(value):
+    """PO types of a rule, given as a list or comma-separated text"""
+    if isinstance(value, str):
+        return [part.strip() for part in value.split(',') if part.strip()]
+    return [str(part) for part in value]
+
+
+def _value_mask(df, column, test, distinct):
+    """Run ``test`` once per distinct value of ``column`` and spread the result to the rows
+
+    ``distinct`` memoizes the factorized column, so several rules on the same
+    column share one pass over it.
+    """
+    if column not in distinct:
+        codes, values = pd.factorize(df[column], use_na_sentinel=True)
+        distinct[column] = codes, pd.Series(values, dtype=object).astype(str)
+    codes, values = distinct[column]
+    hits = np.asarray(test(values), dtype=bool)
+    # The extra trailing False maps missing values (code -1) to "no match"
+    return np.append(hits, False)[codes]
+
+
+def _compile_rule(rule):
+    """Return a function mapping (results frame, distinct-value memo) to the rule's boolean mask"""
+    unknown = set(rule) - set(RULE_FIELDS)
+    if unknown:
+        raise ValueError(f"Alert rule {rule.get('name')!r}: unknown fields {sorted(unknown)}; expected {RULE_FIELDS}")
+    if not any(rule.get(field) is not None for field in RULE_THRESHOLDS):
+        raise ValueError(f"Alert rule {rule.get('name')!r} needs one of {RULE_THRESHOLDS}")
+
+    conditions = []
+    if rule.get('po_type'):
+        po_types = _po_types(rule['po_type'])
+        conditions.append(lambda df, distinct: _value_mask(df, 'PO_Type', lambda values: values.isin(po_types), distinct))
+    if rule.get('pn_pattern'):
+        pattern = rule['pn_pattern']
+        try:
+            re.compile(pattern)
+        except re.error as e:
+            raise ValueError(f"Alert rule {rule.get('name')!r}: bad pn_pattern {pattern!r}: {e}")
+        conditions.append(
+            lambda df, distinct: _value_mask(df, 'PN', lambda values: values.str.contains(pattern, regex=True), distinct)
+        )
+    for field, column, test in [
+        ('days_pushed_over', 'Days_Pushed', lambda values, limit: values > limit),
+        ('pulled_in_over', 'Days_Pushed', lambda values, limit: -values > limit),
+        ('push_count_at_least', 'Push_Count', lambda values, limit: values >= limit),
+        ('cum_days_over', 'Cum_Days_Pushed', lambda values, limit: values > limit)
+    ]:
+        if rule.get(field) is not None:
+            limit = float(rule[field])
+            conditions.append(
+                lambda df, distinct, column=column, test=test, limit=limit:
+                test(df[column], limit) if column in df.columns else pd.Series(False, index=df.index)
+            )
+
+    def mask(df, distinct):
+        result = np.ones(len(df), dtype=bool)
+        for condition in conditions:
+            result &= np.asarray(condition(df, distinct), dtype=bool)
+        return result
+
+    return mask
+
+
+class AlertRules:
+    """An ordered, compiled set of alert rules"""
+
+    def __init__(self, rules=None):
+        self.rules = [dict(rule) for rule in (DEFAULT_RULES if rules is None else rules)]
+        for number, rule in enumerate(self.rules, start=1):
+            rule.setdefault('name', f"Rule {number}")
+        self._masks = [_compile_rule(rule) for rule in self.rules]
+
+    def __reduce__(self):
+        # The compiled masks are closures; worker processes recompile from the rule dicts
+        return AlertRules, (self.rules,)
+
+    @classmethod
+    def from_file(cls, path):
+        """Rules from a JSON file holding a list of rule objects"""
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def key(self):
+        """Hashable form of the rules, for cache keys"""
+        return tuple(tuple(sorted((field, str(value)) for field, value in rule.items())) for rule in self.rules)
+
+    def apply(self, df):
+        """Set Alert (ALERT_FLAG or '') and Alert_Rule (first matching rule's name) on ``df``"""
+        distinct = {}
+        masks = [mask(df, distinct) for mask in self._masks]
+        names = [rule['name'] for rule in self.rules]
+        if masks:
+            matched = np.logical_or.reduce(masks)
+            rule_names = np.select(masks, names, default='')
+        else:
+            matched = np.zeros(len(df), dtype=bool)
+            rule_names = np.full(len(df), '', dtype=object)
+        df['Alert'] = np.where(matched, ALERT_FLAG, '')
+        df['Alert_Rule'] = rule_names
+        return df
@@ -0,0 +1,154 @@
+"""Stored weekly snapshots (baselines) and incremental comparison against them
+
+Each parsed week is saved once as Parquet in a baseline directory, with a
+content hash per row. The next week only the new file has to be uploaded and
+parsed: the previous week is loaded from its snapshot, and only POs whose
+rows changed go through the comparison.
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from po_compare.parsing import SCHEMA_VERSION
+
+# Columns whose values make up a row's content hash
+HASH_COLUMNS = ['PO_No', 'PO_Line', 'PN', 'PWO', 'PO_Type', 'ComDate']
+
+MANIFEST_NAME = 'snapshots.json'
+
+
+def row_hashes(df):
+    """uint64 content hash per row, salted with the row's occurrence number within its PO_LineID
+
+    The occurrence number makes repeated rows of one line distinct, so a
+    change in how often (or in which order) a line repeats changes the hashes.
+    """
+    cols = [col for col in HASH_COLUMNS if col in df.columns]
+    hashes = pd.util.hash_pandas_object(df[cols], index=False).to_numpy()
+    occurrence = df.groupby('PO_LineID', sort=False).cumcount().to_numpy().astype(np.uint64)
+    return hashes ^ (occurrence * np.uint64(0x9E3779B97F4A7C15))
+
+
+def _po_signatures(po_no, hashes):
+    """Per-PO row count and wrapping sum of row hashes; equal signatures mean equal rows"""
+    grouped = pd.Series(hashes).groupby(po_no.to_numpy(), sort=False)
+    return pd.DataFrame({'rows': grouped.size(), 'hash': grouped.sum()})
+
+
+def unchanged_pos(baseline_df, curr_df):
+    """PO numbers whose rows are identical in the baseline and the current week"""
+    prev_hashes = baseline_df['Row_Hash'].to_numpy() if 'Row_Hash' in baseline_df.columns else row_hashes(baseline_df)
+    common = _po_signatures(baseline_df['PO_No'], prev_hashes).join(
+        _po_signatures(curr_df['PO_No'], row_hashes(curr_df)),
+        how='inner', lsuffix='_prev', rsuffix='_curr'
+    )
+    same = (common['rows_prev'] == common['rows_curr']) & (common['hash_prev'] == common['hash_curr'])
+    return common.index[same]
+
+
+def compare_incremental(baseline_df, curr_df, history=None, run_id=None, duplicates='first', alert_rules=None):
+    """Compare the current week against a baseline, diffing only POs that changed
+
+    A PO whose rows are all unchanged cannot produce a date change or a
+    split, so those rows are dropped from both sides before
+    ``compare_po_lines``. The result is the same as comparing the full
+    frames. Whole POs (not single lines) are kept, since split detection
+    looks at every line of a PO.
+    """
+    from po_compare.diff import compare_po_lines
+
+    same = unchanged_pos(baseline_df, curr_df)
+    prev_rows = baseline_df[~baseline_df['PO_No'].isin(same)]
+    curr_rows = curr_df[~curr_df['PO_No'].isin(same)]
+    return compare_po_lines(prev_rows, curr_rows, history=history, run_id=run_id, duplicates=duplicates,
+                            alert_rules=alert_rules)
+
+
+class BaselineStore:
+    """Directory of parsed weekly snapshots (Parquet) plus a JSON manifest
+
+    Snapshots are keyed by the content hash of the uploaded file, so saving
+    the same file twice is a no-op and a snapshot can stand in for its file
+    anywhere a digest is used (comparison cache keys, history run IDs). Only
+    the newest ``keep`` snapshots are kept. Needs pyarrow.
+    """
+
+    def __init__(self, directory, keep=12):
+        import pyarrow  # noqa: F401  (fail early: snapshots are Parquet files)
+
+        self.directory = directory
+        self.keep = keep
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _manifest_path(self):
+        return os.path.join(self.directory, MANIFEST_NAME)
+
+    def _read_manifest(self):
+        try:
+            with open(self._manifest_path(), encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return []
+
+    def _write_manifest(self, entries):
+        tmp_path = f"{self._manifest_path()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, indent=1)
+        os.replace(tmp_path, self._manifest_path())
+
+    def snapshots(self):
+        """Snapshots readable with the current schema, newest first"""
+        entries = [entry for entry in self._read_manifest() if entry.get('schema') == SCHEMA_VERSION]
+        return sorted(entries, key=lambda entry: entry['saved_at'], reverse=True)
+
+    def get(self, digest):
+        """Manifest entry for a file digest, or None"""
+        return next((entry for entry in self.snapshots() if entry['digest'] == digest), None)
+
+    def latest(self, exclude_digest=None):
+        """Newest snapshot other than ``exclude_digest`` (typically the file just uploaded)"""
+        return next((entry for entry in self.snapshots() if entry['digest'] != exclude_digest), None)
+
+    def save(self, df, digest, name):
+        """Store a parsed week under its file digest; returns its manifest entry"""
+        existing = self.get(digest)
+        if existing:
+            return existing
+
+        file_name = f"{digest[:32]}.parquet"
+        path = os.path.join(self.directory, file_name)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        df.assign(Row_Hash=row_hashes(df)).to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+        entry = {
+            'digest': digest,
+            'name': name,
+            'file': file_name,
+            'rows': len(df),
+            'saved_at': datetime.now().isoformat(timespec='seconds'),
+            'schema': SCHEMA_VERSION
+        }
+        with self._lock:
+            # Newest first; the new entry goes in front so it also wins a same-second tie
+            entries = [entry] + [e for e in self._read_manifest() if e['digest'] != digest]
+            entries.sort(key=lambda e: e['saved_at'], reverse=True)
+            for old in entries[self.keep:]:
+                old_path = os.path.join(self.directory, old['file'])
+                if os.path.exists(old_path):
+                    os.remove(old_path)
+            self._write_manifest(entries[:self.keep])
+        return entry
+
+    def load(self, digest):
+        """Parsed frame of a stored snapshot (with its Row_Hash column)"""
+        entry = self.get(digest)
+        if entry is None:
+            raise KeyError(f"No stored snapshot for {digest[:16]}")
+        return pd.read_parquet(os.path.join(self.directory, entry['file']))
@@ -0,0 +1,140 @@
+"""Batch mode: compare many prev/curr extract pairs found in a directory tree
+
+Pairs are matched by a file-name regex with two named groups: ``key``
+identifies the pair (e.g. plant and supplier) and ``role`` tells the previous
+week from the current one. Each pair is compared in its own worker process.
+"""
+
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from po_compare.diff import compare_po_lines, count_duplicate_lines
+from po_compare.export import write_results
+from po_compare.parsing import read_po_file
+
+# Matches e.g. "plant1_supplierA_prev.xlsx" / "plant1_supplierA_curr.xlsx"
+DEFAULT_PAIR_PATTERN = r'(?P<key>.+)_(?P<role>prev|curr)\.xlsx?$'
+
+REPORT_COLUMNS = [
+    'Pair', 'Status', 'Prev_File', 'Curr_File', 'Prev_Lines', 'Curr_Lines',
+    'Duplicate_Lines', 'Changes', 'Alerts', 'Parse_Seconds', 'Compare_Seconds', 'Write_Seconds',
+    'Total_Seconds', 'Output', 'Error'
+]
+
+
+def find_pairs(root, pattern=DEFAULT_PAIR_PATTERN, prev_token='prev', curr_token='curr'):
+    """Walk ``root`` and return (pairs, unmatched)
+
+    ``pairs`` is a sorted list of (key, prev_path, curr_path); the key
+    includes the file's directory relative to ``root`` so equal names in
+    different folders never pair up. ``unmatched`` lists files that matched
+    the pattern but have no counterpart.
+    """
+    regex = re.compile(pattern, re.IGNORECASE)
+    found = {}
+    for dirpath, _, filenames in os.walk(root):
+        rel_dir = os.path.relpath(dirpath, root)
+        for name in filenames:
+            match = regex.search(name)
+            if not match or name.startswith('~$'):
+                continue
+            key = match.group('key') if rel_dir == '.' else os.path.join(rel_dir, match.group('key'))
+            role = match.group('role').lower()
+            if role in (prev_token.lower(), curr_token.lower()):
+                found.setdefault(key, {})[role] = os.path.join(dirpath, name)
+
+    pairs, unmatched = [], []
+    for key in sorted(found):
+        roles = found[key]
+        if prev_token.lower() in roles and curr_token.lower() in roles:
+            pairs.append((key, roles[prev_token.lower()], roles[curr_token.lower()]))
+        else:
+            unmatched.extend(roles.values())
+    return pairs, unmatched
+
+
+def compare_pair(key, prev_path, curr_path, output_dir, fmt='xlsx', engine='auto', duplicates='first',
+                 alert_rules=None):
+    """Worker: parse, compare and write one pair; returns (report row, results frame)
+
+    Errors are reported in the row instead of raised, so one bad file does
+    not stop the batch.
+    """
+    report = {'Pair': key, 'Prev_File': prev_path, 'Curr_File': curr_path}
+    started = time.perf_counter()
+    try:
+        prev_df, prev_missing = read_po_file(prev_path, engine=engine)
+        curr_df, curr_missing = read_po_file(curr_path, engine=engine)
+        if prev_missing or curr_missing:
+            raise ValueError(f"missing columns after mapping: {', '.join(sorted(set(prev_missing + curr_missing)))}")
+        parsed = time.perf_counter()
+
+        results_df = compare_po_lines(prev_df, curr_df, duplicates=duplicates, alert_rules=alert_rules)
+        compared = time.perf_counter()
+
+        output = os.path.join(output_dir, f"{key.replace(os.sep, '__')}.{fmt}")
+        write_results({'Comparison Results': results_df}, output)
+        written = time.perf_counter()
+    except Exception as e:
+        report.update(Status='error', Error=str(e), Total_Seconds=round(time.perf_counter() - started, 3))
+        return report, None
+
+    report.update(
+        Status='ok',
+        Prev_Lines=len(prev_df),
+        Curr_Lines=len(curr_df),
+        Duplicate_Lines=count_duplicate_lines(prev_df) + count_duplicate_lines(curr_df),
+        Changes=len(results_df),
+        Alerts=int((results_df['Alert'] != '').sum()) if not results_df.empty else 0,
+        Parse_Seconds=round(parsed - started, 3),
+        Compare_Seconds=round(compared - parsed, 3),
+        Write_Seconds=round(written - compared, 3),
+        Total_Seconds=round(written - started, 3),
+        Output=output
+    )
+    return report, results_df
+
+
+def run_batch(pairs, output_dir, fmt='xlsx', engine='auto', max_workers=None, progress=None, duplicates='first',
+              alert_rules=None):
+    """Compare all pairs across a process pool and write the merged summary
+
+    ``progress(done, total, report)`` is called as each pair finishes.
+    Writes ``summary.<fmt>`` (all changes with a Pair column) and
+    ``batch_report.csv`` (per-pair timings and counts) to ``output_dir``,
+    and returns the report as a DataFrame in pair order.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    reports, results = {}, {}
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(compare_pair, key, prev_path, curr_path, output_dir, fmt, engine, duplicates,
+                        alert_rules): key
+            for key, prev_path, curr_path in pairs
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            report, results_df = future.result()
+            reports[report['Pair']] = report
+            if results_df is not None:
+                results[report['Pair']] = results_df
+            if progress:
+                progress(done, len(pairs), report)
+
+    keys = [key for key, _, _ in pairs]
+    merged = [results[key].assign(Pair=key) for key in keys if key in results and not results[key].empty]
+    if merged:
+        summary_df = pd.concat(merged, ignore_index=True)
+        summary_df = summary_df[['Pair'] + [col for col in summary_df.columns if col != 'Pair']]
+        write_results({'Summary': summary_df}, os.path.join(output_dir, f"summary.{fmt}"))
+
+    report_df = pd.DataFrame([reports[key] for key in keys], columns=REPORT_COLUMNS)
+    # Failed pairs have no counts; keep the columns integer anyway
+    count_columns = ['Prev_Lines', 'Curr_Lines', 'Duplicate_Lines', 'Changes', 'Alerts']
+    report_df[count_columns] = report_df[count_columns].astype('Int64')
+    report_df.to_csv(os.path.join(output_dir, 'batch_report.csv'), index=False)
+    return report_df
@@ -0,0 +1,300 @@
+"""Content-addressed caches for parsed weekly files and comparison results
+
+Uploaded files are keyed by the SHA-256 of their bytes, so re-running the
+Streamlit script (or a second planner uploading the same weekly extract)
+reuses the parsed DataFrame instead of reading the Excel file again, and a
+comparison of the same pair of files is only computed once.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+
+def content_hash(data):
+    """Return the hex SHA-256 digest of a bytes payload"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU cache with hit/miss counters"""
+
+    def __init__(self, max_entries=16):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the cached value (marking it most recently used) or ``default``"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return default
+
+    def peek(self, key, default=None):
+        """Return the cached value without touching recency or counters"""
+        with self._lock:
+            return self._entries.get(key, default)
+
+    def put(self, key, value):
+        """Store a value, evicting the least recently used entries over the limit"""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def evict(self, key):
+        """Drop one entry; return True if it was cached"""
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def clear(self):
+        """Drop all entries (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return hit/miss counters and the current number of entries"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class ParseCache:
+    """Two-tier cache of parsed DataFrames keyed by file content hash
+
+    The memory tier is an LRU of DataFrames. The optional disk tier stores one
+    Parquet or Feather file per key in ``disk_dir`` and deletes the least
+    recently used files once the directory grows past ``disk_max_bytes``.
+    The disk tier is disabled when ``disk_dir`` is None or pyarrow is missing.
+    Cached frames are shared between callers and must not be modified in place.
+    """
+
+    def __init__(self, max_entries=8, disk_dir=None, disk_max_bytes=2 * 1024 ** 3,
+                 disk_format='parquet'):
+        if disk_format not in ('parquet', 'feather'):
+            raise ValueError(f"Unsupported disk format: {disk_format}")
+        self.memory = LRUCache(max_entries)
+        self.disk_format = disk_format
+        self.disk_max_bytes = disk_max_bytes
+        self.disk_hits = 0
+        self.disk_dir = disk_dir if disk_dir and _pyarrow_available() else None
+        self._disk_lock = threading.Lock()
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def get_or_parse(self, data, parse_fn, version='1', digest=None):
+        """Return the parsed frame for ``data``, calling ``parse_fn()`` only on a miss
+
+        ``version`` is part of the key so a change in parsing output never
+        serves stale frames. Pass ``digest`` if the content hash of ``data``
+        is already known. Failed parses (``None``) are not cached.
+        """
+        key = f"{digest or content_hash(data)}-{version}"
+
+        df = self.memory.get(key)
+        if df is not None:
+            return df
+
+        df = self._read_disk(key)
+        if df is not None:
+            self.disk_hits += 1
+            self.memory.put(key, df)
+            return df
+
+        df = parse_fn()
+        if df is not None:
+            self.memory.put(key, df)
+            self._write_disk(key, df)
+        return df
+
+    def evict(self, data, version='1'):
+        """Drop the entry for ``data`` from both tiers"""
+        key = f"{content_hash(data)}-{version}"
+        evicted = self.memory.evict(key)
+        path = self._disk_path(key)
+        if path and os.path.exists(path):
+            os.remove(path)
+            evicted = True
+        return evicted
+
+    def clear(self):
+        """Drop every entry from both tiers"""
+        self.memory.clear()
+        if self.disk_dir:
+            with self._disk_lock:
+                for name in os.listdir(self.disk_dir):
+                    if name.endswith(f".{self.disk_format}"):
+                        os.remove(os.path.join(self.disk_dir, name))
+
+    def stats(self):
+        """Return memory-tier counters plus disk hits"""
+        stats = self.memory.stats()
+        stats['disk_hits'] = self.disk_hits
+        return stats
+
+    def _disk_path(self, key):
+        if not self.disk_dir:
+            return None
+        return os.path.join(self.disk_dir, f"{key}.{self.disk_format}")
+
+    def _read_disk(self, key):
+        path = self._disk_path(key)
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            if self.disk_format == 'parquet':
+                df = pd.read_parquet(path)
+            else:
+                df = pd.read_feather(path)
+        except Exception:
+            # Corrupt or partially written file: drop it and re-parse
+            os.remove(path)
+            return None
+        # Refresh mtime so eviction treats the file as recently used
+        os.utime(path)
+        return df
+
+    def _write_disk(self, key, df):
+        path = self._disk_path(key)
+        if not path:
+            return
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            if self.disk_format == 'parquet':
+                df.to_parquet(tmp_path, index=False)
+            else:
+                df.reset_index(drop=True).to_feather(tmp_path)
+            os.replace(tmp_path, path)
+        except Exception:
+            # The disk tier is best effort; the memory tier still holds the frame
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._enforce_disk_limit()
+
+    def _enforce_disk_limit(self):
+        with self._disk_lock:
+            files = []
+            for name in os.listdir(self.disk_dir):
+                if not name.endswith(f".{self.disk_format}"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(self.disk_dir, name))
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, name))
+            total = sum(size for _, size, _ in files)
+            for _, size, name in sorted(files):
+                if total <= self.disk_max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.disk_dir, name))
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+
+class ComparisonCache:
+    """Memoizes comparison results and their exports per input pair
+
+    Entries are keyed on ``pair_key(prev_digest, curr_digest, settings)``.
+    Each entry holds the results frame plus a small LRU of derived exports
+    (Excel bytes, .eml bytes, summaries) keyed by the view they were built
+    from, so evicting a pair also drops everything exported from it.
+    """
+
+    def __init__(self, max_entries=8, max_exports_per_entry=8):
+        self.entries = LRUCache(max_entries)
+        self.max_exports_per_entry = max_exports_per_entry
+        self.export_hits = 0
+        self.export_misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def pair_key(prev_digest, curr_digest, settings=()):
+        """Build the cache key for a (previous, current) file pair"""
+        return (prev_digest, curr_digest, tuple(settings))
+
+    def get_or_compare(self, key, compare_fn):
+        """Return the cached results for ``key``, calling ``compare_fn()`` only on a miss"""
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = _ComparisonEntry(compare_fn(), LRUCache(self.max_exports_per_entry))
+            self.entries.put(key, entry)
+        return entry.results
+
+    def get_or_export(self, key, export_key, export_fn):
+        """Return an export derived from the results for ``key``
+
+        ``export_key`` identifies the view (filters, format, recipient...).
+        The results for ``key`` must already be cached via get_or_compare;
+        otherwise the export is computed but not stored.
+        """
+        entry = self.entries.peek(key)
+        if entry is None:
+            with self._lock:
+                self.export_misses += 1
+            return export_fn()
+
+        value = entry.exports.get(export_key, _MISSING)
+        with self._lock:
+            if value is _MISSING:
+                self.export_misses += 1
+            else:
+                self.export_hits += 1
+        if value is _MISSING:
+            value = export_fn()
+            entry.exports.put(export_key, value)
+        return value
+
+    def evict(self, key):
+        """Drop the results and all exports for one input pair"""
+        return self.entries.evict(key)
+
+    def clear(self):
+        """Drop every cached comparison"""
+        self.entries.clear()
+
+    def stats(self):
+        """Return hit/miss counters for results and exports"""
+        stats = self.entries.stats()
+        with self._lock:
+            stats['export_hits'] = self.export_hits
+            stats['export_misses'] = self.export_misses
+        return stats
+
+
+class _ComparisonEntry:
+    __slots__ = ('results', 'exports')
+
+    def __init__(self, results, exports):
+        self.results = results
+        self.exports = exports
+
+
+_MISSING = object()
+
+
+def _pyarrow_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
@@ -0,0 +1,267 @@
+"""Change feed: every comparison run's results as typed Parquet and JSONL records
+
+    feed/
+        _runs.jsonl                                      one line per run, in the order written
+        parquet/run_date=2024-11-11/<run_id>.parquet
+        jsonl/run_date=2024-11-11/<run_id>.jsonl
+
+    settings = run_settings(duplicates='first', alert_rules=rules, push_history=True)
+    run_id = feed_run_id(history.pair_run_id(prev_digest, curr_digest), settings)
+    write_change_feed(results_df, 'feed/', run_id, settings=settings)
+
+    with ChangeFeedWriter('feed/', run_id, settings=settings) as feed:     # results arriving in parts
+        for results_df in parts:
+            feed.write(results_df)
+
+Every file has the same columns and types (FEED_COLUMNS) whatever the
+extract's key types, duplicate policy or push-history settings: keys are
+text, dates are dates, counts are nullable integers and Alert is a boolean.
+Runs are immutable and only ever added, so a consumer reads the run_date
+partitions (or the _runs.jsonl lines) it has not seen yet, and each
+format's folder reads as one hive-partitioned dataset with run_date as a
+column (e.g. ``pd.read_parquet('feed/parquet')``). A run's ID names the
+file pair and the settings that shaped its results (run_settings), so
+the same pair compared with other alert rules, another duplicate policy
+or without push history is a new run; writing a run ID that is already
+in the feed is refused. Files are written under a hidden temporary name
+and renamed when complete, so readers never see a partial run. Needs
+pyarrow.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import uuid
+from datetime import date, datetime
+
+import pandas as pd
+
+from po_compare.alerts import ALERT_FLAG, AlertRules
+
+# Bump when FEED_COLUMNS changes; stored in every Parquet file and index line
+FEED_SCHEMA_VERSION = 1
+
+FEED_FORMATS = ['parquet', 'jsonl']
+
+RUNS_INDEX = '_runs.jsonl'
+
+# Serializes publishing runs within the process (the app writes from several sessions)
+_index_lock = threading.Lock()
+
+# Feed column -> type, in file order. run_date is not stored in the files: it is
+# the partition folder, which dataset readers add as a column. Columns a run
+# does not produce (e.g. Schedule_Line, or Push_Count without history) are null
+FEED_COLUMNS = {
+    'run_id': 'string',
+    'PO_No': 'string',
+    'PO_Line': 'string',
+    'Schedule_Line': 'int',
+    'PN': 'string',
+    'PWO': 'string',
+    'PO_Type': 'string',
+    'Prev_ComDate': 'date',
+    'Curr_ComDate': 'date',
+    'Days_Pushed': 'int',
+    'Status': 'string',
+    'Alert': 'bool',
+    'Alert_Rule': 'string',
+    'Push_Count': 'int',
+    'Cum_Days_Pushed': 'int',
+    'First_Push_Date': 'date'
+}
+
+
+def feed_schema():
+    """The feed's Arrow schema"""
+    import pyarrow as pa
+
+    types = {'string': pa.string(), 'date': pa.date32(), 'int': pa.int64(), 'bool': pa.bool_()}
+    return pa.schema(
+        [(column, types[kind]) for column, kind in FEED_COLUMNS.items()],
+        metadata={'po_compare_feed_schema': str(FEED_SCHEMA_VERSION)}
+    )
+
+
+def feed_table(results_df, run_id):
+    """Results as an Arrow table of feed records (FEED_COLUMNS, in order and with their types)"""
+    import pyarrow as pa
+
+    records = {}
+    for column, kind in FEED_COLUMNS.items():
+        if column == 'run_id':
+            values = pd.Series(run_id, index=results_df.index, dtype='string')
+        elif column not in results_df.columns:
+            values = pd.Series(pd.NA, index=results_df.index, dtype=object)
+        elif column == 'Alert':
+            values = results_df[column] == ALERT_FLAG
+        elif kind == 'string':
+            # Categoricals, numeric keys and text all become text; '' (no rule matched) becomes null
+            values = results_df[column].astype('string').replace('', pd.NA)
+        elif kind == 'date':
+            values = pd.to_datetime(results_df[column])
+        else:
+            values = pd.to_numeric(results_df[column]).astype('Int64')
+        records[column] = values
+    schema = feed_schema()
+    table = pa.Table.from_pandas(pd.DataFrame(records), schema=schema, preserve_index=False)
+    # Without the pandas metadata, so every file has exactly the same schema whatever its content
+    return table.replace_schema_metadata(schema.metadata)
+
+
+def _json_lines(table):
+    """JSON Lines text of a feed table: dates as YYYY-MM-DD, nulls as null"""
+    import pyarrow as pa
+
+    for i, field in enumerate(table.schema):
+        if field.type == pa.date32():
+            table = table.set_column(i, field.name, table.column(i).cast(pa.string()))
+    df = table.to_pandas(types_mapper={
+        pa.string(): pd.StringDtype(), pa.int64(): pd.Int64Dtype(), pa.bool_(): pd.BooleanDtype()
+    }.get)
+    return df.to_json(orient='records', lines=True, force_ascii=False) if len(df) else ''
+
+
+def run_settings(duplicates='first', alert_rules=None, push_history=False):
+    """The settings that shape a run's results, as recorded in the runs index"""
+    return {
+        'duplicates': duplicates,
+        'alert_rules': (alert_rules or AlertRules()).rules,
+        'push_history': bool(push_history)
+    }
+
+
+def feed_run_id(run_id, settings):
+    """Feed run ID: a comparison's run ID (history.pair_run_id) plus a digest of its run_settings"""
+    digest = hashlib.sha256(json.dumps(settings, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    return f"{run_id}-{digest[:8]}"
+
+
+def recorded_runs(feed_dir):
+    """The runs in the feed's index: {run_id: index entry}, in the order written"""
+    try:
+        with open(os.path.join(feed_dir, RUNS_INDEX), encoding='utf-8') as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return {}
+    return {entry['run_id']: entry for entry in entries}
+
+
+def _already_recorded(feed_dir, run_id):
+    return ValueError(f"Run {run_id} is already in the change feed {feed_dir}; runs are never rewritten")
+
+
+class ChangeFeedWriter:
+    """Writes one run's results into the feed, in as many parts as they arrive
+
+    Used as a context manager: the run is published when the block ends and
+    discarded if it raises. Without one, call close() (or abort()).
+    Raises ValueError if the run ID is already in the feed. ``settings``
+    (see run_settings) is recorded with the run in the index.
+    """
+
+    def __init__(self, feed_dir, run_id, run_date=None, formats=FEED_FORMATS, settings=None):
+        unknown = set(formats) - set(FEED_FORMATS)
+        if unknown or not formats:
+            raise ValueError(f"Unknown change feed formats {sorted(unknown)}; expected some of {FEED_FORMATS}")
+        if run_id in recorded_runs(feed_dir):
+            raise _already_recorded(feed_dir, run_id)
+        self.feed_dir = feed_dir
+        self.run_id = run_id
+        self.run_date = run_date or date.today()
+        self.settings = settings
+        name = re.sub(r'[^\w.-]+', '_', run_id)
+        self.paths, self._temp_paths = {}, {}
+        token = uuid.uuid4().hex[:12]
+        for fmt in formats:
+            partition = os.path.join(feed_dir, fmt, f"run_date={self.run_date.isoformat()}")
+            os.makedirs(partition, exist_ok=True)
+            self.paths[fmt] = os.path.join(partition, f"{name}.{fmt}")
+            # Dot-prefixed, so dataset readers skip it until it is renamed; unique per writer
+            self._temp_paths[fmt] = os.path.join(partition, f".{name}.{token}.{fmt}.tmp")
+        self.rows = 0
+        self._parquet = None
+        self._jsonl = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, results_df):
+        """Append one part of the run's results"""
+        table = feed_table(results_df, self.run_id)
+        if 'parquet' in self.paths:
+            if self._parquet is None:
+                import pyarrow.parquet as pq
+
+                self._parquet = pq.ParquetWriter(self._temp_paths['parquet'], table.schema)
+            if table.num_rows:
+                self._parquet.write_table(table)
+        if 'jsonl' in self.paths:
+            if self._jsonl is None:
+                self._jsonl = open(self._temp_paths['jsonl'], 'w', encoding='utf-8')
+            self._jsonl.write(_json_lines(table))
+        self.rows += table.num_rows
+
+    def _close_files(self):
+        if self._parquet is not None:
+            self._parquet.close()
+            self._parquet = None
+        if self._jsonl is not None:
+            self._jsonl.close()
+            self._jsonl = None
+
+    def close(self):
+        """Publish the run: rename its files into place and add it to the index; returns the paths"""
+        if self._parquet is None and self._jsonl is None:
+            # No parts at all: still publish the (empty) run with its schema
+            self.write(pd.DataFrame())
+        self._close_files()
+        if self.rows == 0 and 'jsonl' in self.paths:
+            # JSON readers reject empty files; an empty run has no .jsonl (the index still lists it)
+            os.remove(self._temp_paths.pop('jsonl'))
+            self.paths.pop('jsonl')
+
+        entry = {
+            'run_id': self.run_id,
+            'run_date': self.run_date.isoformat(),
+            'rows': self.rows,
+            'files': [os.path.relpath(path, self.feed_dir) for path in self.paths.values()],
+            'settings': self.settings,
+            'schema_version': FEED_SCHEMA_VERSION,
+            'written_at': datetime.now().isoformat(timespec='seconds')
+        }
+        with _index_lock:
+            # Another session may have published the same run since this one started
+            if self.run_id in recorded_runs(self.feed_dir):
+                self.abort()
+                raise _already_recorded(self.feed_dir, self.run_id)
+            for fmt, path in self.paths.items():
+                os.replace(self._temp_paths[fmt], path)
+            with open(os.path.join(self.feed_dir, RUNS_INDEX), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+        return list(self.paths.values())
+
+    def abort(self):
+        """Drop the run's partly written files"""
+        self._close_files()
+        for path in self._temp_paths.values():
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def write_change_feed(results_df, feed_dir, run_id, run_date=None, formats=FEED_FORMATS, settings=None):
+    """Write one run's results into the feed; returns the files written"""
+    writer = ChangeFeedWriter(feed_dir, run_id, run_date, formats, settings)
+    try:
+        writer.write(results_df)
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.close()
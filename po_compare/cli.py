@@ -0,0 +1,465 @@
+"""Headless command-line entry point: ``po-compare`` (or ``python -m po_compare``)
+
+Examples:
+    po-compare compare prev_week.xlsx curr_week.xlsx -o results.xlsx
+    po-compare compare weekly_extracts/ -o timeline.parquet
+    po-compare compare curr_week.xlsx --baseline-dir baselines/ -o results.xlsx
+    po-compare compare prev_week.xlsx curr_week.xlsx --feed-dir feed/ -o results.xlsx
+    po-compare compare global_prev.csv global_curr.csv --out-of-core --memory-mb 2048 -o results.csv
+    po-compare batch extracts/ -o batch_results/ --workers 8
+    po-compare inspect big_extract.xlsx
+    po-compare warm --check
+
+pandas and the comparison engine are imported inside the command handlers,
+so argument parsing and ``--help`` stay fast.
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime
+
+EXCEL_SUFFIXES = ('.xlsx', '.xls')
+
+# Same values as po_compare.parsing.EXCEL_ENGINES (not imported, it pulls in pandas)
+ENGINE_CHOICES = ['auto', 'calamine', 'openpyxl', 'xlrd']
+
+# Same values as po_compare.diff.DUPLICATE_POLICIES
+DUPLICATE_CHOICES = ['first', 'earliest', 'latest', 'all']
+
+
+def expand_inputs(paths):
+    """Expand directories into their Excel files (sorted by name); keep files as given"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(
+                os.path.join(path, name) for name in sorted(os.listdir(path))
+                if name.lower().endswith(EXCEL_SUFFIXES) and not name.startswith('~$')
+            )
+        elif os.path.isfile(path):
+            files.append(path)
+        else:
+            raise FileNotFoundError(f"{path} not found")
+    return files
+
+
+def _file_digest(path):
+    """SHA-256 of a file (the same digest as cache.content_hash of its bytes), read in blocks"""
+    import hashlib
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(2 ** 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cmd_compare(args):
+    """Compare two extracts, or build a timeline over three or more"""
+    from po_compare.diagnostics import RunDiagnostics
+    from po_compare.diff import count_duplicate_lines
+    from po_compare.export import write_results
+    from po_compare.timeline import parse_snapshots
+
+    if args.baseline and not args.baseline_dir:
+        print("❌ --baseline needs --baseline-dir", file=sys.stderr)
+        return 2
+    inputs = expand_inputs(args.inputs)
+    if len(inputs) < 2 and not (args.baseline_dir and len(inputs) == 1):
+        print("❌ Need at least two Excel files to compare (or one with --baseline-dir)", file=sys.stderr)
+        return 2
+    if len(inputs) > 2 and args.duplicates == 'all':
+        print("❌ --duplicates all only applies to two-week comparisons; the timeline keeps one row per line",
+              file=sys.stderr)
+        return 2
+    if len(inputs) > 2 and args.feed_dir:
+        print("❌ --feed-dir records two-week comparisons, not a timeline", file=sys.stderr)
+        return 2
+    if not args.feed_dir and os.environ.get('PO_COMPARE_FEED_DIR'):
+        # A feed set for every run only applies where it can: timelines are skipped, not refused
+        if len(inputs) > 2:
+            print("ℹ️ Timelines are not recorded in the change feed (PO_COMPARE_FEED_DIR)", file=sys.stderr)
+        else:
+            args.feed_dir = os.environ['PO_COMPARE_FEED_DIR']
+
+    alert_rules = _load_alert_rules(args.alert_rules)
+    diagnostics = RunDiagnostics(log_path=args.diagnostics_log, profile=bool(args.profile))
+    if args.out_of_core:
+        if len(inputs) != 2 or args.baseline_dir:
+            print("❌ --out-of-core compares exactly two files (no timeline or --baseline-dir)", file=sys.stderr)
+            return 2
+        return _compare_out_of_core(args, inputs, alert_rules, diagnostics)
+    print(f"📂 Parsing {len(inputs)} files...", file=sys.stderr)
+    with diagnostics.stage('parse') as stage:
+        parsed = parse_snapshots(inputs, engine=args.engine, max_workers=args.workers)
+        stage['rows'] = sum(len(df) for df, _ in parsed)
+    for path, (_, missing_cols) in zip(inputs, parsed):
+        if missing_cols:
+            print(f"❌ {path}: missing columns after mapping: {', '.join(missing_cols)}", file=sys.stderr)
+            return 1
+    frames = [df for df, _ in parsed]
+    for path, df in zip(inputs, frames):
+        duplicate_count = count_duplicate_lines(df)
+        if duplicate_count:
+            print(f"⚠️ {os.path.basename(path)}: {duplicate_count} repeated PO lines, matched by '{args.duplicates}'",
+                  file=sys.stderr)
+    digests = [_file_digest(path) for path in inputs] if args.history or args.baseline_dir or args.feed_dir else None
+
+    incremental = False
+    if args.baseline_dir:
+        from po_compare.baseline import BaselineStore
+
+        store = BaselineStore(args.baseline_dir)
+        if len(frames) == 1:
+            # Single file: compare it against a stored week
+            entry = _find_baseline(store, args.baseline, exclude_digest=digests[0])
+            if entry is None:
+                wanted = f"'{args.baseline}'" if args.baseline else 'week'
+                print(f"❌ No stored baseline {wanted} in {args.baseline_dir}", file=sys.stderr)
+                return 1
+            print(f"📌 Baseline: {entry['name']} (saved {entry['saved_at']})", file=sys.stderr)
+            with diagnostics.stage('load_baseline') as stage:
+                frames.insert(0, store.load(entry['digest']))
+                stage['rows'] = len(frames[0])
+            digests.insert(0, entry['digest'])
+            incremental = True
+        with diagnostics.stage('store_baseline', rows=sum(len(df) for df, _ in parsed)):
+            for path, (df, _), digest in zip(inputs, parsed, digests[-len(inputs):]):
+                store.save(df, digest, os.path.basename(path))
+
+    run_id = feed_run = feed_settings = None
+    if len(frames) == 2 and digests:
+        from po_compare.history import pair_run_id
+
+        run_id = pair_run_id(*digests)
+        feed_run, feed_settings = _feed_run(args, run_id, alert_rules)
+    if len(frames) == 2:
+        with diagnostics.stage('compare') as stage:
+            sheets = {'Comparison Results': _compare_pair(frames, run_id, args.history, incremental, args.duplicates,
+                                                          alert_rules)}
+            stage['rows'] = len(sheets['Comparison Results'])
+    else:
+        from po_compare.timeline import build_timeline, push_trajectories, timeline_changes
+
+        with diagnostics.stage('timeline') as stage:
+            timeline_df = build_timeline(frames, labels=[os.path.basename(path) for path in inputs],
+                                         duplicates=args.duplicates)
+            changes_df = timeline_changes(timeline_df, alert_rules=alert_rules)
+            sheets = {
+                'Weekly Changes': changes_df,
+                'Push Trajectories': push_trajectories(timeline_df, changes_df)
+            }
+            stage['rows'] = len(changes_df)
+
+    results_df = next(iter(sheets.values()))
+    if args.alerts_only:
+        sheets = {name: df[df['Alert'] != ''] if 'Alert' in df.columns else df for name, df in sheets.items()}
+
+    output = args.output or f"po_comparison_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    with diagnostics.stage('export', rows=sum(len(df) for df in sheets.values())):
+        written = write_results(sheets, output)
+    if feed_run:
+        from po_compare.changefeed import write_change_feed
+
+        with diagnostics.stage('change_feed', rows=len(results_df)):
+            written += write_change_feed(results_df, args.feed_dir, feed_run, settings=feed_settings)
+
+    print(f"✅ {len(results_df)} changes found")
+    for status, count in results_df['Status'].value_counts().items():
+        if count:
+            print(f"   - {status}: {count}")
+    print(f"   - Alerts: {int((results_df['Alert'] != '').sum())}")
+    for path in written:
+        print(f"💾 {path}")
+    print(f"⏱️ {diagnostics.summary()}", file=sys.stderr)
+    diagnostics.write_log()
+    if args.profile:
+        print(f"🔬 Profile: {diagnostics.dump_profile(args.profile)}", file=sys.stderr)
+    return 0
+
+
+def _compare_out_of_core(args, inputs, alert_rules, diagnostics):
+    """Two-file compare through Parquet partitions, streaming results to the output file"""
+    from po_compare.export import write_result_chunks
+    from po_compare.partitioned import compare_out_of_core
+
+    print(f"📂 Partitioning both files ({args.memory_mb} MB budget)...", file=sys.stderr)
+
+    history = run_id = feed = None
+    if args.history or args.feed_dir:
+        from po_compare.history import pair_run_id
+
+        run_id = pair_run_id(*[_file_digest(path) for path in inputs])
+    if args.history:
+        from po_compare.history import HistoryStore
+
+        history = HistoryStore(args.history)
+    feed_run, feed_settings = _feed_run(args, run_id, alert_rules)
+    if feed_run:
+        from po_compare.changefeed import ChangeFeedWriter
+
+        feed = ChangeFeedWriter(args.feed_dir, feed_run, settings=feed_settings)
+
+    status_counts, alerts = {}, 0
+
+    def results():
+        nonlocal alerts
+        for results_df in compare_out_of_core(*inputs, memory_mb=args.memory_mb, work_dir=args.work_dir,
+                                              history=history, run_id=run_id, duplicates=args.duplicates,
+                                              alert_rules=alert_rules, diagnostics=diagnostics):
+            if history is not None:
+                history.record_run(results_df, run_id)
+            if feed is not None:
+                feed.write(results_df)
+            for status, count in results_df['Status'].value_counts().items():
+                status_counts[status] = status_counts.get(status, 0) + count
+            alerts += int((results_df['Alert'] != '').sum())
+            yield results_df[results_df['Alert'] != ''] if args.alerts_only else results_df
+
+    output = args.output or f"po_comparison_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    written = [output]
+    try:
+        with diagnostics.stage('compare_export') as stage:
+            stage['rows'] = write_result_chunks(results(), output)
+    except ValueError as e:
+        if feed is not None:
+            feed.abort()
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    except BaseException:
+        if feed is not None:
+            feed.abort()
+        raise
+    if feed is not None:
+        written += feed.close()
+
+    print(f"✅ {sum(status_counts.values())} changes found")
+    for status, count in status_counts.items():
+        if count:
+            print(f"   - {status}: {count}")
+    print(f"   - Alerts: {alerts}")
+    for path in written:
+        print(f"💾 {path}")
+    print(f"⏱️ {diagnostics.summary()}", file=sys.stderr)
+    diagnostics.write_log()
+    if args.profile:
+        print(f"🔬 Profile: {diagnostics.dump_profile(args.profile)}", file=sys.stderr)
+    return 0
+
+
+def _find_baseline(store, wanted=None, exclude_digest=None):
+    """Newest stored week, or the newest whose file name or digest prefix is ``wanted``"""
+    for entry in store.snapshots():
+        if entry['digest'] == exclude_digest:
+            continue
+        if wanted is None or entry['name'] == wanted or entry['digest'].startswith(wanted):
+            return entry
+    return None
+
+
+def _load_alert_rules(path):
+    """Alert rules from a JSON file, or the default rule"""
+    from po_compare.alerts import AlertRules
+
+    return AlertRules.from_file(path) if path else AlertRules()
+
+
+def _feed_run(args, run_id, alert_rules):
+    """(feed run ID, settings) for this comparison, or (None, None) without a feed or if the run is already in it"""
+    if not args.feed_dir:
+        return None, None
+    from po_compare.changefeed import feed_run_id, recorded_runs, run_settings
+
+    settings = run_settings(args.duplicates, alert_rules, push_history=bool(args.history))
+    feed_run = feed_run_id(run_id, settings)
+    recorded = recorded_runs(args.feed_dir).get(feed_run)
+    if recorded:
+        print(f"ℹ️ Run {feed_run} is already in the change feed (written {recorded['run_date']}), not written again",
+              file=sys.stderr)
+        return None, None
+    return feed_run, settings
+
+
+def _compare_pair(frames, run_id, history_path, incremental=False, duplicates='first', alert_rules=None):
+    if incremental:
+        from po_compare.baseline import compare_incremental as compare
+    else:
+        from po_compare.diff import compare_po_lines as compare
+
+    if not history_path:
+        return compare(*frames, duplicates=duplicates, alert_rules=alert_rules)
+
+    from po_compare.history import HistoryStore
+
+    history = HistoryStore(history_path)
+    results_df = compare(*frames, history=history, run_id=run_id, duplicates=duplicates, alert_rules=alert_rules)
+    history.record_run(results_df, run_id)
+    return results_df
+
+
+def cmd_batch(args):
+    """Compare every prev/curr pair found under a directory tree"""
+    from po_compare.batch import find_pairs, run_batch
+
+    pairs, unmatched = find_pairs(args.root, pattern=args.pattern,
+                                  prev_token=args.prev_token, curr_token=args.curr_token)
+    for path in unmatched:
+        print(f"⚠️ No counterpart for {path}, skipped", file=sys.stderr)
+    if not pairs:
+        print(f"❌ No prev/curr pairs found under {args.root}", file=sys.stderr)
+        return 2
+
+    print(f"📂 Comparing {len(pairs)} pairs...", file=sys.stderr)
+
+    def progress(done, total, report):
+        if report['Status'] == 'ok':
+            detail = f"{report['Changes']} changes, {report['Alerts']} alerts"
+        else:
+            detail = f"❌ {report['Error']}"
+        print(f"[{done}/{total}] {report['Pair']}: {detail} ({report['Total_Seconds']:.2f}s)", file=sys.stderr)
+
+    report_df = run_batch(pairs, args.output, fmt=args.format, engine=args.engine,
+                          max_workers=args.workers, progress=progress, duplicates=args.duplicates,
+                          alert_rules=_load_alert_rules(args.alert_rules))
+
+    ok = report_df[report_df['Status'] == 'ok']
+    print(f"✅ {len(ok)}/{len(report_df)} pairs compared, {int(ok['Changes'].sum())} changes, "
+          f"{int(ok['Alerts'].sum())} alerts")
+    timing_columns = ['Pair', 'Parse_Seconds', 'Compare_Seconds', 'Write_Seconds', 'Total_Seconds']
+    print(report_df[timing_columns].to_string(index=False))
+    print(f"💾 {os.path.join(args.output, 'batch_report.csv')}")
+    return 0 if len(ok) == len(report_df) else 1
+
+
+def cmd_inspect(args):
+    """Print the parsed schema and its memory use next to the legacy object layout"""
+    from po_compare.parsing import memory_report, read_po_file
+
+    df, missing_cols = read_po_file(args.file, engine=args.engine)
+    if missing_cols:
+        print(f"⚠️ Missing columns after mapping: {', '.join(missing_cols)}", file=sys.stderr)
+
+    report = memory_report(df)
+    total, legacy_total = report.loc['Total', 'bytes'], report.loc['Total', 'legacy_bytes']
+    report['MB'] = (report['bytes'] / 2**20).round(2)
+    report['legacy_MB'] = (report['legacy_bytes'] / 2**20).round(2)
+    print(f"{len(df)} rows")
+    print(report[['dtype', 'MB', 'legacy_MB']].to_string())
+    print(f"Compact schema uses {total / legacy_total:.0%} of the legacy layout's memory")
+    return 0
+
+
+def cmd_warm(args):
+    """Load the reader, diff engine and writers once (e.g. before starting the app); --check enforces import budgets"""
+    from po_compare.warmup import check_import_budgets, prewarm
+
+    timings = prewarm()
+    print("🔥 Warmed up: " + ", ".join(f"{step} {seconds:.2f}s" for step, seconds in timings.items()))
+    if not args.check:
+        return 0
+
+    failed = 0
+    for module, ms, budget_ms, unexpected, ok in check_import_budgets():
+        detail = f"loads {', '.join(unexpected)}" if unexpected else ''
+        print(f"{'✅' if ok else '❌'} {module}: {ms:.1f} ms (budget {budget_ms} ms) {detail}".rstrip())
+        failed += not ok
+    return 1 if failed else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='po-compare',
+        description='Compare weekly PO line extracts without the web UI.'
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    compare = subparsers.add_parser(
+        'compare',
+        help='compare two extracts (or build a timeline over three or more)',
+        description='Two inputs give a week-over-week comparison; three or more '
+                    '(in name order when a directory is given) give a multi-week timeline.'
+    )
+    compare.add_argument('inputs', nargs='+', help='Excel files or directories of Excel files, oldest first')
+    compare.add_argument('-o', '--output', help='output file: .xlsx, .csv or .parquet '
+                                                '(default: po_comparison_<timestamp>.xlsx)')
+    compare.add_argument('--engine', choices=ENGINE_CHOICES, default='auto', help='Excel reader (default: auto)')
+    compare.add_argument('--duplicates', choices=DUPLICATE_CHOICES, default='first',
+                         help='how a PO line repeated within a week is matched: first row, earliest/latest '
+                              'ComDate, or all schedule lines (default: first)')
+    compare.add_argument('--workers', type=int, help='parser processes (default: CPU count)')
+    compare.add_argument('--history', help='SQLite push-history file used for re-push detection and updated with this run')
+    compare.add_argument('--baseline-dir', metavar='DIR',
+                         help='store every input week in DIR; a single input is compared with the newest stored week')
+    compare.add_argument('--baseline', metavar='NAME_OR_DIGEST',
+                         help='with --baseline-dir: compare against this stored week instead of the newest')
+    compare.add_argument('--alert-rules', metavar='FILE',
+                         help='JSON file of alert rules (see README; default: pushed more than 7 days)')
+    compare.add_argument('--out-of-core', action='store_true',
+                         help='for two extracts larger than memory (.xlsx, .csv or .parquet): partition both '
+                              'on disk and compare partition by partition, streaming results to the output')
+    compare.add_argument('--memory-mb', type=int, default=int(os.environ.get('PO_COMPARE_MEMORY_MB', '1024')),
+                         help='with --out-of-core: working memory budget that sets chunk size and partition '
+                              'count (default: $PO_COMPARE_MEMORY_MB or 1024)')
+    compare.add_argument('--work-dir', metavar='DIR',
+                         help='with --out-of-core: where the partitions are written (default: system temp dir)')
+    compare.add_argument('--alerts-only', action='store_true', help='only write lines with an alert')
+    compare.add_argument('--feed-dir', metavar='DIR',
+                         help='also append the run (all changes, typed) to the change feed in DIR as Parquet and '
+                              'JSON Lines partitioned by run date (default: $PO_COMPARE_FEED_DIR, which timelines '
+                              'skip)')
+    compare.add_argument('--diagnostics-log', help='append per-stage timings and memory as JSON lines to this file')
+    compare.add_argument('--profile', metavar='FILE', help='write a cProfile dump of the run (open with snakeviz or pstats)')
+    compare.set_defaults(handler=cmd_compare)
+
+    batch = subparsers.add_parser(
+        'batch',
+        help='compare every prev/curr pair found under a directory tree',
+        description='Files are paired by --pattern, a regex with named groups "key" (which pair) '
+                    'and "role" (prev or curr). Each pair is compared in its own worker process.'
+    )
+    batch.add_argument('root', help='directory to search (recursively)')
+    batch.add_argument('-o', '--output', required=True, help='output directory for per-pair results, '
+                                                             'summary and batch_report.csv')
+    batch.add_argument('--pattern', default=r'(?P<key>.+)_(?P<role>prev|curr)\.xlsx?$',
+                       help='file-name regex (default: <key>_prev.xlsx / <key>_curr.xlsx)')
+    batch.add_argument('--prev-token', default='prev', help='"role" value of previous-week files (default: prev)')
+    batch.add_argument('--curr-token', default='curr', help='"role" value of current-week files (default: curr)')
+    batch.add_argument('--format', choices=['xlsx', 'csv', 'parquet'], default='xlsx', help='output format (default: xlsx)')
+    batch.add_argument('--engine', choices=ENGINE_CHOICES, default='auto', help='Excel reader (default: auto)')
+    batch.add_argument('--duplicates', choices=DUPLICATE_CHOICES, default='first',
+                       help='how a PO line repeated within a week is matched (see compare --help; default: first)')
+    batch.add_argument('--alert-rules', metavar='FILE', help='JSON file of alert rules (default: pushed more than 7 days)')
+    batch.add_argument('--workers', type=int, help='worker processes (default: CPU count)')
+    batch.set_defaults(handler=cmd_batch)
+
+    inspect = subparsers.add_parser('inspect', help="show an extract's parsed schema and memory use")
+    inspect.add_argument('file', help='Excel file')
+    inspect.add_argument('--engine', choices=ENGINE_CHOICES, default='auto', help='Excel reader (default: auto)')
+    inspect.set_defaults(handler=cmd_inspect)
+
+    warm = subparsers.add_parser(
+        'warm',
+        help='load the reader, diff engine and writers once, e.g. before starting the web app',
+        description='Runs a two-line comparison end to end so module compilation and first-call '
+                    'setup are done before the first real run.'
+    )
+    warm.add_argument('--check', action='store_true',
+                      help='also import each startup module in a fresh interpreter and fail when one is over '
+                           'its import-time budget or loads a dependency it should leave for later')
+    warm.set_defaults(handler=cmd_warm)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.handler(args)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
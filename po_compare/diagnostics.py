@@ -0,0 +1,151 @@
+"""Per-stage timing and memory instrumentation for a comparison run
+
+    diagnostics = RunDiagnostics(log_path='po_compare_runs.jsonl')
+    with diagnostics.stage('compare') as stage:
+        results_df = compare_po_lines(prev_df, curr_df)
+        stage['rows'] = len(results_df)
+    diagnostics.write_log()
+
+Memory is resident set size, per stage: ``peak_rss_mb`` is the highest
+it got while the stage ran and ``rss_growth_mb`` how much more the process
+holds when the stage ends than when it began. On Linux the kernel's peak
+counter is reset when a stage starts (``/proc/self/clear_refs``), so the
+peak belongs to that stage, not to whatever ran earlier in the process.
+Elsewhere, and where the reset is not permitted, memory columns are empty.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+DIAGNOSTIC_COLUMNS = ['stage', 'seconds', 'rows', 'peak_rss_mb', 'rss_growth_mb', 'error']
+
+# Stages running anywhere in the process -> highest peak seen so far; resetting
+# the kernel's counter first folds it into every open stage, so concurrent and
+# nested stages keep their own peaks
+_open_peaks = {}
+_peaks_lock = threading.Lock()
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB, or None when unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident_pages * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+
+def _peak_rss_since_reset_mb():
+    """The kernel's peak resident set size (VmHWM) in MB, or None"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _reset_peak_rss():
+    """Start a new peak: fold the current one into the open stages, then reset it; False if not possible"""
+    peak = _peak_rss_since_reset_mb()
+    if peak is None:
+        return False
+    for key, seen in _open_peaks.items():
+        _open_peaks[key] = max(seen, peak)
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        return False
+    return True
+
+
+class RunDiagnostics:
+    """One record per pipeline stage (wall time, rows, memory), plus an optional profile
+
+    With ``profile=True`` a cProfile profiler runs from construction until
+    ``dump_profile``.
+    """
+
+    def __init__(self, run_id=None, log_path=None, profile=False):
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.log_path = log_path
+        self.records = []
+        self._profiler = None
+        if profile:
+            import cProfile
+
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        """Time the block as stage ``name``; set ``rows`` on the yielded record if known later"""
+        record = {
+            'run_id': self.run_id,
+            'timestamp': datetime.now().isoformat(timespec='milliseconds'),
+            'stage': name,
+            'rows': rows,
+            'error': None
+        }
+        key = object()
+        with _peaks_lock:
+            tracked = _reset_peak_rss()
+            _open_peaks[key] = 0.0
+        rss_before = current_rss_mb()
+        started = time.perf_counter()
+        try:
+            yield record
+        except BaseException as e:
+            record['error'] = type(e).__name__
+            raise
+        finally:
+            record['seconds'] = round(time.perf_counter() - started, 4)
+            with _peaks_lock:
+                peak = max(_open_peaks.pop(key), _peak_rss_since_reset_mb() or 0.0)
+            rss_after = current_rss_mb()
+            record['peak_rss_mb'] = round(peak, 1) if tracked else None
+            record['rss_growth_mb'] = None if rss_after is None or rss_before is None \
+                else round(rss_after - rss_before, 1)
+            self.records.append(record)
+
+    def to_frame(self):
+        """Stage records as a DataFrame, in the order the stages finished"""
+        return pd.DataFrame(self.records, columns=DIAGNOSTIC_COLUMNS)
+
+    def summary(self):
+        """One-line 'stage 0.12s, ...' summary"""
+        return ', '.join(f"{record['stage']} {record['seconds']:.2f}s" for record in self.records)
+
+    def write_log(self, path=None):
+        """Append the records as JSON lines to ``path`` (default: ``log_path``); no-op without one"""
+        path = path or self.log_path
+        if not path or not self.records:
+            return None
+        with open(path, 'a', encoding='utf-8') as f:
+            for record in self.records:
+                f.write(json.dumps(record) + '\n')
+        return path
+
+    def dump_profile(self, path):
+        """Stop the profiler and write its stats (pstats format) to ``path``
+
+        Open the file with ``python -m pstats`` or a viewer such as snakeviz
+        for a flame/icicle chart. Returns None when profiling is off.
+        """
+        if self._profiler is None:
+            return None
+        self._profiler.disable()
+        self._profiler.dump_stats(path)
+        self._profiler = None
+        return path
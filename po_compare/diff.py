@@ -0,0 +1,261 @@
+"""Week-over-week comparison of PO lines (pushes, pull-backs, splits, re-pushes)"""
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from po_compare.alerts import ALERT_FLAG, ALERT_THRESHOLD_DAYS, AlertRules  # noqa: F401  (re-exported)
+from po_compare.history import line_ids
+from po_compare.parsing import check_line_keys
+
+# Every Status a comparison can produce; results carry Status as this categorical
+STATUSES = ['Pushed', 'Re-Pushed', 'Re-Pushed (>7 days)', 'Pulled Back', 'Split']
+
+# How a PO_LineID repeated within one week (schedule lines) is matched: the
+# 'first' row in file order, the 'earliest' or 'latest' ComDate, or 'all'
+# schedule lines, paired across weeks by their order within the line
+DUPLICATE_POLICIES = ['first', 'earliest', 'latest', 'all']
+
+RESULT_COLUMNS = [
+    'PO_No', 'PO_Line', 'PN', 'PWO', 'PO_Type',
+    'Prev_ComDate', 'Curr_ComDate', 'Days_Pushed', 'Status', 'Alert', 'Alert_Rule'
+]
+
+
+def count_duplicate_lines(df):
+    """Number of rows whose PO_LineID already occurred earlier in the same week"""
+    return int(df['PO_LineID'].duplicated().sum())
+
+
+def schedule_lines(df):
+    """1-based position of each row among the rows sharing its PO_LineID, in file order"""
+    return (df.groupby('PO_LineID', sort=False).cumcount() + 1).astype('uint16')
+
+
+def dedupe_lines(df, policy='first'):
+    """Keep one row per PO_LineID, chosen by ``policy``, in file order
+
+    'first' keeps the first row in file order; 'earliest' and 'latest' keep
+    the row with the earliest/latest ComDate (undated rows only when a line
+    has no dated row, ties go to the first row). One stable sort plus a
+    ``duplicated`` pass, no per-line work.
+    """
+    if policy == 'first':
+        return df.drop_duplicates('PO_LineID', keep='first')
+    if policy not in ('earliest', 'latest'):
+        raise ValueError(f"Unknown duplicate policy {policy!r}; expected one of {DUPLICATE_POLICIES}")
+
+    # Positions ordered by date, then the first position per line, then back to file order
+    by_date = df['ComDate'].reset_index(drop=True).sort_values(
+        ascending=policy == 'earliest', kind='stable', na_position='last'
+    ).index.to_numpy()
+    chosen = by_date[~pd.Series(df['PO_LineID'].to_numpy()[by_date]).duplicated().to_numpy()]
+    return df.iloc[np.sort(chosen)]
+
+
+def _detect_date_changes(prev_df, curr_df, duplicates='first'):
+    """Join both weeks on PO_LineID and return one result row per changed ComDate.
+
+    Repeated PO_LineIDs are resolved by the ``duplicates`` policy: reduced to
+    one row per line (``dedupe_lines``), or, with 'all', kept and joined on
+    (PO_LineID, Schedule_Line). Either way the cost is a single hash join
+    plus a few column operations: run time grows linearly with the number of
+    lines instead of quadratically.
+    """
+    if duplicates == 'all':
+        keys = ['PO_LineID', 'Schedule_Line']
+        prev_lines, curr_lines = prev_df, curr_df
+    else:
+        keys = ['PO_LineID']
+        prev_lines = dedupe_lines(prev_df, duplicates)
+        curr_lines = dedupe_lines(curr_df, duplicates)
+
+    merged = curr_lines.merge(
+        prev_lines[keys + ['ComDate']].rename(columns={'ComDate': 'Prev_ComDate'}),
+        on=keys,
+        how='inner'
+    )
+
+    # Only lines dated in both weeks whose date moved (pushed OR pulled back)
+    changed = merged[
+        merged['Prev_ComDate'].notna()
+        & merged['ComDate'].notna()
+        & (merged['ComDate'] != merged['Prev_ComDate'])
+    ]
+    days_pushed = (changed['ComDate'] - changed['Prev_ComDate']).dt.days
+
+    return _with_schedule_line(changed, {
+        'PO_No': changed['PO_No'],
+        'PO_Line': changed['PO_Line'],
+        'PN': changed['PN'] if 'PN' in changed.columns else '',
+        'PWO': changed['PWO'] if 'PWO' in changed.columns else '',
+        'PO_Type': changed['PO_Type'] if 'PO_Type' in changed.columns else '',
+        'Prev_ComDate': changed['Prev_ComDate'],
+        'Curr_ComDate': changed['ComDate'],
+        'Days_Pushed': days_pushed,
+        'Status': np.where(days_pushed > 0, 'Pushed', 'Pulled Back'),
+        'Alert': '',
+        'Alert_Rule': ''
+    })
+
+
+def _build_po_index(prev_df, curr_df):
+    """Build a per-PO index with line counts, PN overlap and new-line counts.
+
+    Everything is computed once with groupby/merge instead of filtering both
+    frames for every PO number.
+    """
+    new_line_mask = ~curr_df['PO_LineID'].isin(prev_df['PO_LineID'])
+
+    po_index = pd.DataFrame({
+        'prev_lines': prev_df.groupby('PO_No', sort=False, observed=True).size(),
+        'curr_lines': curr_df.groupby('PO_No', sort=False, observed=True).size(),
+        'new_lines': new_line_mask.groupby(curr_df['PO_No'], sort=False, observed=True).sum()
+    })
+    po_index = po_index[po_index['prev_lines'].notna()].fillna(0).astype(int)
+
+    # POs whose previous and current PN sets intersect
+    shared_pns = prev_df[['PO_No', 'PN']].drop_duplicates().merge(
+        curr_df[['PO_No', 'PN']].drop_duplicates(),
+        on=['PO_No', 'PN']
+    )
+    po_index['shared_pn'] = po_index.index.isin(shared_pns['PO_No'])
+
+    return po_index, new_line_mask
+
+
+def detect_splits(prev_df, curr_df):
+    """Return 'Split' result rows for new lines on POs that gained lines with the same PNs
+
+    The split half of ``compare_po_lines``, with the same columns and row
+    order, for callers (like the benchmark) that want it on its own.
+    """
+    po_index, new_line_mask = _build_po_index(prev_df, curr_df)
+
+    split_pos = po_index.index[
+        (po_index['curr_lines'] > po_index['prev_lines'])
+        & po_index['shared_pn']
+        & (po_index['new_lines'] > 0)
+    ]
+    split_lines = curr_df[new_line_mask & curr_df['PO_No'].isin(split_pos)]
+
+    # Keep previous-week PO order, then current-week row order within each PO
+    # (plain values: a categorical PO_No would otherwise order by its categories)
+    prev_po_nos = pd.unique(prev_df['PO_No'].drop_duplicates().to_numpy())
+    po_order = pd.Series(range(len(prev_po_nos)), index=prev_po_nos)
+    split_lines = split_lines.iloc[
+        po_order.reindex(split_lines['PO_No'].to_numpy()).to_numpy().argsort(kind='stable')
+    ]
+
+    return _with_schedule_line(split_lines, {
+        'PO_No': split_lines['PO_No'],
+        'PO_Line': split_lines['PO_Line'],
+        'PN': split_lines['PN'],
+        'PWO': split_lines['PWO'] if 'PWO' in split_lines.columns else '',
+        'PO_Type': split_lines['PO_Type'] if 'PO_Type' in split_lines.columns else '',
+        'Prev_ComDate': pd.NaT,
+        'Curr_ComDate': split_lines['ComDate'] if 'ComDate' in split_lines.columns else pd.NaT,
+        'Days_Pushed': 0,
+        'Status': 'Split',
+        'Alert': '',
+        'Alert_Rule': ''
+    })
+
+
+def _with_schedule_line(lines, columns):
+    """Result frame in RESULT_COLUMNS order, plus Schedule_Line after PO_Line when ``lines`` has one"""
+    result = pd.DataFrame(columns, columns=RESULT_COLUMNS)
+    if 'Schedule_Line' in lines.columns:
+        result.insert(RESULT_COLUMNS.index('PO_Line') + 1, 'Schedule_Line', lines['Schedule_Line'])
+    return result
+
+
+def _apply_push_history(results_df, history, run_id=None, run_date=None):
+    """Label re-pushes and add cumulative push columns from the push history
+
+    All result line IDs are looked up in one bulk query. A push is
+    'Re-Pushed' when the line was already pushed in an earlier recorded run;
+    Push_Count, Cum_Days_Pushed and First_Push_Date include the current push.
+    """
+    run_date = pd.Timestamp(run_date or datetime.now()).normalize()
+    result_line_ids = line_ids(results_df)
+    prior = history.push_summary(result_line_ids.unique(), exclude_run_id=run_id)
+    prior = prior.reindex(result_line_ids.to_numpy())
+    
+    prior_count = prior['push_count'].fillna(0).astype(int).to_numpy()
+    prior_days = prior['days_pushed'].fillna(0).astype(int).to_numpy()
+    is_push = (results_df['Days_Pushed'] > 0).to_numpy()
+    
+    results_df['Status'] = np.where(
+        is_push,
+        np.where(prior_count > 0, 'Re-Pushed', 'Pushed'),
+        results_df['Status']
+    )
+    results_df['Push_Count'] = prior_count + is_push
+    results_df['Cum_Days_Pushed'] = prior_days + np.where(is_push, results_df['Days_Pushed'], 0)
+    first_push = prior['first_push'].to_numpy()
+    results_df['First_Push_Date'] = pd.Series(first_push, index=results_df.index).where(
+        ~(is_push & pd.isna(first_push)), run_date
+    )
+    return results_df
+
+
+def compare_po_lines(prev_df, curr_df, history=None, run_id=None, duplicates='first', alert_rules=None):
+    """Compare PO lines between two weeks and identify changes
+
+    Date changes are computed column-wise on a join keyed by PO_LineID and
+    splits from a per-PO groupby index, so a comparison of N lines runs in
+    roughly O(N) time. Changed lines come out in current-week file order,
+    followed by split lines. Status is a categorical over STATUSES.
+
+    With a HistoryStore, re-pushes are detected from recorded pushes (excluding
+    ``run_id``'s own) and each row gets Push_Count, Cum_Days_Pushed and
+    First_Push_Date. Without one, pushes over ALERT_THRESHOLD_DAYS are
+    labelled 'Re-Pushed (>7 days)'.
+
+    ``duplicates`` (one of DUPLICATE_POLICIES) says how a PO_LineID that
+    occurs more than once in a week is matched; with 'all' every schedule
+    line is compared and results get a Schedule_Line column.
+
+    Alert and Alert_Rule come from ``alert_rules`` (an AlertRules; default:
+    pushes over ALERT_THRESHOLD_DAYS), evaluated once over the whole result.
+    A PO_LineID standing for different lines in the two weeks raises a
+    ValueError (see ``check_line_keys``).
+    """
+    if duplicates not in DUPLICATE_POLICIES:
+        raise ValueError(f"Unknown duplicate policy {duplicates!r}; expected one of {DUPLICATE_POLICIES}")
+    # Each week was checked on its own when parsed; the join also needs the keys distinct across weeks
+    check_line_keys(prev_df, curr_df)
+    if duplicates == 'all':
+        prev_df = prev_df.assign(Schedule_Line=schedule_lines(prev_df))
+        curr_df = curr_df.assign(Schedule_Line=schedule_lines(curr_df))
+    
+    # Check for pushed / pulled back lines
+    changes_df = _detect_date_changes(prev_df, curr_df, duplicates)
+    
+    if history is None:
+        # No push history: treat long pushes as potential re-pushes
+        repushed = (changes_df['Status'] == 'Pushed') & (changes_df['Days_Pushed'] > ALERT_THRESHOLD_DAYS)
+        changes_df.loc[repushed, 'Status'] = 'Re-Pushed (>7 days)'
+    
+    # Check for split lines (same PO but multiple lines in current vs previous)
+    if 'PN' in prev_df.columns and 'PN' in curr_df.columns:
+        split_df = detect_splits(prev_df, curr_df)
+    else:
+        split_df = changes_df.iloc[0:0]
+    
+    if split_df.empty:
+        results_df = changes_df.reset_index(drop=True)
+    elif changes_df.empty:
+        results_df = split_df.reset_index(drop=True)
+    else:
+        # Prev_ComDate is left for concat to fill, as all-NaT columns trigger a dtype warning
+        results_df = pd.concat([changes_df, split_df.drop(columns='Prev_ComDate')], ignore_index=True)
+    
+    if history is not None and not results_df.empty:
+        results_df = _apply_push_history(results_df, history, run_id)
+    # After the history columns, which rules on push counts read
+    results_df = (alert_rules or AlertRules()).apply(results_df)
+    results_df['Status'] = pd.Categorical(results_df['Status'], categories=STATUSES)
+    return results_df
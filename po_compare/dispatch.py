@@ -0,0 +1,173 @@
+"""Background email dispatch over one pooled SMTP connection
+
+    dispatcher = EmailDispatcher('smtp.office365.com', 587, 'me@example.com', password)
+    job_id = dispatcher.submit('buyer@example.com', subject, body, excel_data, 'po_comparison.xlsx')
+    dispatcher.status([job_id])   # [{'id': ..., 'status': 'sent', 'attempts': 1, ...}]
+
+Messages are queued and sent by a single worker thread, so the caller (the
+Streamlit script) never waits on the network. The worker keeps one
+authenticated connection open while there is work and closes it after
+``idle_seconds`` without messages. Transient failures (dropped connection,
+4xx replies) are retried with exponential backoff on a fresh connection;
+permanent ones (bad login, 5xx replies) fail the message at once.
+"""
+
+import queue
+import smtplib
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from po_compare.emailing import open_smtp, send_results_email
+
+# Status of a queued message; 'sent' and 'failed' are final
+FINAL_STATUSES = ('sent', 'failed')
+
+
+def _is_permanent(error):
+    """True for SMTP failures a retry cannot fix"""
+    if isinstance(error, (smtplib.SMTPAuthenticationError, smtplib.SMTPNotSupportedError)):
+        return True
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    return False
+
+
+def _close_quietly(server):
+    try:
+        server.quit()
+    except (smtplib.SMTPException, OSError):
+        server.close()
+
+
+def _after_failure(server, keep):
+    """Connection to use after a failed send, or None to reconnect
+
+    A refused message leaves a working connection (``keep``): the failed
+    transaction is reset and the connection reused. Anything else may have
+    left it in an unknown state, so it is closed.
+    """
+    if server is None:
+        return None
+    if keep:
+        try:
+            server.rset()
+            return server
+        except (smtplib.SMTPException, OSError):
+            pass
+    _close_quietly(server)
+    return None
+
+
+class EmailDispatcher:
+    """Queue of outgoing results emails sent in the background over one SMTP connection"""
+
+    def __init__(self, smtp_server, smtp_port, from_email, password, starttls=True,
+                 max_retries=3, backoff_seconds=2.0, idle_seconds=30.0):
+        self.smtp_server = smtp_server
+        self.smtp_port = smtp_port
+        self.from_email = from_email
+        self.password = password
+        self.starttls = starttls
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.idle_seconds = idle_seconds
+        self.connections_opened = 0
+
+        self._queue = queue.Queue()
+        self._jobs = {}
+        self._changed = threading.Condition()
+        self._worker = None
+
+    def submit(self, to_email, subject, body, excel_data, filename):
+        """Queue one message; returns its job ID"""
+        job_id = uuid.uuid4().hex[:12]
+        with self._changed:
+            self._jobs[job_id] = {
+                'id': job_id,
+                'to': to_email,
+                'subject': subject,
+                'status': 'queued',
+                'attempts': 0,
+                'error': None,
+                'queued_at': datetime.now().isoformat(timespec='seconds'),
+                'sent_at': None
+            }
+            self._queue.put((job_id, (to_email, subject, body, excel_data, filename)))
+            # The worker exits when idle; start a new one under the same lock it exits under
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='email-dispatch', daemon=True)
+                self._worker.start()
+        return job_id
+
+    def status(self, job_ids=None):
+        """Copies of the status records of ``job_ids`` (default: all), in submission order"""
+        with self._changed:
+            ids = self._jobs if job_ids is None else job_ids
+            return [dict(self._jobs[job_id]) for job_id in ids if job_id in self._jobs]
+
+    def pending(self, job_ids=None):
+        """Number of the given jobs (default: all) not yet sent or failed"""
+        return sum(record['status'] not in FINAL_STATUSES for record in self.status(job_ids))
+
+    def wait(self, job_ids=None, timeout=None):
+        """Block until the given jobs are sent or failed; False if ``timeout`` ran out first"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._changed:
+            while True:
+                ids = list(self._jobs) if job_ids is None else job_ids
+                if all(self._jobs[job_id]['status'] in FINAL_STATUSES for job_id in ids if job_id in self._jobs):
+                    return True
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._changed.wait(remaining)
+
+    def _update(self, job_id, **fields):
+        with self._changed:
+            self._jobs[job_id].update(fields)
+            self._changed.notify_all()
+
+    def _connect(self):
+        server = open_smtp(self.smtp_server, self.smtp_port, self.from_email, self.password, starttls=self.starttls)
+        self.connections_opened += 1
+        return server
+
+    def _run(self):
+        """Worker loop: send queued messages, reusing the connection until idle"""
+        server = None
+        while True:
+            try:
+                job_id, message = self._queue.get(timeout=self.idle_seconds)
+            except queue.Empty:
+                with self._changed:
+                    if self._queue.empty():
+                        self._worker = None
+                        break
+                continue
+            server = self._deliver(server, job_id, message)
+        if server is not None:
+            _close_quietly(server)
+
+    def _deliver(self, server, job_id, message):
+        """Send one message with retries; returns the connection to keep using (or None)"""
+        for attempt in range(1, self.max_retries + 2):
+            self._update(job_id, status='sending', attempts=attempt)
+            try:
+                if server is None:
+                    server = self._connect()
+                send_results_email(server, self.from_email, *message)
+                self._update(job_id, status='sent', error=None, sent_at=datetime.now().isoformat(timespec='seconds'))
+                return server
+            except (smtplib.SMTPException, OSError) as e:
+                permanent = _is_permanent(e)
+                server = _after_failure(server, keep=permanent)
+                if permanent or attempt > self.max_retries:
+                    self._update(job_id, status='failed', error=f"{type(e).__name__}: {e}")
+                    return server
+                self._update(job_id, status='retrying', error=f"{type(e).__name__}: {e}")
+                time.sleep(self.backoff_seconds * 2 ** (attempt - 1))
+        return server
@@ -0,0 +1,244 @@
+"""Email delivery of comparison results (SMTP, Outlook on Mac, .eml files)
+
+smtplib, the MIME modules and subprocess are imported by the functions that
+use them, so importing this module (e.g. for ``build_email_content``) stays
+cheap and each send method only loads its own dependencies.
+"""
+
+import io
+import re
+import uuid
+from datetime import datetime
+
+XLSX_MIME = ('application', 'vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+
+# Raw attachment bytes encoded per step; a multiple of 57 so every block
+# turns into whole 76-character base64 lines
+ATTACHMENT_BLOCK_BYTES = 57 * 1024
+
+
+def summarize_results(df):
+    """Counts the results email reports for the given rows: total, pushed, split and alerts"""
+    # One pass over Status; the counts per status are then summed by name
+    status_counts = df['Status'].value_counts()
+    return {
+        'total': len(df),
+        'pushed': int(status_counts[[status for status in status_counts.index if 'Pushed' in status]].sum()),
+        'split': int(status_counts.get('Split', 0)),
+        'alerts': int((df['Alert'] != '').sum())
+    }
+
+
+def format_email_content(results_summary, generated_at=None):
+    """Return the (subject, body) of the results email for a ``summarize_results`` summary
+
+    ``generated_at`` defaults to now, so a summary kept across reruns still
+    gets the time the email is actually made.
+    """
+    generated_at = generated_at or datetime.now()
+    email_subject = f"PO Comparison Results - {generated_at.strftime('%Y-%m-%d')}"
+    email_body = f"""Hi,
+
+Please find attached the PO Line Comparison results:
+
+SUMMARY:
+- Total changes: {results_summary['total']}
+- Pushed lines: {results_summary['pushed']}
+- Split lines: {results_summary['split']}
+- Alerts: {results_summary['alerts']}
+
+Generated: {generated_at.strftime('%Y-%m-%d %H:%M:%S')}
+
+Best regards,
+PO Line Comparison Tool
+"""
+    return email_subject, email_body
+
+
+def build_email_content(df):
+    """Return the (subject, body) of the results email for the given rows"""
+    return format_email_content(summarize_results(df))
+
+
+def _as_buffer(data):
+    """An in-memory file's buffer (shared, not copied); other data as given"""
+    return data.getbuffer() if isinstance(data, io.BytesIO) else data
+
+
+def _attachment_blocks(data):
+    """Yield the attachment in blocks from bytes or an in-memory file (sliced without copying) or a binary file
+
+    An in-memory file is read through its buffer, not its position, so
+    several messages can share one cached export.
+    """
+    data = _as_buffer(data)
+    if hasattr(data, 'read'):
+        while True:
+            block = data.read(ATTACHMENT_BLOCK_BYTES)
+            if not block:
+                return
+            yield block
+    view = memoryview(data)
+    for start in range(0, len(view), ATTACHMENT_BLOCK_BYTES):
+        yield view[start:start + ATTACHMENT_BLOCK_BYTES]
+
+
+def iter_mime_message(headers, body, body_subtype, attachment, filename, content_type=XLSX_MIME):
+    """Yield a multipart message with one attachment as CRLF-terminated byte chunks
+
+    The headers and text part are rendered by the email package; the
+    attachment is base64-encoded one block at a time, so the encoded
+    attachment never exists in memory as a whole.
+    """
+    import base64
+    from email.mime.base import MIMEBase
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+    from email.policy import compat32
+
+    # Same header handling as Message.as_bytes(), with the line endings SMTP expects
+    crlf_policy = compat32.clone(linesep='\r\n')
+
+    boundary = f"===============po-compare-{uuid.uuid4().hex}=="
+    msg = MIMEMultipart(boundary=boundary)
+    for name, value in headers.items():
+        msg[name] = value
+    msg.attach(MIMEText(body, body_subtype))
+
+    # The rendered message ends with the closing boundary; the attachment goes before it
+    closing = f"--{boundary}--".encode()
+    yield msg.as_bytes(policy=crlf_policy).rsplit(closing, 1)[0]
+
+    part = MIMEBase(*content_type)
+    part['Content-Transfer-Encoding'] = 'base64'
+    part.add_header('Content-Disposition', 'attachment', filename=filename)
+    yield f"--{boundary}\r\n".encode() + part.as_bytes(policy=crlf_policy)
+
+    for block in _attachment_blocks(attachment):
+        yield base64.encodebytes(block).replace(b'\n', b'\r\n')
+    yield b'\r\n' + closing + b'\r\n'
+
+
+def _send_data_streaming(server, from_email, to_email, chunks):
+    """Send a message through an open SMTP connection chunk by chunk
+
+    Equivalent to ``server.sendmail`` without joining the message first:
+    MAIL/RCPT, then DATA with each chunk dot-stuffed as it is sent.
+    """
+    import smtplib
+
+    server.ehlo_or_helo_if_needed()
+    code, resp = server.mail(from_email)
+    if code != 250:
+        raise smtplib.SMTPSenderRefused(code, resp, from_email)
+    code, resp = server.rcpt(to_email)
+    if code not in (250, 251):
+        raise smtplib.SMTPRecipientsRefused({to_email: (code, resp)})
+    code, resp = server.docmd('DATA')
+    if code != 354:
+        raise smtplib.SMTPDataError(code, resp)
+    for chunk in chunks:
+        # Chunks end on line boundaries, so a leading '.' per line is all that needs quoting
+        server.send(re.sub(rb'(?m)^\.', b'..', chunk))
+    server.send(b'.\r\n')
+    code, resp = server.getreply()
+    if code != 250:
+        raise smtplib.SMTPDataError(code, resp)
+
+
+def open_smtp(smtp_server, smtp_port, from_email, password, starttls=True, timeout=60):
+    """Connect, upgrade to TLS and log in; the caller closes the connection"""
+    import smtplib
+
+    server = smtplib.SMTP(smtp_server, smtp_port, timeout=timeout)
+    try:
+        if starttls:
+            server.starttls()
+        if password:
+            server.login(from_email, password)
+    except BaseException:
+        server.close()
+        raise
+    return server
+
+
+def send_results_email(server, from_email, to_email, subject, body, excel_data, filename):
+    """Send the results email (HTML body, streamed attachment) over an open SMTP connection"""
+    html_body = body.replace('\n', '<br>')
+    chunks = iter_mime_message(
+        {'From': from_email, 'To': to_email, 'Subject': subject},
+        html_body, 'html', excel_data, filename
+    )
+    _send_data_streaming(server, from_email, to_email, chunks)
+
+
+def send_email_with_attachment(to_email, subject, body, excel_data, filename, smtp_server, smtp_port, from_email, password):
+    """Send email with Excel attachment using SMTP"""
+    import smtplib
+
+    try:
+        # Connect to SMTP server and send email
+        with open_smtp(smtp_server, smtp_port, from_email, password) as server:
+            send_results_email(server, from_email, to_email, subject, body, excel_data, filename)
+        
+        return True, "Email sent successfully!"
+        
+    except smtplib.SMTPAuthenticationError:
+        return False, "Authentication failed. Please check your email and password."
+    except smtplib.SMTPException as e:
+        return False, f"SMTP error: {str(e)}"
+    except Exception as e:
+        return False, f"Error: {str(e)}"
+
+
+def send_via_outlook_mac(to_email, subject, body, excel_data, filename):
+    """Send email via Outlook on Mac using AppleScript"""
+    try:
+        import os
+        import subprocess
+        import tempfile
+        
+        # Save Excel file temporarily
+        temp_dir = tempfile.gettempdir()
+        temp_file = os.path.join(temp_dir, filename)
+        with open(temp_file, 'wb') as f:
+            f.write(_as_buffer(excel_data))
+        
+        # Create AppleScript
+        applescript = f'''
+        tell application "Microsoft Outlook"
+            set newMessage to make new outgoing message with properties {{subject:"{subject}", content:"{body}"}}
+            make new recipient at newMessage with properties {{email address:{{address:"{to_email}"}}}}
+            make new attachment at newMessage with properties {{file:POSIX file "{temp_file}"}}
+            open newMessage
+        end tell
+        '''
+        
+        # Execute AppleScript
+        subprocess.run(['osascript', '-e', applescript], check=True)
+        
+        return True, "Outlook draft created with attachment! Please review and send."
+        
+    except Exception as e:
+        return False, f"Error: {str(e)}"
+
+
+def save_as_eml_file(to_email, subject, body, excel_data, filename, target=None):
+    """Save email with attachment as .eml file that can be opened in any email client
+
+    Returns (True, ``target``) once the message is written into that binary
+    file, or without one (True, a memoryview of the in-memory .eml).
+    """
+    try:
+        # Generate .eml content, encoding the attachment block by block
+        eml_content = io.BytesIO() if target is None else target
+        for chunk in iter_mime_message(
+            {'To': to_email, 'Subject': subject, 'From': 'PO Comparison Tool'},
+            body, 'plain', excel_data, filename
+        ):
+            eml_content.write(chunk)
+        
+        return True, eml_content.getbuffer() if target is None else target
+        
+    except Exception as e:
+        return False, str(e)
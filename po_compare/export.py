@@ -0,0 +1,192 @@
+"""Writing comparison results to Excel, CSV or Parquet
+
+All writers stream the frame in row chunks, so memory stays flat no matter
+how many rows are exported: Excel goes through openpyxl's write-only mode
+(rows are serialized as they are appended instead of being kept as cell
+objects), CSV through ``to_csv(chunksize=...)`` and Parquet one row group per
+chunk. openpyxl and pyarrow are imported on first use.
+"""
+
+import io
+import os
+
+import pandas as pd
+
+# File extension -> output format understood by write_results
+OUTPUT_FORMATS = {'.xlsx': 'xlsx', '.csv': 'csv', '.parquet': 'parquet'}
+
+# Rows converted to Python objects at a time
+EXPORT_CHUNK_ROWS = 10_000
+
+# Rows per Excel sheet, header included
+EXCEL_MAX_ROWS = 1_048_576
+
+
+def _row_chunks(df, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Yield the rows of ``df`` as tuples of plain Python values, one chunk at a time
+
+    Missing values (NaN/NaT) become None so they are written as empty cells.
+    """
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows].astype(object)
+        chunk = chunk.where(chunk.notna(), None)
+        yield chunk.itertuples(index=False, name=None)
+
+
+def _new_sheet(workbook, title, columns):
+    """Write-only sheet with a bold header row"""
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    sheet = workbook.create_sheet(title=title)
+    header = []
+    for col in columns:
+        cell = WriteOnlyCell(sheet, value=str(col))
+        cell.font = Font(bold=True)
+        header.append(cell)
+    sheet.append(header)
+    return sheet
+
+
+def write_excel(sheets, target, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Stream ``sheets`` (sheet name -> DataFrame) into an .xlsx path or binary file object"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    for sheet_name, df in sheets.items():
+        sheet = _new_sheet(workbook, sheet_name, df.columns)
+        for rows in _row_chunks(df, chunk_rows):
+            for row in rows:
+                sheet.append(row)
+    workbook.save(target)
+
+
+def export_to_excel(df, target=None):
+    """Write the results as .xlsx with a single 'Comparison Results' sheet
+
+    Into ``target`` (a path or binary file), which is returned. Without one
+    the file is built in memory and a memoryview of that buffer is returned,
+    so the finished file is never copied into a separate bytes object.
+    """
+    if target is not None:
+        write_excel({'Comparison Results': df}, target)
+        return target
+    output = io.BytesIO()
+    write_excel({'Comparison Results': df}, output)
+    return output.getbuffer()
+
+
+def write_parquet(df, target, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Write ``df`` to Parquet one row group per chunk (needs pyarrow)"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Infer the schema from the whole frame so a chunk that happens to be
+    # all-null in a column does not produce a conflicting type
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(target, schema) as writer:
+        for start in range(0, max(len(df), 1), chunk_rows):
+            chunk = pa.Table.from_pandas(df.iloc[start:start + chunk_rows], schema=schema, preserve_index=False)
+            writer.write_table(chunk)
+
+
+def _plain_columns(df):
+    """Categoricals as plain values, so frames with different categories share one output schema"""
+    categorical = [col for col in df.columns if isinstance(df[col].dtype, pd.CategoricalDtype)]
+    return df.astype({col: object for col in categorical}) if categorical else df
+
+
+def write_result_chunks(frames, path, sheet_name='Comparison Results', chunk_rows=EXPORT_CHUNK_ROWS):
+    """Stream result frames that arrive one at a time (e.g. per partition) into ``path``
+
+    Only one frame is held at a time. The first frame sets the columns and
+    later ones are aligned to them; empty frames are skipped unless no frame
+    has rows. Excel sheets are continued as '<sheet_name> (2)'... past
+    Excel's row limit. Returns the number of rows written.
+    """
+    fmt = OUTPUT_FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt is None:
+        raise ValueError(f"Unsupported output format '{os.path.splitext(path)[1]}' (use {', '.join(OUTPUT_FORMATS)})")
+
+    columns, rows = None, 0
+    workbook = sheet = writer = csv_file = schema = None
+    sheet_rows = 0
+    last_empty = None
+    try:
+        for df in frames:
+            if df.empty:
+                last_empty = df
+                continue
+            if columns is None:
+                columns = list(df.columns)
+            df = _plain_columns(df.reindex(columns=columns))
+            if fmt == 'xlsx':
+                if workbook is None:
+                    from openpyxl import Workbook
+
+                    workbook = Workbook(write_only=True)
+                for row_chunk in _row_chunks(df, chunk_rows):
+                    for row in row_chunk:
+                        if sheet is None or sheet_rows == EXCEL_MAX_ROWS:
+                            number = len(workbook.worksheets)
+                            title = sheet_name if number == 0 else f"{sheet_name} ({number + 1})"
+                            sheet, sheet_rows = _new_sheet(workbook, title, columns), 1
+                        sheet.append(row)
+                        sheet_rows += 1
+            elif fmt == 'csv':
+                if csv_file is None:
+                    csv_file = open(path, 'w', newline='', encoding='utf-8')
+                df.to_csv(csv_file, index=False, header=rows == 0, chunksize=chunk_rows)
+            else:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+
+                if writer is None:
+                    schema = pa.Schema.from_pandas(df, preserve_index=False)
+                    writer = pq.ParquetWriter(path, schema)
+                for start in range(0, len(df), chunk_rows):
+                    writer.write_table(
+                        pa.Table.from_pandas(df.iloc[start:start + chunk_rows], schema=schema, preserve_index=False)
+                    )
+            rows += len(df)
+    finally:
+        if csv_file is not None:
+            csv_file.close()
+        if writer is not None:
+            writer.close()
+
+    if columns is None:
+        # Nothing had rows: write the (empty) frame so the output still has its header
+        empty = last_empty if last_empty is not None else pd.DataFrame()
+        write_results({sheet_name: empty}, path, chunk_rows)
+    elif workbook is not None:
+        workbook.save(path)
+    return rows
+
+
+def write_results(sheets, path, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Write one or more result frames to ``path``; the format follows the extension
+
+    ``sheets`` maps a sheet name to a DataFrame. For .xlsx every frame becomes
+    a sheet of one workbook. CSV and Parquet hold a single table, so the first
+    frame goes to ``path`` and each further one to ``<stem>_<sheet>.<ext>``.
+    Returns the list of files written.
+    """
+    stem, ext = os.path.splitext(path)
+    fmt = OUTPUT_FORMATS.get(ext.lower())
+    if fmt is None:
+        raise ValueError(f"Unsupported output format '{ext}' (use {', '.join(OUTPUT_FORMATS)})")
+
+    if fmt == 'xlsx':
+        write_excel(sheets, path, chunk_rows)
+        return [path]
+
+    written = []
+    for i, (sheet_name, df) in enumerate(sheets.items()):
+        target = path if i == 0 else f"{stem}_{sheet_name.lower().replace(' ', '_')}{ext}"
+        if fmt == 'csv':
+            df.to_csv(target, index=False, chunksize=chunk_rows)
+        else:
+            write_parquet(df, target, chunk_rows)
+        written.append(target)
+    return written
@@ -0,0 +1,130 @@
+"""Per-recipient fan-out: one email with only their own lines for every buyer or owner
+
+    routes = {'Standard': 'buyer.a@example.com', 'Rush': 'buyer.b@example.com'}
+    partitions, unrouted = partition_results(results_df, 'PO_Type', routes)
+    messages = build_messages(partitions, 'po_comparison.xlsx')
+    write_archive(messages, 'outbox.zip')        # or submit each to an EmailDispatcher
+
+The routing table maps values of one results column to recipients. The
+results are split in one pass: each distinct value is looked up once, and a
+single groupby on the resulting recipient codes yields every recipient's
+rows. Attachments and .eml files are then built in parallel worker processes.
+"""
+
+import csv
+import io
+import os
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from po_compare.emailing import build_email_content, save_as_eml_file
+from po_compare.export import export_to_excel
+
+# Results columns a routing table can key on
+ROUTE_COLUMNS = ['PO_Type', 'PN', 'PWO', 'PO_No']
+
+
+def read_routes(source):
+    """Routing table from a CSV with two columns (value, recipient) and a header row
+
+    Values are kept as text, since routes are matched on each value's text.
+    Rows without a recipient are skipped.
+    """
+    if hasattr(source, 'read'):
+        text = source.read()
+    else:
+        with open(source, encoding='utf-8-sig') as f:
+            text = f.read()
+    if isinstance(text, bytes):
+        text = text.decode('utf-8-sig')
+    rows = list(csv.reader(io.StringIO(text)))[1:]
+    return {row[0].strip(): row[1].strip() for row in rows if len(row) >= 2 and row[1].strip()}
+
+
+def partition_results(results_df, column, routes, default=None):
+    """Split results by recipient; returns ([(recipient, rows)], unrouted row count)
+
+    ``routes`` maps a value's text (``str(value)``) to a recipient; values
+    without a route go to ``default``, or are left out when it is None.
+    Several values may share a recipient, who then gets all their rows in
+    one partition. Partitions are ordered by recipient and keep file order.
+    """
+    # Look up each distinct value once, then spread the recipient codes to the rows
+    value_codes, values = pd.factorize(results_df[column], use_na_sentinel=True)
+    value_recipients = [routes.get(str(value), default) for value in values]
+    recipient_codes, recipients = pd.factorize(pd.Series(value_recipients, dtype=object), use_na_sentinel=True)
+    # The extra trailing -1 maps missing values (code -1) to "no recipient"
+    row_codes = np.append(recipient_codes, -1)[value_codes]
+
+    # One groupby for all recipients; code -1 holds the unrouted rows
+    positions = results_df.groupby(row_codes, sort=False).indices
+    order = np.argsort(recipients.to_numpy(dtype=object)) if len(recipients) else []
+    partitions = [(recipients[code], results_df.iloc[positions[code]]) for code in order if code in positions]
+    return partitions, len(positions.get(-1, ()))
+
+
+def _build_message(to_email, rows, filename, eml):
+    """Worker: subject, body, .xlsx attachment and (optionally) .eml for one recipient"""
+    subject, body = build_email_content(rows)
+    # In-memory files rather than buffer views, which cannot be sent back from a worker process
+    excel_data = export_to_excel(rows, io.BytesIO())
+    message = {
+        'to': to_email,
+        'rows': len(rows),
+        'subject': subject,
+        'body': body,
+        'filename': filename,
+        'excel': excel_data,
+        'eml': None
+    }
+    if eml:
+        success, result = save_as_eml_file(to_email, subject, body, excel_data, filename, target=io.BytesIO())
+        if not success:
+            raise RuntimeError(f"Could not build the .eml for {to_email}: {result}")
+        message['eml'] = result
+    return message
+
+
+def build_messages(partitions, filename, eml=True, max_workers=None):
+    """Build every recipient's email in parallel; returns message dicts in partition order
+
+    Each dict has to, rows, subject, body, filename, excel (an in-memory
+    file) and eml (one too, or None with ``eml=False``, e.g. when sending
+    over SMTP).
+    Workers default to the CPU count; with one (or ``max_workers=1``) the
+    messages are built in the calling process.
+    """
+    args = [(to_email, rows, filename, eml) for to_email, rows in partitions]
+    workers = min(max_workers or os.cpu_count() or 1, len(args))
+    if workers <= 1:
+        return [_build_message(*arg) for arg in args]
+    # Several recipients per task, so many small partitions do not pay one round trip each
+    chunksize = max(1, len(args) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_build_message, *zip(*args), chunksize=chunksize))
+
+
+def _safe_name(text):
+    return re.sub(r'[^\w.@+-]+', '_', text)
+
+
+def write_archive(messages, target):
+    """Zip every recipient's .eml (or, without one, the .xlsx) plus a manifest.csv"""
+    manifest = io.StringIO()
+    writer = csv.writer(manifest)
+    writer.writerow(['recipient', 'rows', 'file'])
+    with zipfile.ZipFile(target, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for message in messages:
+            if message['eml'] is not None:
+                name = f"{_safe_name(message['to'])}.eml"
+                archive.writestr(name, message['eml'].getbuffer())
+            else:
+                name = f"{_safe_name(message['to'])}/{message['filename']}"
+                archive.writestr(name, message['excel'].getbuffer())
+            writer.writerow([message['to'], message['rows'], name])
+        archive.writestr('manifest.csv', manifest.getvalue())
+    return target
@@ -0,0 +1,89 @@
+"""Precomputed filter index over comparison results
+
+Built once per comparison: Status as category codes with one boolean mask
+per status, an alert mask, and category codes for PO_Type and PN. Summary
+metrics are then dictionary lookups, and any filter combination is a few
+array lookups ANDed together instead of repeated scans of the results.
+"""
+
+import numpy as np
+
+
+def _category_codes(series):
+    """Return (categories as an object array, int codes with -1 for missing)"""
+    categorical = series if series.dtype == 'category' else series.astype('category')
+    return categorical.cat.categories.to_numpy(dtype=object), categorical.cat.codes.to_numpy()
+
+
+class ResultIndex:
+    """Status/alert masks, counts and filter lookups for one results frame"""
+
+    def __init__(self, results_df):
+        self.df = results_df
+
+        status_categories, self._status_codes = _category_codes(results_df['Status'])
+        self.status_masks = {
+            status: self._status_codes == code for code, status in enumerate(status_categories)
+        }
+        self.status_counts = {status: int(mask.sum()) for status, mask in self.status_masks.items()}
+        # Statuses that actually occur, in category order
+        self.statuses = [status for status, count in self.status_counts.items() if count]
+
+        self.alert_mask = (results_df['Alert'] != '').to_numpy()
+        self.alert_count = int(self.alert_mask.sum())
+
+        self.po_types, self._po_type_codes = _category_codes(results_df['PO_Type'])
+        self._pns, self._pn_codes = _category_codes(results_df['PN'])
+        self._days = results_df['Days_Pushed'].to_numpy()
+
+    def __len__(self):
+        return len(self.df)
+
+    def count_statuses(self, substring):
+        """Number of rows whose status contains ``substring`` (e.g. all 'Re-Pushed' variants)"""
+        return sum(count for status, count in self.status_counts.items() if substring in status)
+
+    def days_range(self):
+        """(min, max) of Days_Pushed, or (0, 0) for empty results"""
+        if not len(self._days):
+            return 0, 0
+        return int(self._days.min()), int(self._days.max())
+
+    @staticmethod
+    def _code_lookup(codes, allowed):
+        """Boolean mask of rows whose category is allowed; ``allowed`` is per category"""
+        # The extra trailing False maps code -1 (missing value) to "not allowed"
+        return np.append(allowed, False)[codes]
+
+    def mask(self, statuses=None, alerts_only=False, po_types=None, pn_prefix=None, days_range=None):
+        """Boolean row mask for a filter combination; None/empty arguments do not filter
+
+        ``days_range`` is an inclusive (min, max) pair; either end may be None.
+        """
+        mask = np.ones(len(self.df), dtype=bool)
+        if statuses is not None:
+            status_mask = np.zeros(len(self.df), dtype=bool)
+            for status in statuses:
+                if status in self.status_masks:
+                    status_mask |= self.status_masks[status]
+            mask &= status_mask
+        if alerts_only:
+            mask &= self.alert_mask
+        if po_types:
+            allowed = np.isin(self.po_types, list(po_types))
+            mask &= self._code_lookup(self._po_type_codes, allowed)
+        if pn_prefix:
+            # Prefix test over the distinct part numbers only, then a lookup per row
+            allowed = np.array([str(pn).startswith(pn_prefix) for pn in self._pns], dtype=bool)
+            mask &= self._code_lookup(self._pn_codes, allowed)
+        if days_range is not None:
+            low, high = days_range
+            if low is not None:
+                mask &= self._days >= low
+            if high is not None:
+                mask &= self._days <= high
+        return mask
+
+    def filter(self, **filters):
+        """Rows of the results matching ``mask(**filters)``"""
+        return self.df[self.mask(**filters)]
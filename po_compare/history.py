@@ -0,0 +1,251 @@
+"""Append-only push history stored in SQLite
+
+Every push found by a comparison run is one row in the ``pushes`` table.
+Rows are written in one batched transaction per run and keyed on
+(line_id, run_id), so re-recording the same run is a no-op. Lookups by
+PO line ID or PN use indexes instead of loading a whole JSON document.
+
+Usage (one-off migration of the old JSON history):
+    python -m po_compare.history po_history.json po_history.db
+"""
+
+import json
+import os
+import sqlite3
+import sys
+from contextlib import closing
+from datetime import datetime
+
+import pandas as pd
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id          TEXT PRIMARY KEY,
+    recorded_at     TEXT NOT NULL,
+    lines_recorded  INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pushes (
+    id           INTEGER PRIMARY KEY,
+    line_id      TEXT NOT NULL,
+    po_no        TEXT,
+    po_line      TEXT,
+    pn           TEXT,
+    run_id       TEXT NOT NULL,
+    recorded_at  TEXT,
+    days_pushed  INTEGER,
+    from_date    TEXT,
+    to_date      TEXT,
+    UNIQUE (line_id, run_id)
+);
+CREATE INDEX IF NOT EXISTS idx_pushes_pn ON pushes (pn);
+CREATE INDEX IF NOT EXISTS idx_pushes_run ON pushes (run_id);
+"""
+
+PUSH_COLUMNS = [
+    'line_id', 'po_no', 'po_line', 'pn', 'run_id',
+    'recorded_at', 'days_pushed', 'from_date', 'to_date'
+]
+
+# Results with these statuses are pushes worth remembering
+PUSH_STATUSES = ('Pushed', 'Re-Pushed', 'Re-Pushed (>7 days)')
+
+
+def line_ids(df):
+    """Return the history key ("<PO_No>_<PO_Line>") for every row of a results frame"""
+    return df['PO_No'].astype(str) + '_' + df['PO_Line'].astype(str)
+
+
+def pair_run_id(prev_digest, curr_digest):
+    """Run ID of a comparison of two files, from their content digests (cache.content_hash)
+
+    The same file pair always gets the same ID, so re-running it never
+    double-counts pushes.
+    """
+    return f"{prev_digest[:16]}-{curr_digest[:16]}"
+
+
+class HistoryStore:
+    """Indexed, append-only history of PO line pushes in a SQLite file"""
+
+    def __init__(self, path):
+        self.path = path
+        with closing(self._connect()) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        # One short-lived connection per call keeps the store safe to share
+        # between Streamlit sessions running in different threads
+        return sqlite3.connect(self.path, timeout=30)
+
+    def is_empty(self):
+        """Return True if no push has been recorded yet"""
+        with closing(self._connect()) as conn:
+            return conn.execute('SELECT 1 FROM pushes LIMIT 1').fetchone() is None
+
+    def record_run(self, results_df, run_id, recorded_at=None):
+        """Record every pushed line of a comparison result in one transaction
+
+        Returns the number of new rows; recording the same run_id twice
+        inserts nothing the second time. A run may be recorded in parts (one
+        per partition of an out-of-core comparison); its line count adds up.
+        A PO line is pushed at most once per run: when several of its
+        schedule lines were pushed (``duplicates='all'``), its largest push
+        is recorded, as the other policies would keep one row per line.
+        """
+        recorded_at = (recorded_at or datetime.now()).isoformat(timespec='seconds')
+        pushed = results_df[results_df['Status'].isin(PUSH_STATUSES)]
+        pushed_line_ids = line_ids(pushed)
+        if pushed_line_ids.duplicated().any():
+            largest = (-pushed['Days_Pushed'].to_numpy()).argsort(kind='stable')
+            pushed, pushed_line_ids = pushed.iloc[largest], pushed_line_ids.iloc[largest]
+            first = ~pushed_line_ids.duplicated()
+            pushed, pushed_line_ids = pushed[first.to_numpy()], pushed_line_ids[first]
+
+        rows = pd.DataFrame({
+            'line_id': pushed_line_ids,
+            'po_no': pushed['PO_No'].astype(str),
+            'po_line': pushed['PO_Line'].astype(str),
+            'pn': pushed['PN'].astype(str),
+            'run_id': run_id,
+            'recorded_at': recorded_at,
+            'days_pushed': pushed['Days_Pushed'].astype(int),
+            'from_date': pushed['Prev_ComDate'].dt.strftime('%Y-%m-%d'),
+            'to_date': pushed['Curr_ComDate'].dt.strftime('%Y-%m-%d')
+        }, columns=PUSH_COLUMNS)
+
+        with closing(self._connect()) as conn, conn:
+            inserted = self._insert_pushes(conn, rows.itertuples(index=False, name=None))
+            conn.execute(
+                'INSERT INTO runs (run_id, recorded_at, lines_recorded) VALUES (?, ?, ?) '
+                'ON CONFLICT (run_id) DO UPDATE SET lines_recorded = lines_recorded + excluded.lines_recorded',
+                (run_id, recorded_at, inserted)
+            )
+        return inserted
+
+    def push_summary(self, line_id_values, exclude_run_id=None):
+        """Return push_count, days_pushed and first_push per line, in one query
+
+        The requested IDs are loaded into a temporary table and joined against
+        ``pushes`` with a single GROUP BY, so the cost does not depend on
+        Python-level lookups per line. Pushes recorded by ``exclude_run_id``
+        are ignored, which keeps a re-run of the same comparison from counting
+        itself. Lines without history are absent from the result.
+        """
+        with closing(self._connect()) as conn:
+            conn.execute('CREATE TEMP TABLE lookup (line_id TEXT PRIMARY KEY)')
+            conn.executemany(
+                'INSERT OR IGNORE INTO temp.lookup (line_id) VALUES (?)',
+                ((line_id,) for line_id in line_id_values)
+            )
+            summary = pd.read_sql_query(
+                """
+                SELECT p.line_id,
+                       COUNT(*) AS push_count,
+                       SUM(COALESCE(p.days_pushed, 0)) AS days_pushed,
+                       MIN(p.recorded_at) AS first_push
+                FROM temp.lookup AS l
+                JOIN pushes AS p ON p.line_id = l.line_id
+                WHERE p.run_id != ?
+                GROUP BY p.line_id
+                """,
+                conn,
+                params=(exclude_run_id or '',),
+                index_col='line_id'
+            )
+        summary = summary.astype({'push_count': 'int64', 'days_pushed': 'int64'})
+        summary['first_push'] = pd.to_datetime(summary['first_push']).dt.normalize()
+        return summary
+
+    def pushes_for_line(self, line_id):
+        """Return every recorded push of one PO line, oldest first"""
+        return self._query('WHERE line_id = ? ORDER BY recorded_at, id', (line_id,))
+
+    def pushes_for_pn(self, pn):
+        """Return every recorded push of lines with the given part number, oldest first"""
+        return self._query('WHERE pn = ? ORDER BY recorded_at, id', (pn,))
+
+    def import_legacy_json(self, json_path):
+        """Import a po_history.json file; returns the number of new rows
+
+        Both legacy shapes are accepted: ``{"PO001_1": 1}`` (a bare push count
+        with no details) and ``{"<line>": {"push_count": n, "pushes": [...]}}``.
+        Bare counts become rows without dates; each gets its own synthetic
+        run_id so the import can be repeated safely.
+        """
+        with open(json_path, 'r', encoding='utf-8') as f:
+            history = json.load(f)
+
+        with closing(self._connect()) as conn, conn:
+            return self._insert_pushes(conn, _legacy_rows(history))
+
+    def _insert_pushes(self, conn, rows):
+        before = conn.total_changes
+        conn.executemany(
+            f"INSERT OR IGNORE INTO pushes ({', '.join(PUSH_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(PUSH_COLUMNS))})",
+            rows
+        )
+        return conn.total_changes - before
+
+    def _query(self, where, params):
+        with closing(self._connect()) as conn:
+            return pd.read_sql_query(
+                f"SELECT {', '.join(PUSH_COLUMNS)} FROM pushes {where}", conn, params=params
+            )
+
+
+def _legacy_rows(history):
+    """Yield push rows (in PUSH_COLUMNS order) from a legacy history dict"""
+    for line_id, entry in history.items():
+        po_no, _, po_line = line_id.rpartition('_')
+
+        if isinstance(entry, int):
+            for i in range(entry):
+                yield (line_id, po_no, po_line, None, f"legacy-count-{i + 1}",
+                       None, None, None, None)
+            continue
+
+        pn = entry.get('pn')
+        pushes = entry.get('pushes', [])
+        for push in pushes:
+            yield (
+                line_id,
+                str(entry.get('po_no', po_no)),
+                str(entry.get('po_line', po_line)),
+                pn,
+                f"legacy-{push['date']}",
+                push['date'],
+                push.get('days_pushed'),
+                _legacy_date(push.get('from_date')),
+                _legacy_date(push.get('to_date'))
+            )
+        # Counts recorded without push details
+        for i in range(len(pushes), entry.get('push_count', len(pushes))):
+            yield (line_id, str(entry.get('po_no', po_no)), str(entry.get('po_line', po_line)),
+                   pn, f"legacy-count-{i + 1}", None, None, None, None)
+
+
+def _legacy_date(value):
+    if not value:
+        return None
+    return datetime.fromisoformat(value).date().isoformat()
+
+
+def main(argv=None):
+    """Migrate a legacy JSON history into a SQLite store"""
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print("Usage: python -m po_compare.history <po_history.json> <po_history.db>")
+        return 2
+    json_path, db_path = argv
+    if not os.path.exists(json_path):
+        print(f"❌ {json_path} not found")
+        return 1
+    inserted = HistoryStore(db_path).import_legacy_json(json_path)
+    print(f"✅ Imported {inserted} pushes from {json_path} into {db_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
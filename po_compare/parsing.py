@@ -0,0 +1,219 @@
+"""Reading weekly PO extracts into DataFrames with standardized column names"""
+
+import numpy as np
+import pandas as pd
+
+# Bump when the frames read_po_file returns change, so cached and stored copies are not reused
+SCHEMA_VERSION = '3'
+
+# Excel column -> standardized column name
+COLUMN_MAPPING = {
+    'Purch.doc.': 'PO_No',
+    'Item': 'PO_Line',
+    'Short text': 'PN',
+    'Order': 'PWO',
+    'Type': 'PO_Type',
+    'ComDate': 'ComDate'
+}
+
+REQUIRED_COLUMNS = ['PO_No', 'PO_Line', 'PN', 'ComDate']
+
+# Low-cardinality text columns are read straight into categoricals
+READ_DTYPES = {
+    'Short text': 'category',
+    'Order': 'category',
+    'Type': 'category',
+    'PN': 'category',
+    'PWO': 'category',
+    'PO_Type': 'category'
+}
+
+# Integer-like key columns are stored as the smallest unsigned integer that fits
+KEY_COLUMNS = ['PO_No', 'PO_Line']
+
+# 'auto' picks the fast calamine reader when installed, else openpyxl (.xlsx) / xlrd (.xls)
+EXCEL_ENGINES = ['auto', 'calamine', 'openpyxl', 'xlrd']
+
+
+def _fast_excel_engine_available():
+    """Return True if the calamine reader can be used (python-calamine + pandas >= 2.2)"""
+    try:
+        import python_calamine  # noqa: F401
+    except ImportError:
+        return False
+    pandas_version = tuple(int(part) for part in pd.__version__.split('.')[:2])
+    return pandas_version >= (2, 2)
+
+
+def resolve_excel_engine(engine, filename=''):
+    """Map the selected reader to a pandas engine, falling back to openpyxl/xlrd"""
+    if engine in ('auto', 'calamine') and _fast_excel_engine_available():
+        return 'calamine'
+    if engine in ('auto', 'calamine'):
+        return 'xlrd' if filename.lower().endswith('.xls') else 'openpyxl'
+    return engine
+
+
+def _compact_key_column(series):
+    """Downcast a column of non-negative integers to the smallest unsigned int; other keys (e.g. 'PO001') become categorical"""
+    if series.dtype.kind in 'iu':
+        return series if (series < 0).any() else pd.to_numeric(series, downcast='unsigned')
+    return series.astype('category')
+
+
+def _text_codes(series):
+    """Code of each value's text form (10 and '10' share one), and the distinct texts"""
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    text_codes, texts = pd.factorize(np.asarray(uniques).astype(str).astype(object))
+    return text_codes[codes], texts
+
+
+def _hash_as_text(series, text_codes=None):
+    """uint64 hash of each value's text form, hashing every distinct value once"""
+    codes, texts = text_codes or _text_codes(series)
+    return pd.util.hash_array(texts)[codes]
+
+
+def line_key(df, check=False):
+    """Packed uint64 line key from PO_No and PO_Line
+
+    Hashes the text form of both columns (so 10 and '10' give the same key, as
+    the old '<PO_No>_<PO_Line>' string did) and combines them per row. The
+    result is the same in every file, so keys from different weeks join
+    directly, as integers instead of strings. With 64 bits, the chance of any
+    two of a million distinct lines colliding is about 3 in 100 million.
+    With ``check``, a ValueError is raised if two distinct lines of ``df``
+    did get the same key (it would silently merge them); ``check_line_keys``
+    does the same across the weeks of a comparison.
+    """
+    po_no_codes, po_line_codes = _text_codes(df['PO_No']), _text_codes(df['PO_Line'])
+    po_no = _hash_as_text(df['PO_No'], po_no_codes)
+    po_line = _hash_as_text(df['PO_Line'], po_line_codes)
+    keys = po_no ^ (po_line + np.uint64(0x9E3779B97F4A7C15) + (po_no << np.uint64(6)) + (po_no >> np.uint64(2)))
+    if check:
+        pairs = po_no_codes[0].astype(np.int64) * len(po_line_codes[1]) + po_line_codes[0]
+        clashes = _key_collisions(keys, pairs)
+        if len(clashes):
+            raise _collision_error(df.iloc[clashes])
+    return keys
+
+
+def _key_collisions(keys, pairs):
+    """Positions of distinct (PO_No, PO_Line) text pairs whose key another distinct pair shares"""
+    # First row of each distinct text pair; no two may share a key
+    first = np.flatnonzero(~pd.Series(pairs).duplicated().to_numpy())
+    return first[pd.Series(keys[first]).duplicated(keep=False).to_numpy()]
+
+
+def _collision_error(rows):
+    clash = rows[KEY_COLUMNS].head(2).to_dict('records')
+    return ValueError(f"PO line key collision between {clash}; please report this extract")
+
+
+def check_line_keys(*frames):
+    """Raise a ValueError if two distinct lines share a PO_LineID across ``frames``
+
+    ``line_key(check=True)`` covers one extract only, but frames joined on
+    PO_LineID (the weeks of a comparison) would also merge a line of one
+    week with a different line of another. This repeats the check over the
+    union of the frames' distinct lines. Within a frame a key already stands
+    for one line, so only one row per key is looked at, and text forms are
+    built for distinct values only.
+    """
+    firsts = [df[KEY_COLUMNS + ['PO_LineID']].iloc[np.flatnonzero(~df['PO_LineID'].duplicated().to_numpy())]
+              for df in frames]
+    codes, counts = [], []
+    for col in KEY_COLUMNS:
+        if all(first[col].dtype.kind == 'u' for first in firsts):
+            # Unsigned integers have the same text exactly when they are equal
+            values = np.concatenate([first[col].to_numpy(dtype=np.uint64) for first in firsts])
+            col_codes, uniques = pd.factorize(values)
+        else:
+            # Text codes per frame, renumbered over the texts of all frames
+            per_frame = [_text_codes(first[col]) for first in firsts]
+            all_texts = np.concatenate([np.asarray(texts, dtype=object) for _, texts in per_frame])
+            shared, uniques = pd.factorize(all_texts)
+            offsets = np.cumsum([0] + [len(texts) for _, texts in per_frame])
+            col_codes = np.concatenate([shared[offset + frame_codes]
+                                        for offset, (frame_codes, _) in zip(offsets, per_frame)])
+        codes.append(col_codes)
+        counts.append(len(uniques))
+    pairs = codes[0].astype(np.int64) * counts[1] + codes[1]
+    clashes = _key_collisions(np.concatenate([first['PO_LineID'].to_numpy() for first in firsts]), pairs)
+    if len(clashes):
+        rows = pd.concat([first[KEY_COLUMNS].astype(object) for first in firsts], ignore_index=True)
+        raise _collision_error(rows.iloc[clashes])
+
+
+def memory_report(df):
+    """Per-column dtype and memory of a parsed frame next to the legacy object layout
+
+    The legacy layout is how files were held before the compact schema: text
+    columns as Python strings and PO_LineID as '<PO_No>_<PO_Line>'.
+    """
+    legacy = df.copy()
+    for col in df.columns:
+        if df[col].dtype == 'category':
+            legacy[col] = df[col].astype(object)
+        elif df[col].dtype.kind == 'u':
+            legacy[col] = df[col].astype('int64')
+    if 'PO_LineID' in df.columns:
+        legacy['PO_LineID'] = df['PO_No'].astype(str) + '_' + df['PO_Line'].astype(str)
+    report = pd.DataFrame({
+        'dtype': df.dtypes.astype(str),
+        'bytes': df.memory_usage(index=False, deep=True),
+        'legacy_bytes': legacy.memory_usage(index=False, deep=True)
+    })
+    report.loc['Total'] = ['', report['bytes'].sum(), report['legacy_bytes'].sum()]
+    return report
+
+
+def read_po_file(file, engine='auto'):
+    """Read one extract and return (DataFrame, missing required columns)
+
+    Only the mapped columns are read. Text columns are read straight into
+    categoricals, numeric PO_No/PO_Line are downcast (text ones become
+    categoricals too), and PO_LineID is a packed uint64 key (see
+    ``line_key``). ``file`` is a path or a file-like object (its ``name`` is
+    used to pick the fallback reader). Read errors are raised to the caller.
+    """
+    read_engine = resolve_excel_engine(engine, str(getattr(file, 'name', file)))
+
+    # Read only the mapped columns (under their source or standardized names)
+    wanted_cols = set(COLUMN_MAPPING) | set(COLUMN_MAPPING.values())
+    df = pd.read_excel(
+        file,
+        engine=read_engine,
+        usecols=lambda col: col in wanted_cols,
+        dtype=READ_DTYPES
+    )
+
+    return standardize_po_frame(df)
+
+
+def standardize_po_frame(df):
+    """Bring a raw extract frame to the parsed schema; returns (DataFrame, missing required columns)
+
+    Renames the source columns, converts ComDate, makes the text columns
+    categorical (a no-op for frames read with READ_DTYPES), compacts the key
+    columns and adds PO_LineID (checked for collisions). Works in place on ``df``.
+    """
+    # Rename columns if they exist
+    df.rename(columns=COLUMN_MAPPING, inplace=True)
+    missing_cols = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+
+    # Ensure ComDate is datetime
+    if 'ComDate' in df.columns:
+        df['ComDate'] = pd.to_datetime(df['ComDate'], errors='coerce')
+
+    for col in ('PN', 'PWO', 'PO_Type'):
+        if col in df.columns and df[col].dtype != 'category':
+            df[col] = df[col].astype('category')
+
+    # Create unique identifier for each PO line
+    if 'PO_No' in df.columns and 'PO_Line' in df.columns:
+        for col in KEY_COLUMNS:
+            df[col] = _compact_key_column(df[col])
+        df['PO_LineID'] = line_key(df, check=True)
+
+    return df, missing_cols
@@ -0,0 +1,378 @@
+"""Out-of-core comparison for extracts larger than memory
+
+    for results_df in compare_out_of_core('prev.xlsx', 'curr.xlsx', memory_mb=1024):
+        ...   # each frame is final; see export.write_result_chunks
+
+Each input is streamed in row chunks (openpyxl read-only mode for .xlsx,
+chunked readers for .csv and .parquet) into a directory of Parquet
+partitions, hash-partitioned on PO_No. All lines of a PO, and so all
+schedule lines of a line, land in the same partition number in both weeks,
+so comparing partition i of one week with partition i of the other finds
+exactly the date changes and splits of those POs. Only one chunk or one
+partition pair is in memory at a time, and chunk size and partition count
+are derived from the memory budget, so peak memory does not grow with the
+input. The Parquet writers open at once are bounded by the process's
+open-file limit, not by the partition count: a partition whose writer is
+recycled continues in a new segment file.
+"""
+
+import json
+import math
+import os
+import posixpath
+import tempfile
+import zipfile
+from contextlib import nullcontext
+
+import numpy as np
+import pandas as pd
+
+from po_compare.diff import compare_po_lines
+from po_compare.parsing import COLUMN_MAPPING, REQUIRED_COLUMNS, _hash_as_text, line_key
+
+# Working memory (on top of the interpreter and libraries) when no budget is given
+DEFAULT_MEMORY_MB = 1024
+
+# Peak bytes per row while a chunk is read and standardized, and per line
+# (both weeks together) while a partition pair is compared; measured on
+# generated extracts, with headroom
+READ_BYTES_PER_ROW = 2_000
+COMPARE_BYTES_PER_LINE = 1_500
+
+# Hash partitions are not perfectly even; size them for the fullest one
+PARTITION_SKEW = 1.5
+
+# Upper bound on partitions
+MAX_PARTITIONS = 1024
+
+# Open files left for everything but the partition writers (the input, libraries, sockets...)
+OPEN_FILES_HEADROOM = 128
+
+# Open-file limit assumed where it cannot be read (Windows' C runtime default)
+DEFAULT_OPEN_FILES = 512
+
+MANIFEST_NAME = 'partitions.json'
+
+# Optional text columns kept when present; the keys are stored as text (see write_partitions)
+TEXT_COLUMNS = ['PO_No', 'PO_Line', 'PN', 'PWO', 'PO_Type']
+CATEGORY_COLUMNS = ['PN', 'PWO', 'PO_Type']
+
+
+def plan_chunk_rows(memory_mb=DEFAULT_MEMORY_MB):
+    """Rows read from an input at a time for a memory budget"""
+    return max(1_000, int(memory_mb * 2 ** 20 / READ_BYTES_PER_ROW))
+
+
+def plan_partitions(lines, memory_mb=DEFAULT_MEMORY_MB):
+    """Partitions needed so one partition pair of ``lines`` (both weeks) fits in the budget"""
+    per_partition = memory_mb * 2 ** 20 / (COMPARE_BYTES_PER_LINE * PARTITION_SKEW)
+    return min(MAX_PARTITIONS, max(1, math.ceil(lines / per_partition)))
+
+
+def max_open_writers():
+    """Parquet writers kept open at once while partitioning: the open-file limit minus headroom"""
+    try:
+        import resource
+    except ImportError:
+        limit = DEFAULT_OPEN_FILES
+    else:
+        limit, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if limit == resource.RLIM_INFINITY:
+            limit = MAX_PARTITIONS + OPEN_FILES_HEADROOM
+    return max(1, min(MAX_PARTITIONS, limit - OPEN_FILES_HEADROOM))
+
+
+def _wanted_column(col):
+    return col in COLUMN_MAPPING or col in COLUMN_MAPPING.values()
+
+
+def _first_sheet_part(archive):
+    """Name of the first worksheet's XML part in an open .xlsx archive, found through the package relationships"""
+    from xml.etree import ElementTree
+
+    relationship_ns = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+    def targets(rels_part):
+        """Relationship type suffix and Id -> target part name, for the part ``rels_part`` describes"""
+        base = posixpath.dirname(posixpath.dirname(rels_part))
+        found = {}
+        for rel in ElementTree.fromstring(archive.read(rels_part)).iter(f'{relationship_ns}Relationship'):
+            target = rel.get('Target')
+            part = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join(base, target))
+            found[rel.get('Id')] = found[rel.get('Type').rsplit('/', 1)[-1]] = part
+        return found
+
+    workbook_part = targets('_rels/.rels')['officeDocument']
+    workbook_dir, workbook_name = posixpath.split(workbook_part)
+    sheet = ElementTree.fromstring(archive.read(workbook_part)).find(
+        '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}sheets/'
+        '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}sheet'
+    )
+    relationship_id = sheet.get('{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id')
+    return targets(posixpath.join(workbook_dir, '_rels', f'{workbook_name}.rels'))[relationship_id]
+
+
+def count_rows(path):
+    """Data rows of an .xlsx, .csv or .parquet input, without loading it (for planning partitions)"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.parquet':
+        import pyarrow.parquet as pq
+
+        return pq.ParquetFile(path).metadata.num_rows
+    if ext == '.csv':
+        newlines, last = 0, b''
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(2 ** 20), b''):
+                newlines += block.count(b'\n')
+                last = block[-1:]
+        # A last row without a trailing newline still counts; the header does not
+        return max(0, newlines + (last not in (b'', b'\n')) - 1)
+    if ext in ('.xlsx', '.xlsm'):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            max_row = workbook.worksheets[0].max_row
+        finally:
+            workbook.close()
+        if max_row is not None:
+            return max_row - 1
+        # No stored dimension (e.g. files written in write-only mode): count the
+        # row tags of the sheet XML as it is decompressed, without parsing cells
+        rows, tail = 0, b''
+        with zipfile.ZipFile(path) as archive, archive.open(_first_sheet_part(archive)) as f:
+            for block in iter(lambda: f.read(2 ** 20), b''):
+                block = tail + block
+                rows += block.count(b'<row ') + block.count(b'<row>')
+                # Keep the end of the block, minus any complete tag, for a tag split across blocks
+                tail = block[-4:] if not block.endswith((b'<row ', b'<row>')) else b''
+        return max(0, rows - 1)
+    raise ValueError(f"Out-of-core mode reads .xlsx, .csv or .parquet files, not '{ext}'")
+
+
+def iter_raw_chunks(path, chunk_rows):
+    """Yield an input's mapped columns (source names) as DataFrames of up to ``chunk_rows`` rows"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.parquet':
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(path)
+        columns = [col for col in parquet_file.schema_arrow.names if _wanted_column(col)]
+        for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+    elif ext == '.csv':
+        yield from pd.read_csv(path, chunksize=chunk_rows, usecols=_wanted_column)
+    elif ext in ('.xlsx', '.xlsm'):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            header = next(rows, ())
+            positions = [i for i, col in enumerate(header) if col is not None and _wanted_column(col)]
+            columns = [header[i] for i in positions]
+            buffer, chunks = [], 0
+            for row in rows:
+                buffer.append([row[i] if i < len(row) else None for i in positions])
+                if len(buffer) == chunk_rows:
+                    yield pd.DataFrame(buffer, columns=columns)
+                    buffer, chunks = [], chunks + 1
+            # A header-only sheet still yields one (empty) chunk, which carries the columns
+            if buffer or not chunks:
+                yield pd.DataFrame(buffer, columns=columns)
+        finally:
+            workbook.close()
+    else:
+        raise ValueError(f"Out-of-core mode reads .xlsx, .csv or .parquet files, not '{ext}'")
+
+
+def _key_text(series):
+    """Text form of a key column and whether it holds only non-negative whole numbers
+
+    Whole-number floats (an integer column with blanks) are written as integers.
+    """
+    if series.dtype.kind == 'f':
+        values = series.dropna()
+        if (values == np.floor(values)).all():
+            series = series.astype('Int64')
+    if series.dtype.kind in 'iu':
+        numeric = bool(series.notna().all() and (series >= 0).all())
+    else:
+        values = pd.to_numeric(series, errors='coerce')
+        numeric = bool(values.notna().all() and (values >= 0).all() and (values == np.floor(values)).all())
+    return series.astype('string'), numeric
+
+
+def _standardize_chunk(raw):
+    """A raw chunk in the partition schema; returns (frame, key columns holding only non-negative numbers)
+
+    Standardizes the column names, converts ComDate, stores the text columns
+    (keys included) as text and adds PO_LineID.
+    """
+    df = raw.rename(columns=COLUMN_MAPPING)
+    df = df.loc[:, ~df.columns.duplicated()]
+    if 'ComDate' in df.columns:
+        df['ComDate'] = pd.to_datetime(df['ComDate'], errors='coerce')
+    numeric_keys = set()
+    for col in TEXT_COLUMNS:
+        if col in ('PO_No', 'PO_Line') and col in df.columns:
+            df[col], numeric = _key_text(df[col])
+            if numeric:
+                numeric_keys.add(col)
+        elif col in df.columns:
+            df[col] = df[col].astype('string')
+    if 'PO_No' in df.columns and 'PO_Line' in df.columns:
+        df['PO_LineID'] = line_key(df)
+    return df, numeric_keys
+
+
+def _partition_schema(columns):
+    import pyarrow as pa
+
+    types = {'ComDate': pa.timestamp('ns'), 'PO_LineID': pa.uint64()}
+    return pa.schema([(col, types.get(col, pa.string())) for col in columns])
+
+
+def _partition_path(directory, number, segment=0):
+    return os.path.join(directory, f"part-{number:05d}-{segment:03d}.parquet")
+
+
+def write_partitions(path, directory, partitions, chunk_rows, open_writers=None):
+    """Stream ``path`` into ``partitions`` partitions of Parquet files under ``directory``; returns the manifest
+
+    Rows go to partition ``hash(PO_No) % partitions`` and keep file order
+    within it. PO_No and PO_Line are stored as text so every chunk has the
+    same schema; the manifest records whether they were numeric in the whole
+    file, and ``read_partition`` restores them. The manifest's ``missing``
+    lists required columns the file lacks (nothing is written then).
+    At most ``open_writers`` files (default: max_open_writers()) are open at
+    once; the least recently written is closed to open another, and its
+    partition's next rows start a new segment (``segments`` per partition
+    in the manifest).
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    open_writers = open_writers or max_open_writers()
+    os.makedirs(directory, exist_ok=True)
+    manifest = {'source': os.path.basename(path), 'partitions': partitions, 'rows': 0}
+    numeric_keys = {'PO_No', 'PO_Line'}
+    # Partition -> open writer, least recently written first; segments written per partition
+    writers = {}
+    segments = [0] * partitions
+    schema = None
+    try:
+        for raw in iter_raw_chunks(path, chunk_rows):
+            df, chunk_numeric_keys = _standardize_chunk(raw)
+            if schema is None:
+                manifest['missing'] = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+                if manifest['missing']:
+                    return manifest
+                schema = _partition_schema(
+                    [col for col in TEXT_COLUMNS + ['ComDate', 'PO_LineID'] if col in df.columns]
+                )
+            numeric_keys &= chunk_numeric_keys
+            manifest['rows'] += len(df)
+
+            # One stable sort by partition, then each partition is a zero-copy slice of one Arrow table
+            numbers = _hash_as_text(df['PO_No']) % np.uint64(partitions)
+            order = np.argsort(numbers, kind='stable')
+            table = pa.Table.from_pandas(df.iloc[order][schema.names], schema=schema, preserve_index=False)
+            bounds = np.searchsorted(numbers[order], np.arange(partitions + 1, dtype=np.uint64))
+            for number in np.flatnonzero(np.diff(bounds)):
+                writer = writers.pop(number, None)
+                if writer is None:
+                    if len(writers) >= open_writers:
+                        writers.pop(next(iter(writers))).close()
+                    writer = pq.ParquetWriter(_partition_path(directory, number, segments[number]), schema)
+                    segments[number] += 1
+                writers[number] = writer
+                writer.write_table(table.slice(bounds[number], bounds[number + 1] - bounds[number]))
+    finally:
+        for writer in writers.values():
+            writer.close()
+    if schema is None:
+        raise ValueError(f"{path} has no header row")
+
+    # Partitions no PO hashed to still get an (empty) file
+    for number in range(partitions):
+        if not segments[number]:
+            pq.write_table(schema.empty_table(), _partition_path(directory, number))
+            segments[number] = 1
+    manifest['segments'] = segments
+    manifest['numeric_keys'] = sorted(numeric_keys)
+    with open(os.path.join(directory, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+
+def read_manifest(directory):
+    with open(os.path.join(directory, MANIFEST_NAME), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def read_partition(directory, number, manifest):
+    """One partition as a parsed frame (categorical text columns and text keys, numeric keys as uint64)
+
+    Every line of a PO lives in one partition, so checking the partition's
+    line keys for collisions covers every pair of lines compared together.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.concat_tables(
+        pq.read_table(_partition_path(directory, number, segment)) for segment in range(manifest['segments'][number])
+    )
+    for col in manifest['numeric_keys']:
+        table = table.set_column(table.column_names.index(col), col, table[col].cast(pa.uint64()))
+    categories = CATEGORY_COLUMNS + [col for col in ('PO_No', 'PO_Line') if col not in manifest['numeric_keys']]
+    df = table.to_pandas(categories=[col for col in categories if col in table.column_names])
+    if 'PO_LineID' in df.columns:
+        line_key(df, check=True)
+    return df
+
+
+def compare_partitioned(prev_dir, curr_dir, history=None, run_id=None, duplicates='first', alert_rules=None):
+    """Yield ``compare_po_lines`` results partition by partition
+
+    Within a partition rows come in ``compare_po_lines`` order (changes in
+    current-week file order, then splits); partitions follow each other.
+    With a history, record each frame as it arrives (pushes recorded from
+    one partition cannot affect another, since a line lives in one partition).
+    """
+    prev_manifest, curr_manifest = read_manifest(prev_dir), read_manifest(curr_dir)
+    if prev_manifest['partitions'] != curr_manifest['partitions']:
+        raise ValueError(f"Partition counts differ ({prev_manifest['partitions']} vs {curr_manifest['partitions']})")
+    for number in range(prev_manifest['partitions']):
+        prev_df = read_partition(prev_dir, number, prev_manifest)
+        curr_df = read_partition(curr_dir, number, curr_manifest)
+        yield compare_po_lines(prev_df, curr_df, history=history, run_id=run_id, duplicates=duplicates,
+                               alert_rules=alert_rules)
+
+
+def compare_out_of_core(prev_path, curr_path, memory_mb=DEFAULT_MEMORY_MB, work_dir=None, history=None,
+                        run_id=None, duplicates='first', alert_rules=None, diagnostics=None):
+    """Partition both inputs and yield results partition by partition
+
+    The partitions go in a temporary directory under ``work_dir`` (default:
+    the system temp directory), removed when the generator finishes or is
+    closed. With ``diagnostics`` (a RunDiagnostics), partitioning each input
+    is recorded as a stage. Raises ValueError when an input lacks required
+    columns.
+    """
+    lines = count_rows(prev_path) + count_rows(curr_path)
+    partitions = plan_partitions(lines, memory_mb)
+    chunk_rows = plan_chunk_rows(memory_mb)
+
+    with tempfile.TemporaryDirectory(prefix='po_compare_', dir=work_dir) as temp_dir:
+        dirs = []
+        for role, path in (('prev', prev_path), ('curr', curr_path)):
+            directory = os.path.join(temp_dir, role)
+            with diagnostics.stage(f'partition_{role}') if diagnostics else nullcontext({}) as stage:
+                manifest = write_partitions(path, directory, partitions, chunk_rows)
+                stage['rows'] = manifest['rows']
+            if manifest.get('missing'):
+                raise ValueError(f"{path}: missing columns after mapping: {', '.join(manifest['missing'])}")
+            dirs.append(directory)
+        yield from compare_partitioned(*dirs, history=history, run_id=run_id, duplicates=duplicates,
+                                       alert_rules=alert_rules)
@@ -0,0 +1,149 @@
+"""Multi-week timeline: compare N ordered weekly snapshots in one pass
+
+Instead of N-1 pairwise comparisons, all snapshots are stacked into one long
+table of (PO_LineID, week, ComDate). Sorting it once by line and week puts
+each line's consecutive weeks next to each other, so every week-over-week
+change is found with a single shifted-array comparison.
+"""
+
+import io
+
+import numpy as np
+import pandas as pd
+
+from po_compare.alerts import AlertRules
+from po_compare.diff import dedupe_lines
+from po_compare.parsing import check_line_keys, line_key, read_po_file
+
+LINE_COLUMNS = ['PO_LineID', 'PO_No', 'PO_Line', 'PN', 'PWO', 'PO_Type']
+
+
+def _parse_snapshot(source, engine='auto'):
+    """Process-pool worker: parse a path or a (name, bytes) pair"""
+    if isinstance(source, tuple):
+        name, data = source
+        source = io.BytesIO(data)
+        source.name = name
+    return read_po_file(source, engine=engine)
+
+
+def parse_snapshots(sources, engine='auto', max_workers=None):
+    """Parse weekly snapshots in parallel; returns [(df, missing_cols)] in input order
+
+    ``sources`` are paths or (name, bytes) pairs. Parsing is CPU bound, so
+    each file goes to its own worker process; ``max_workers=1`` parses in
+    the calling process.
+    """
+    sources = list(sources)
+    if max_workers == 1 or len(sources) < 2:
+        return [_parse_snapshot(source, engine) for source in sources]
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(_parse_snapshot, sources, [engine] * len(sources)))
+
+
+def build_timeline(snapshots, labels=None, duplicates='first'):
+    """Stack ordered snapshots into one long table, one row per line per week
+
+    ``labels`` name the weeks (defaults to 'Week 1', 'Week 2', ...). A
+    PO_LineID repeated within a week is reduced to one row by ``duplicates``
+    ('first', 'earliest' or 'latest', as in the two-week comparison).
+    ``Week`` is an ordered categorical and ``Week_No`` its position. A
+    PO_LineID standing for different lines in two weeks raises a ValueError.
+    """
+    labels = list(labels) if labels is not None else [f"Week {i + 1}" for i in range(len(snapshots))]
+    if len(set(labels)) != len(labels):
+        raise ValueError("Week labels must be unique")
+    if duplicates == 'all':
+        raise ValueError("The timeline tracks one row per line; use 'first', 'earliest' or 'latest'")
+    check_line_keys(*snapshots)
+
+    frames = []
+    for week_no, df in enumerate(snapshots):
+        week = dedupe_lines(df, duplicates)
+        week = week[[col for col in LINE_COLUMNS if col in week.columns] + ['ComDate']]
+        frames.append(week.assign(Week_No=week_no))
+
+    timeline = pd.concat(frames, ignore_index=True)
+    timeline['Week'] = pd.Categorical.from_codes(timeline['Week_No'], categories=labels, ordered=True)
+    for col in ('PN', 'PWO', 'PO_Type'):
+        if col in timeline.columns:
+            timeline[col] = timeline[col].astype('category')
+    return timeline
+
+
+def timeline_changes(timeline, alert_rules=None):
+    """Return every ComDate change between consecutive weeks, vectorized
+
+    A change is reported when a line is dated in two consecutive snapshots
+    and the date moved. Lines missing from a week are not compared across
+    the gap. Alerts come from ``alert_rules`` (default: AlertRules()).
+    """
+    # The timeline index is week order then file order; keep it to restore that order at the end
+    ordered = timeline.sort_values(['PO_LineID', 'Week_No'], kind='stable')
+    line_id = ordered['PO_LineID'].to_numpy()
+    week_no = ordered['Week_No'].to_numpy()
+    com_date = ordered['ComDate'].to_numpy()
+
+    changed = (
+        (line_id[1:] == line_id[:-1])
+        & (week_no[1:] == week_no[:-1] + 1)
+        & ~np.isnat(com_date[1:])
+        & ~np.isnat(com_date[:-1])
+        & (com_date[1:] != com_date[:-1])
+    )
+    curr_pos = np.flatnonzero(changed) + 1
+    curr = ordered.iloc[curr_pos]
+    prev = ordered.iloc[curr_pos - 1]
+
+    days_pushed = (
+        curr['ComDate'].reset_index(drop=True) - prev['ComDate'].reset_index(drop=True)
+    ).dt.days.to_numpy()
+
+    changes = pd.DataFrame({
+        'Position': curr.index.to_numpy(),
+        'PO_No': curr['PO_No'].to_numpy(),
+        'PO_Line': curr['PO_Line'].to_numpy(),
+        'PN': curr['PN'].to_numpy() if 'PN' in curr.columns else '',
+        'PWO': curr['PWO'].to_numpy() if 'PWO' in curr.columns else '',
+        'PO_Type': curr['PO_Type'].to_numpy() if 'PO_Type' in curr.columns else '',
+        'Prev_Week': prev['Week'].to_numpy(),
+        'Week': curr['Week'].to_numpy(),
+        'Prev_ComDate': prev['ComDate'].to_numpy(),
+        'Curr_ComDate': curr['ComDate'].to_numpy(),
+        'Days_Pushed': days_pushed,
+        'Status': np.where(days_pushed > 0, 'Pushed', 'Pulled Back')
+    })
+    # Chronological order, then file order of lines
+    changes = changes.sort_values('Position').drop(columns='Position').reset_index(drop=True)
+    return (alert_rules or AlertRules()).apply(changes)
+
+
+def push_trajectories(timeline, changes):
+    """Return one row per changed line: push statistics plus its ComDate in every week"""
+    if changes.empty:
+        return pd.DataFrame(columns=['PO_No', 'PO_Line', 'PN', 'Pushes', 'Pull_Backs', 'Net_Days_Pushed', 'Max_Push_Days'])
+
+    flagged = changes.assign(
+        PO_LineID=line_key(changes),
+        is_push=changes['Days_Pushed'] > 0,
+        is_pull_back=changes['Days_Pushed'] < 0
+    )
+    stats = flagged.groupby('PO_LineID', sort=False).agg(
+        PO_No=('PO_No', 'first'),
+        PO_Line=('PO_Line', 'first'),
+        PN=('PN', 'first'),
+        Pushes=('is_push', 'sum'),
+        Pull_Backs=('is_pull_back', 'sum'),
+        Net_Days_Pushed=('Days_Pushed', 'sum'),
+        Max_Push_Days=('Days_Pushed', 'max')
+    )
+
+    changed_lines = timeline[timeline['PO_LineID'].isin(stats.index)]
+    com_dates = changed_lines.pivot(index='PO_LineID', columns='Week', values='ComDate')
+    com_dates.columns = [f"ComDate {label}" for label in com_dates.columns]
+
+    return stats.join(com_dates).reset_index(drop=True).sort_values(
+        ['Pushes', 'Net_Days_Pushed'], ascending=False, kind='stable'
+    ).reset_index(drop=True)
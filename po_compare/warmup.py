@@ -0,0 +1,134 @@
+"""Startup warm-up and import-time budgets
+
+    prewarm()                    # load the reader, diff engine and writers once
+    check_import_budgets()       # [(module, ms, budget_ms, unexpected modules, ok), ...]
+
+``prewarm`` runs one tiny extract through the same path as a real
+comparison (Excel write, read_po_file, compare_po_lines, export), so the
+first user does not pay for importing openpyxl or calamine and for pandas'
+first-call setup. It also imports the modules the app defers until the
+first upload. The app runs it in a background thread of the server process
+when that process starts; ``po-compare warm`` runs it from the command line.
+
+The import budgets keep the startup path lean: each module is imported in
+a fresh interpreter (after pandas, which the app always loads) and must
+stay under its budget without loading the dependencies listed for it. The
+app itself is measured as a bare-mode script run after pandas and
+streamlit, i.e. everything the page does before any upload.
+"""
+
+import io
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+# Module -> (import-time budget in ms on top of pandas, modules it must not load)
+# The CLI is measured without pandas, since parsing arguments must not load it
+IMPORT_BUDGETS = {
+    'po_compare.cli': (30, ['pandas', 'numpy']),
+    'po_compare.parsing': (15, ['openpyxl']),
+    'po_compare.diff': (30, ['openpyxl', 'smtplib']),
+    'po_compare.export': (15, ['openpyxl']),
+    'po_compare.emailing': (15, ['smtplib', 'email.mime', 'openpyxl']),
+    'po_compare.timeline': (15, ['openpyxl', 'smtplib', 'concurrent.futures.process']),
+    'app': (300, ['openpyxl', 'smtplib', 'email.mime', 'sqlite3', 'cProfile', 'concurrent.futures.process',
+                  'po_compare.diff', 'po_compare.export', 'po_compare.timeline'])
+}
+
+# What each measured module is imported after (the CLI must not need pandas;
+# the app always runs inside streamlit)
+IMPORT_PRELOADS = {'po_compare.cli': None, 'app': 'pandas, streamlit'}
+
+# The directory holding app.py, from which it is imported
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Fresh interpreters per module; the fastest is kept to ignore a cold disk cache
+IMPORT_SAMPLES = 3
+
+
+def prewarm():
+    """Run a two-line comparison end to end; returns {step: seconds}"""
+    timings = {}
+    start = time.perf_counter()
+    import pandas as pd
+
+    from po_compare.diff import compare_po_lines
+    from po_compare.export import export_to_excel, write_excel
+    from po_compare.parsing import read_po_file
+
+    # What the app imports on the first upload
+    import po_compare.baseline  # noqa: F401
+    import po_compare.cache  # noqa: F401
+    import po_compare.emailing  # noqa: F401
+    import po_compare.filters  # noqa: F401
+    import po_compare.timeline  # noqa: F401
+    timings['import'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    extracts = []
+    for com_date in ['2024-01-08', '2024-01-15']:
+        week = pd.DataFrame({
+            'Purch.doc.': [4500000001, 4500000001],
+            'Item': [10, 20],
+            'Short text': ['PN-1', 'PN-2'],
+            'Order': ['PWO-1', 'PWO-2'],
+            'Type': ['Standard', 'Standard'],
+            'ComDate': pd.to_datetime([com_date, '2024-01-08'])
+        })
+        output = io.BytesIO()
+        write_excel({'Sheet1': week}, output)
+        output.seek(0)
+        output.name = 'warmup.xlsx'
+        extracts.append(read_po_file(output)[0])
+    timings['read'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results_df = compare_po_lines(*extracts)
+    export_to_excel(results_df)
+    timings['compare'] = time.perf_counter() - start
+    return timings
+
+
+def measure_import(module, preload='pandas'):
+    """Import ``module`` in a fresh interpreter; returns (cumulative ms, names of the modules it loaded)
+
+    Modules already loaded by ``preload`` are not counted. ``app`` is run
+    from APP_DIR without the background warm-up and with its baselines in a
+    throwaway directory.
+    """
+    env = dict(os.environ)
+    with tempfile.TemporaryDirectory(prefix='po_compare_budget_') as scratch:
+        if module == 'app':
+            env.update(PO_COMPARE_PREWARM='0', PO_COMPARE_BASELINE_DIR=scratch)
+        return _measure_import(module, preload, env)
+
+
+def _measure_import(module, preload, env):
+    code = (
+        "import sys\n"
+        + (f"import {preload}\n" if preload else "")
+        + "before = set(sys.modules)\n"
+        + f"import {module}\n"
+        + "print(' '.join(sorted(set(sys.modules) - before)))\n"
+    )
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            capture_output=True, text=True, check=True, env=env, cwd=APP_DIR)
+    # importtime lines: "import time: self [us] | cumulative | imported package"
+    match = re.search(rf"\|\s*(\d+) \|\s*{re.escape(module)}\s*$", result.stderr, re.MULTILINE)
+    return (int(match.group(1)) / 1000 if match else 0.0), set(result.stdout.split())
+
+
+def check_import_budgets(budgets=None, samples=IMPORT_SAMPLES):
+    """Measure every budgeted module; returns [(module, ms, budget_ms, unexpected modules, ok)]"""
+    report = []
+    for module, (budget_ms, forbidden) in (budgets or IMPORT_BUDGETS).items():
+        preload = IMPORT_PRELOADS.get(module, 'pandas')
+        runs = [measure_import(module, preload) for _ in range(samples)]
+        ms = min(run[0] for run in runs)
+        loaded = runs[0][1]
+        unexpected = [name for name in forbidden if name in loaded]
+        report.append((module, ms, budget_ms, unexpected, ms <= budget_ms and not unexpected))
+    return report
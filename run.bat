@@ -21,6 +21,9 @@ if errorlevel 1 (
     echo.
 )
 
+REM The app warms up the reader and diff engine in the background when the
+REM server starts (set PO_COMPARE_PREWARM=0 to turn that off)
+
 REM Run Streamlit app
 echo Starting application...
 echo The app will open in your default browser
@@ -18,6 +18,9 @@ if ! python3 -c "import streamlit" &> /dev/null; then
     echo ""
 fi
 
+# The app warms up the reader and diff engine in the background when the
+# server starts (set PO_COMPARE_PREWARM=0 to turn that off)
+
 # Run Streamlit app
 echo "✅ Starting application..."
 echo "📊 The app will open in your default browser"
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from po_compare.parsing import standardize_po_frame
+
+
+def make_week(rows):
+    """Parsed week from (PO_No, PO_Line, PN, ComDate) tuples, in file order; ComDate may be None"""
+    raw = pd.DataFrame(rows, columns=['Purch.doc.', 'Item', 'Short text', 'ComDate'])
+    raw['Order'] = 'PWO-' + raw['Purch.doc.'].astype(str)
+    raw['Type'] = np.where(raw['Item'].astype(str).str.endswith('0'), 'Standard', 'Rush')
+    df, missing = standardize_po_frame(raw)
+    assert not missing
+    return df
+
+
+def random_weeks(seed, lines=300, duplicate_rate=0.15, missing_rate=0.05, week_count=2):
+    """``week_count`` weeks of the same lines with moved, missing and repeated dates, rows shuffled per week"""
+    rng = np.random.default_rng(seed)
+    po_nos = rng.choice([f"PO{n:03d}" for n in range(60)] + list(range(4500000000, 4500000040)), lines)
+    base = pd.Timestamp('2024-11-04') + pd.to_timedelta(rng.integers(0, 60, lines), unit='D')
+    weeks = []
+    for shift in range(week_count):
+        dates = base + pd.to_timedelta(rng.integers(-10, 15, lines) * shift, unit='D')
+        dates = dates.where(rng.random(lines) > missing_rate, pd.NaT)
+        rows = [(po_no, 10 * (i % 7 + 1), f"PN-{i % 23}", date) for i, (po_no, date) in enumerate(zip(po_nos, dates))]
+        # Schedule lines: some lines repeat with another date
+        repeats = rng.random(lines) < duplicate_rate
+        rows += [(po_no, line, pn, date + pd.Timedelta(days=int(rng.integers(-20, 20))))
+                 for (po_no, line, pn, date), repeat in zip(rows, repeats) if repeat]
+        order = rng.permutation(len(rows))
+        weeks.append(make_week([rows[i] for i in order]))
+    return weeks
+
+
+SOURCE_COLUMNS = {'PO_No': 'Purch.doc.', 'PO_Line': 'Item', 'PN': 'Short text', 'PWO': 'Order', 'PO_Type': 'Type'}
+
+
+def write_extract(df, path):
+    """A parsed week back in the source layout, as .csv or as a write-only (dimensionless) .xlsx"""
+    raw = df.drop(columns='PO_LineID').rename(columns=SOURCE_COLUMNS)
+    if path.suffix == '.csv':
+        raw.to_csv(path, index=False)
+        return
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Data')
+    sheet.append(list(raw.columns))
+    for row in raw.astype(object).where(raw.notna(), None).itertuples(index=False):
+        sheet.append([value.to_pydatetime() if isinstance(value, pd.Timestamp) else value for value in row])
+    workbook.save(path)
+
+
+@pytest.fixture
+def week():
+    return make_week
@@ -0,0 +1,106 @@
+import pickle
+
+import pandas as pd
+import pytest
+
+from conftest import random_weeks
+from po_compare.alerts import ALERT_FLAG, AlertRules
+from po_compare.diff import compare_po_lines
+
+
+def results(history=False):
+    """A small results frame with categorical PO_Type and PN, like compare_po_lines returns"""
+    df = pd.DataFrame({
+        'PO_No': ['PO1', 'PO2', 'PO3', 'PO4', 'PO5', 'PO6'],
+        'PO_Type': pd.Categorical(['Rush', 'Standard', 'Rush', 'Blanket', 'Standard', None]),
+        'PN': pd.Categorical(['PN-900', 'PN-100', 'PN-120', 'PN-901', None, 'PN-950']),
+        'Days_Pushed': [2, 10, -20, 5, 8, 1],
+    })
+    if history:
+        df['Push_Count'] = [1, 3, 0, 4, 1, 2]
+        df['Cum_Days_Pushed'] = [2, 30, 0, 12, 8, 40]
+    return df
+
+
+def alerts(rules, df):
+    df = AlertRules(rules).apply(df.copy())
+    return df['Alert'].eq(ALERT_FLAG).tolist(), df['Alert_Rule'].tolist()
+
+
+@pytest.mark.parametrize('rule, message', [
+    ({'name': 'typo', 'days_pushed_ovr': 7}, 'unknown fields'),
+    ({'name': 'no threshold', 'po_type': 'Rush'}, 'needs one of'),
+    ({'name': 'bad regex', 'pn_pattern': '(', 'days_pushed_over': 0}, 'bad pn_pattern'),
+])
+def test_invalid_rules_are_rejected(rule, message):
+    with pytest.raises(ValueError, match=message):
+        AlertRules([rule])
+
+
+def test_first_matching_rule_is_named():
+    rules = [
+        {'name': 'Rush', 'po_type': 'Rush', 'days_pushed_over': 0},
+        {'name': 'Any push', 'days_pushed_over': 0},
+        {'days_pushed_over': 9},
+    ]
+    flags, names = alerts(rules, results())
+    assert flags == [True, True, False, True, True, True]
+    assert names == ['Rush', 'Any push', '', 'Any push', 'Any push', 'Any push']
+    # Reordered, 'Any push' comes before 'Rush' and shadows it; unnamed rules are numbered
+    assert alerts(rules[::-1], results())[1] == ['Any push', 'Rule 1', '', 'Any push', 'Any push', 'Any push']
+
+
+def test_no_rules_no_alerts():
+    assert alerts([], results()) == ([False] * 6, [''] * 6)
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_default_rule_is_the_old_seven_day_alert(seed):
+    results_df = compare_po_lines(*random_weeks(seed))
+    expected = results_df['Days_Pushed'] > 7
+    assert expected.any()
+    assert (results_df['Alert'] == ALERT_FLAG).equals(expected)
+    assert set(results_df.loc[expected, 'Alert_Rule']) == {'Pushed > 7 days'}
+    assert set(results_df.loc[~expected, 'Alert_Rule']) == {''}
+
+
+@pytest.mark.parametrize('po_type', [['Rush', 'Blanket'], 'Rush, Blanket', 'Rush,Blanket,'])
+def test_po_type_as_list_or_text(po_type):
+    flags, _ = alerts([{'po_type': po_type, 'days_pushed_over': 0}], results())
+    assert flags == [True, False, False, True, False, False]
+
+
+def test_pn_pattern_on_categorical_pn():
+    df = results()
+    assert df['PN'].dtype == 'category'
+    flags, _ = alerts([{'pn_pattern': '^PN-9', 'days_pushed_over': 0}], df)
+    # A missing PN never matches
+    assert flags == [True, False, False, True, False, True]
+    plain = df.astype({'PN': object, 'PO_Type': object})
+    assert alerts([{'pn_pattern': '^PN-9', 'days_pushed_over': 0}], plain)[0] == flags
+
+
+def test_pulled_in_over():
+    flags, _ = alerts([{'pulled_in_over': 14}], results())
+    assert flags == [False, False, True, False, False, False]
+    assert alerts([{'pulled_in_over': 20}], results())[0] == [False] * 6
+
+
+def test_history_rules():
+    rules = [{'name': 'Often', 'push_count_at_least': 3}, {'name': 'Far', 'cum_days_over': 35}]
+    assert alerts(rules, results(history=True)) == (
+        [False, True, False, True, False, True], ['', 'Often', '', 'Often', '', 'Far']
+    )
+    # Without push history these rules never match, and the frame needs no history columns
+    assert alerts(rules, results()) == ([False] * 6, [''] * 6)
+    # Combined with a filter, all conditions must hold
+    assert alerts([{'po_type': 'Standard', 'push_count_at_least': 3}], results(history=True))[0] == \
+        [False, True, False, False, False, False]
+
+
+def test_rules_pickle_and_recompile():
+    rules = AlertRules([{'name': 'Rush', 'po_type': 'Rush', 'pn_pattern': '^PN-9', 'days_pushed_over': 1}])
+    copy = pickle.loads(pickle.dumps(rules))
+    assert copy.rules == rules.rules
+    assert copy.key() == rules.key()
+    pd.testing.assert_frame_equal(copy.apply(results()), rules.apply(results()))
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import make_week, random_weeks
+from po_compare.baseline import BaselineStore, compare_incremental, unchanged_pos
+from po_compare.diff import DUPLICATE_POLICIES, compare_po_lines
+
+
+def next_week(prev_df, seed):
+    """The same rows with a few POs edited: dates moved, a line added (a split), a repeat dropped"""
+    rng = np.random.default_rng(seed)
+    rows = list(prev_df[['PO_No', 'PO_Line', 'PN', 'ComDate']].itertuples(index=False, name=None))
+    po_nos = prev_df['PO_No'].unique()
+    moved, split, trimmed = (set(rng.choice(po_nos, 6, replace=False)) for _ in range(3))
+    edited = []
+    for po_no, po_line, pn, com_date in rows:
+        if po_no in moved and pd.notna(com_date):
+            com_date += pd.Timedelta(days=int(rng.integers(-9, 12)))
+        edited.append((po_no, po_line, pn, com_date))
+    for po_no, po_line, pn, com_date in rows:
+        if po_no in split:
+            edited.append((po_no, 990, pn, com_date))
+            split.discard(po_no)
+    seen = set()
+    for i, (po_no, po_line, *_) in reversed(list(enumerate(edited))):
+        if po_no in trimmed and (po_no, po_line) in seen:
+            del edited[i]
+        seen.add((po_no, po_line))
+    return make_week(edited)
+
+
+@pytest.mark.parametrize('duplicates', DUPLICATE_POLICIES)
+@pytest.mark.parametrize('seed', [0, 1])
+def test_incremental_matches_full_comparison(duplicates, seed):
+    prev_df = random_weeks(seed)[0]
+    curr_df = next_week(prev_df, seed)
+    assert len(unchanged_pos(prev_df, curr_df)) > 0
+    full = compare_po_lines(prev_df, curr_df, duplicates=duplicates)
+    incremental = compare_incremental(prev_df, curr_df, duplicates=duplicates)
+    assert len(full) > 0
+    pd.testing.assert_frame_equal(incremental.reset_index(drop=True), full.reset_index(drop=True),
+                                  check_categorical=False)
+
+
+@pytest.mark.parametrize('duplicates', DUPLICATE_POLICIES)
+def test_incremental_against_stored_baseline(tmp_path, duplicates):
+    prev_df = random_weeks(2)[0]
+    curr_df = next_week(prev_df, 2)
+    store = BaselineStore(str(tmp_path))
+    store.save(prev_df, 'a' * 64, 'previous.xlsx')
+    baseline_df = store.load('a' * 64)
+    full = compare_po_lines(prev_df, curr_df, duplicates=duplicates)
+    incremental = compare_incremental(baseline_df, curr_df, duplicates=duplicates)
+    pd.testing.assert_frame_equal(incremental.reset_index(drop=True), full.reset_index(drop=True),
+                                  check_categorical=False)
+
+
+def test_reordered_repeats_are_a_change(week):
+    prev_df = week([('PO1', 10, 'PN-1', '2024-11-04'), ('PO1', 10, 'PN-1', '2024-11-08')])
+    curr_df = week([('PO1', 10, 'PN-1', '2024-11-08'), ('PO1', 10, 'PN-1', '2024-11-04')])
+    assert len(unchanged_pos(prev_df, curr_df)) == 0
@@ -0,0 +1,80 @@
+import os
+
+import pandas as pd
+
+from conftest import random_weeks, write_extract
+from po_compare.batch import REPORT_COLUMNS, find_pairs, run_batch
+from po_compare.diff import compare_po_lines
+
+
+def test_find_pairs(tmp_path):
+    (tmp_path / 'sub').mkdir()
+    for name in ['plant1_A_prev.xlsx', 'plant1_A_CURR.xls', 'sub/plant1_A_prev.xlsx', 'sub/plant1_A_curr.xlsx',
+                 'lonely_prev.xlsx', '~$plant2_prev.xlsx', 'plant2_curr.xlsx', 'notes_prev.txt']:
+        (tmp_path / name).touch()
+
+    pairs, unmatched = find_pairs(str(tmp_path))
+    # Equal names in other folders pair up separately; the role is matched case-insensitively
+    assert pairs == [
+        ('plant1_A', str(tmp_path / 'plant1_A_prev.xlsx'), str(tmp_path / 'plant1_A_CURR.xls')),
+        (os.path.join('sub', 'plant1_A'), str(tmp_path / 'sub/plant1_A_prev.xlsx'),
+         str(tmp_path / 'sub/plant1_A_curr.xlsx')),
+    ]
+    # Office lock files are skipped, so plant2 has no previous week
+    assert sorted(unmatched) == [str(tmp_path / 'lonely_prev.xlsx'), str(tmp_path / 'plant2_curr.xlsx')]
+
+
+def test_find_pairs_custom_pattern(tmp_path):
+    for name in ['old-A.xlsx', 'new-A.xlsx', 'new-B.xlsx', 'other-A.xlsx']:
+        (tmp_path / name).touch()
+    pairs, unmatched = find_pairs(str(tmp_path), pattern=r'(?P<role>[a-z]+)-(?P<key>\w+)\.xlsx$',
+                                  prev_token='old', curr_token='new')
+    assert pairs == [('A', str(tmp_path / 'old-A.xlsx'), str(tmp_path / 'new-A.xlsx'))]
+    # A role that is neither token is ignored
+    assert unmatched == [str(tmp_path / 'new-B.xlsx')]
+
+
+def test_run_batch(tmp_path):
+    source, output = tmp_path / 'in', tmp_path / 'out'
+    source.mkdir()
+    weeks = {'good': random_weeks(0, lines=80), 'also_good': random_weeks(1, lines=80)}
+    for key, (prev_df, curr_df) in weeks.items():
+        write_extract(prev_df, source / f'{key}_prev.xlsx')
+        write_extract(curr_df, source / f'{key}_curr.xlsx')
+    # One pair lacks a required column, one is not a workbook at all
+    prev_df, curr_df = weeks['good']
+    write_extract(prev_df, source / 'short_prev.xlsx')
+    write_extract(curr_df.drop(columns='PN'), source / 'short_curr.xlsx')
+    (source / 'junk_prev.xlsx').write_text('not a workbook')
+    write_extract(curr_df, source / 'junk_curr.xlsx')
+
+    pairs, unmatched = find_pairs(str(source))
+    assert not unmatched
+    progress = []
+    report_df = run_batch(pairs, str(output), max_workers=2,
+                          progress=lambda done, total, report: progress.append((done, total)))
+
+    assert progress == [(1, 4), (2, 4), (3, 4), (4, 4)]
+    assert list(report_df.columns) == REPORT_COLUMNS
+    assert report_df['Pair'].tolist() == ['also_good', 'good', 'junk', 'short']
+    assert report_df['Status'].tolist() == ['ok', 'ok', 'error', 'error']
+    assert 'missing columns after mapping: PN' in report_df.loc[3, 'Error']
+    failed = report_df['Status'] == 'error'
+    assert report_df.loc[failed, 'Output'].isna().all()
+    assert report_df.loc[failed, 'Total_Seconds'].notna().all()
+
+    saved = pd.read_csv(output / 'batch_report.csv')
+    assert list(saved.columns) == REPORT_COLUMNS
+    assert saved['Status'].tolist() == report_df['Status'].tolist()
+
+    summary = pd.read_excel(output / 'summary.xlsx')
+    assert summary.columns[0] == 'Pair'
+    for key in ('also_good', 'good'):
+        expected = compare_po_lines(*weeks[key])
+        row = report_df.set_index('Pair').loc[key]
+        assert (row['Prev_Lines'], row['Curr_Lines']) == tuple(map(len, weeks[key]))
+        assert row['Changes'] == len(expected) == (summary['Pair'] == key).sum()
+        assert row['Alerts'] == (expected['Alert'] != '').sum()
+        assert os.path.exists(row['Output'])
+    # Failed pairs contribute nothing to the summary
+    assert set(summary['Pair']) == {'also_good', 'good'}
@@ -0,0 +1,117 @@
+import json
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from conftest import random_weeks
+from po_compare.alerts import AlertRules
+from po_compare.changefeed import ChangeFeedWriter, feed_run_id, recorded_runs, run_settings, write_change_feed
+from po_compare.cli import main
+from po_compare.diff import compare_po_lines
+from po_compare.history import pair_run_id
+
+pytest.importorskip('pyarrow')
+
+
+@pytest.fixture
+def results_df():
+    return compare_po_lines(*random_weeks(0))
+
+
+def test_runs_are_never_rewritten(tmp_path, results_df):
+    feed_dir = str(tmp_path / 'feed')
+    write_change_feed(results_df, feed_dir, 'run-a', run_date=date(2024, 11, 11))
+    with pytest.raises(ValueError, match='already in the change feed'):
+        write_change_feed(results_df.head(3), feed_dir, 'run-a', run_date=date(2024, 11, 18))
+    write_change_feed(results_df.head(3), feed_dir, 'run-b', run_date=date(2024, 11, 18))
+
+    feed = pd.read_parquet(tmp_path / 'feed' / 'parquet')
+    assert feed.groupby('run_id', observed=True).size().to_dict() == {'run-a': len(results_df), 'run-b': 3}
+    assert set(feed.loc[feed['run_id'] == 'run-a', 'run_date'].astype(str)) == {'2024-11-11'}
+    assert not list((tmp_path / 'feed').rglob('.*.tmp'))
+    with open(tmp_path / 'feed' / '_runs.jsonl', encoding='utf-8') as f:
+        lines = [json.loads(line) for line in f]
+    assert [(line['run_id'], line['run_date']) for line in lines] == [('run-a', '2024-11-11'), ('run-b', '2024-11-18')]
+
+
+def test_settings_are_part_of_the_run(tmp_path, results_df):
+    run_id = pair_run_id('a' * 64, 'b' * 64)
+    settings = run_settings('first', AlertRules(), push_history=True)
+    assert feed_run_id(run_id, settings) == feed_run_id(run_id, run_settings('first', None, push_history=True))
+    other_runs = [
+        run_settings('earliest', AlertRules(), push_history=True),
+        run_settings('first', AlertRules([{'days_pushed_over': 3}]), push_history=True),
+        run_settings('first', AlertRules(), push_history=False)
+    ]
+    assert len({feed_run_id(run_id, s) for s in [settings] + other_runs}) == 4
+    assert feed_run_id(run_id, settings).startswith(run_id)
+
+    feed_dir = str(tmp_path / 'feed')
+    write_change_feed(results_df, feed_dir, feed_run_id(run_id, settings), settings=settings)
+    assert recorded_runs(feed_dir)[feed_run_id(run_id, settings)]['settings'] == settings
+
+
+def test_empty_run_has_no_jsonl(tmp_path, results_df):
+    feed_dir = str(tmp_path / 'feed')
+    write_change_feed(results_df.head(0), feed_dir, 'run-a', run_date=date(2024, 11, 11))
+    assert not list((tmp_path / 'feed' / 'jsonl').rglob('*.jsonl'))
+    assert len(pd.read_parquet(tmp_path / 'feed' / 'parquet')) == 0
+    assert recorded_runs(feed_dir)['run-a']['rows'] == 0
+
+
+def test_aborted_run_leaves_the_feed_alone(tmp_path, results_df):
+    feed_dir = str(tmp_path / 'feed')
+    write_change_feed(results_df, feed_dir, 'run-a', run_date=date(2024, 11, 11))
+    with pytest.raises(RuntimeError):
+        with ChangeFeedWriter(feed_dir, 'run-b', run_date=date(2024, 11, 18)) as feed:
+            feed.write(results_df.head(3))
+            raise RuntimeError('export failed')
+    assert len(pd.read_parquet(tmp_path / 'feed' / 'parquet')) == len(results_df)
+    assert list(recorded_runs(feed_dir)) == ['run-a']
+    assert not list((tmp_path / 'feed').rglob('.*.tmp'))
+
+
+def test_concurrent_writer_of_the_same_run_is_discarded(tmp_path, results_df):
+    feed_dir = str(tmp_path / 'feed')
+    first = ChangeFeedWriter(feed_dir, 'run-a', run_date=date(2024, 11, 11))
+    second = ChangeFeedWriter(feed_dir, 'run-a', run_date=date(2024, 11, 11))
+    first.write(results_df)
+    second.write(results_df.head(3))
+    first.close()
+    with pytest.raises(ValueError, match='already in the change feed'):
+        second.close()
+    assert len(pd.read_parquet(tmp_path / 'feed' / 'parquet')) == len(results_df)
+    assert not list((tmp_path / 'feed').rglob('.*.tmp'))
+
+
+def write_extracts(tmp_path, count):
+    paths = []
+    for n, week in enumerate(random_weeks(1)[:1] * count):
+        raw = week.drop(columns='PO_LineID').rename(columns={
+            'PO_No': 'Purch.doc.', 'PO_Line': 'Item', 'PN': 'Short text', 'PWO': 'Order', 'PO_Type': 'Type'
+        })
+        raw['ComDate'] += pd.Timedelta(days=n)
+        path = tmp_path / f'week{n}.xlsx'
+        raw.to_excel(path, index=False)
+        paths.append(str(path))
+    return paths
+
+
+def test_feed_dir_from_environment_skips_timelines(tmp_path, monkeypatch):
+    paths = write_extracts(tmp_path, 3)
+    feed_dir = tmp_path / 'feed'
+    monkeypatch.setenv('PO_COMPARE_FEED_DIR', str(feed_dir))
+    assert main(['compare', *paths, '-o', str(tmp_path / 'timeline.xlsx')]) == 0
+    assert not feed_dir.exists()
+    # Asked for explicitly, it is still an error
+    assert main(['compare', *paths, '--feed-dir', str(feed_dir), '-o', str(tmp_path / 'timeline.xlsx')]) == 2
+    # Two weeks are recorded, once per set of settings
+    results = str(tmp_path / 'results.xlsx')
+    assert main(['compare', *paths[:2], '-o', results]) == 0
+    assert main(['compare', *paths[:2], '-o', results]) == 0
+    assert len(recorded_runs(str(feed_dir))) == 1
+    assert main(['compare', *paths[:2], '--duplicates', 'latest', '-o', results]) == 0
+    runs = list(recorded_runs(str(feed_dir)).values())
+    assert [run['settings']['duplicates'] for run in runs] == ['first', 'latest']
+    assert len({run['run_id'].rsplit('-', 1)[0] for run in runs}) == 1
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from po_compare.diagnostics import RunDiagnostics, _reset_peak_rss
+
+pytestmark = pytest.mark.skipif(not _reset_peak_rss(), reason='per-stage peak memory needs Linux /proc')
+
+
+def allocate(mb):
+    block = np.ones(mb * 2 ** 20 // 8)
+    del block
+
+
+def test_peak_belongs_to_the_stage():
+    diagnostics = RunDiagnostics()
+    with diagnostics.stage('big'):
+        allocate(400)
+    with diagnostics.stage('small'):
+        allocate(10)
+    big, small = diagnostics.records
+    assert big['peak_rss_mb'] - small['peak_rss_mb'] > 300
+    assert abs(big['rss_growth_mb']) < 50
+
+
+def test_nested_stage_keeps_outer_peak():
+    diagnostics = RunDiagnostics()
+    with diagnostics.stage('outer'):
+        allocate(400)
+        with diagnostics.stage('inner'):
+            allocate(10)
+    inner, outer = diagnostics.records
+    assert outer['peak_rss_mb'] - inner['peak_rss_mb'] > 300
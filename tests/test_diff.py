@@ -0,0 +1,114 @@
+import pandas as pd
+import pytest
+
+from conftest import random_weeks
+from po_compare.diff import ALERT_THRESHOLD_DAYS, compare_po_lines, dedupe_lines, detect_splits
+
+CHANGE_COLUMNS = ['PO_No', 'PO_Line', 'Prev_ComDate', 'Curr_ComDate', 'Days_Pushed', 'Status']
+
+
+def reference_date_changes(prev_df, curr_df):
+    """The original per-line loop: first row of each line in file order, dated in both weeks and moved"""
+    rows = []
+    for line_id in set(prev_df['PO_LineID']) & set(curr_df['PO_LineID']):
+        prev_line = prev_df[prev_df['PO_LineID'] == line_id].iloc[0]
+        curr_line = curr_df[curr_df['PO_LineID'] == line_id].iloc[0]
+        if pd.notna(prev_line['ComDate']) and pd.notna(curr_line['ComDate']) \
+                and curr_line['ComDate'] != prev_line['ComDate']:
+            days_pushed = (curr_line['ComDate'] - prev_line['ComDate']).days
+            status = 'Pushed' if days_pushed > 0 else 'Pulled Back'
+            if status == 'Pushed' and days_pushed > ALERT_THRESHOLD_DAYS:
+                status = 'Re-Pushed (>7 days)'
+            rows.append((str(curr_line['PO_No']), str(curr_line['PO_Line']), prev_line['ComDate'],
+                         curr_line['ComDate'], days_pushed, status))
+    return sorted(rows)
+
+
+def date_changes(results_df):
+    changes = results_df[results_df['Status'] != 'Split']
+    return sorted(
+        (str(po_no), str(po_line), prev, curr, int(days), str(status))
+        for po_no, po_line, prev, curr, days, status in changes[CHANGE_COLUMNS].itertuples(index=False)
+    )
+
+
+def test_matches_reference_with_duplicates_and_missing_dates(week):
+    prev_df = week([
+        ('PO001', 10, 'PN-1', '2024-11-04'),
+        ('PO001', 20, 'PN-2', '2024-11-05'),
+        ('PO001', 10, 'PN-1', '2024-11-20'),   # repeated line: the first row is compared
+        ('PO002', 10, 'PN-3', None),           # undated last week
+        ('PO003', 10, 'PN-4', '2024-11-10'),
+        ('PO004', 10, 'PN-5', '2024-11-12'),
+    ])
+    curr_df = week([
+        ('PO004', 10, 'PN-5', '2024-11-02'),   # rows reordered
+        ('PO003', 10, 'PN-4', None),           # undated this week
+        ('PO002', 10, 'PN-3', '2024-11-09'),
+        ('PO001', 20, 'PN-2', '2024-11-05'),   # unchanged
+        ('PO001', 10, 'PN-1', '2024-11-15'),
+        ('PO001', 10, 'PN-1', '2024-11-04'),
+    ])
+    assert date_changes(compare_po_lines(prev_df, curr_df)) == reference_date_changes(prev_df, curr_df) == [
+        ('PO001', '10', pd.Timestamp('2024-11-04'), pd.Timestamp('2024-11-15'), 11, 'Re-Pushed (>7 days)'),
+        ('PO004', '10', pd.Timestamp('2024-11-12'), pd.Timestamp('2024-11-02'), -10, 'Pulled Back'),
+    ]
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_matches_reference_on_shuffled_weeks(seed):
+    prev_df, curr_df = random_weeks(seed)
+    assert date_changes(compare_po_lines(prev_df, curr_df)) == reference_date_changes(prev_df, curr_df)
+
+
+def test_splits_on_their_own(week):
+    prev_df = week([('PO1', 10, 'PN-1', '2024-11-01'), ('PO2', 10, 'PN-2', '2024-11-01')])
+    curr_df = week([('PO2', 10, 'PN-2', '2024-11-01'), ('PO2', 20, 'PN-2', '2024-11-08'),
+                    ('PO1', 10, 'PN-1', '2024-11-03'), ('PO3', 10, 'PN-3', '2024-11-03'),
+                    ('PO3', 20, 'PN-3', '2024-11-03')])
+    splits = detect_splits(prev_df, curr_df)
+    # PO1 gained no line and PO3 is a new PO, so only PO2 was split
+    assert splits[['PO_No', 'PO_Line', 'Status']].astype(str).values.tolist() == [['PO2', '20', 'Split']]
+    results_df = compare_po_lines(prev_df, curr_df)
+    split_rows = results_df[results_df['Status'] == 'Split'].reset_index(drop=True)
+    assert split_rows['PO_Line'].tolist() == splits['PO_Line'].tolist()
+    assert split_rows['Curr_ComDate'].tolist() == splits['Curr_ComDate'].tolist()
+
+
+def test_changes_in_current_week_order(week):
+    prev_df = week([('PO1', 10, 'PN-1', '2024-11-01'), ('PO2', 10, 'PN-2', '2024-11-01')])
+    curr_df = week([('PO2', 10, 'PN-2', '2024-11-03'), ('PO1', 10, 'PN-1', '2024-11-02')])
+    assert list(compare_po_lines(prev_df, curr_df)['PO_No']) == ['PO2', 'PO1']
+
+
+def reference_dedupe(df, policy):
+    """Per-line groupby: the earliest/latest dated row (first on ties), the first row if none is dated"""
+    chosen = []
+    for _, group in df.groupby('PO_LineID', sort=False):
+        dated = group['ComDate'].dropna()
+        if dated.empty:
+            chosen.append(group.index[0])
+        else:
+            chosen.append(dated.idxmin() if policy == 'earliest' else dated.idxmax())
+    return df.loc[sorted(chosen)]
+
+
+@pytest.mark.parametrize('policy', ['earliest', 'latest'])
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_dedupe_matches_groupby_reference(policy, seed):
+    for df in random_weeks(seed, duplicate_rate=0.4, missing_rate=0.2):
+        pd.testing.assert_frame_equal(dedupe_lines(df, policy), reference_dedupe(df, policy))
+
+
+@pytest.mark.parametrize('policy', ['earliest', 'latest'])
+def test_dedupe_ignores_row_order(policy):
+    prev_df, curr_df = random_weeks(3, duplicate_rate=0.4, missing_rate=0.2)
+    shuffled_prev, shuffled_curr = (df.sample(frac=1, random_state=7) for df in (prev_df, curr_df))
+
+    def chosen(df):
+        return sorted(dedupe_lines(df, policy)[['PO_LineID', 'ComDate']].itertuples(index=False, name=None),
+                      key=repr)
+
+    assert chosen(shuffled_prev) == chosen(prev_df)
+    assert date_changes(compare_po_lines(shuffled_prev, shuffled_curr, duplicates=policy)) == \
+        date_changes(compare_po_lines(prev_df, curr_df, duplicates=policy))
@@ -0,0 +1,126 @@
+import email
+import os
+import socketserver
+import threading
+
+import pytest
+
+from po_compare.dispatch import EmailDispatcher
+
+
+class FakeSMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: EHLO, MAIL, RCPT, DATA, RSET, NOOP, QUIT"""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply('220 localhost ready')
+        recipient = None
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip()
+            verb = command[:4].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 localhost')
+            elif verb == 'MAIL':
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipient = command.split('<', 1)[1].split('>', 1)[0]
+                with server.lock:
+                    scripted = server.rcpt_replies.get(recipient, [])
+                    code = scripted.pop(0) if scripted else 250
+                self.reply(f'{code} {"OK" if code == 250 else "refused"}')
+                if 400 <= code < 500:
+                    # A transient failure: the server drops the connection, as a throttled one would
+                    return
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                while (data_line := self.rfile.readline()) != b'.\r\n':
+                    lines.append(data_line[1:] if data_line.startswith(b'.') else data_line)
+                with server.lock:
+                    server.messages.append((recipient, b''.join(lines)))
+                self.reply('250 queued')
+            elif verb in ('RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('502 not implemented')
+
+
+@pytest.fixture
+def smtp_server():
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), FakeSMTPHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = 0
+    server.messages = []
+    server.rcpt_replies = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def dispatcher_for(server, **options):
+    return EmailDispatcher('127.0.0.1', server.server_address[1], 'me@example.com', '', starttls=False,
+                           backoff_seconds=0.01, idle_seconds=1.0, **options)
+
+
+def submit(dispatcher, to_email, excel_data=b'PK-excel'):
+    return dispatcher.submit(to_email, 'PO changes', 'Hello\nSee attached.', excel_data, 'po_comparison.xlsx')
+
+
+def test_messages_share_one_connection(smtp_server):
+    dispatcher = dispatcher_for(smtp_server)
+    job_ids = [submit(dispatcher, f'buyer{n}@example.com') for n in range(3)]
+    assert dispatcher.wait(job_ids, timeout=10)
+    assert [record['status'] for record in dispatcher.status(job_ids)] == ['sent'] * 3
+    assert dispatcher.connections_opened == smtp_server.connections == 1
+    assert [to for to, _ in smtp_server.messages] == [f'buyer{n}@example.com' for n in range(3)]
+
+
+def test_transient_failure_is_retried_on_a_new_connection(smtp_server):
+    smtp_server.rcpt_replies['busy@example.com'] = [451]
+    dispatcher = dispatcher_for(smtp_server)
+    job_id = submit(dispatcher, 'busy@example.com')
+    assert dispatcher.wait([job_id], timeout=10)
+    [record] = dispatcher.status([job_id])
+    assert (record['status'], record['attempts']) == ('sent', 2)
+    assert dispatcher.connections_opened == smtp_server.connections == 2
+
+
+def test_permanent_failure_fails_at_once_and_keeps_the_connection(smtp_server):
+    smtp_server.rcpt_replies['nobody@example.com'] = [550, 550, 550, 550]
+    dispatcher = dispatcher_for(smtp_server)
+    job_ids = [submit(dispatcher, 'nobody@example.com'), submit(dispatcher, 'buyer@example.com')]
+    assert dispatcher.wait(job_ids, timeout=10)
+    refused, sent = dispatcher.status(job_ids)
+    assert (refused['status'], refused['attempts']) == ('failed', 1)
+    assert '550' in refused['error']
+    assert (sent['status'], sent['attempts']) == ('sent', 1)
+    assert dispatcher.connections_opened == 1
+
+
+def test_attachment_round_trip(smtp_server):
+    # Large enough to be sent in several chunks
+    excel_data = os.urandom(300_000)
+    dispatcher = dispatcher_for(smtp_server)
+    job_id = submit(dispatcher, 'buyer@example.com', excel_data)
+    assert dispatcher.wait([job_id], timeout=10)
+    [(to_email, raw)] = smtp_server.messages
+    message = email.message_from_bytes(raw)
+    assert (message['To'], message['Subject']) == ('buyer@example.com', 'PO changes')
+    [attachment] = [part for part in message.walk() if part.get_filename()]
+    assert attachment.get_filename() == 'po_comparison.xlsx'
+    assert attachment.get_payload(decode=True) == excel_data
+    [body] = [part for part in message.walk() if part.get_content_type() == 'text/html']
+    assert 'See attached.' in body.get_payload(decode=True).decode()
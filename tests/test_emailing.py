@@ -0,0 +1,40 @@
+import email
+import io
+import os
+from datetime import datetime
+
+from conftest import random_weeks
+from po_compare.diff import compare_po_lines
+from po_compare.emailing import build_email_content, format_email_content, save_as_eml_file, summarize_results
+
+
+def test_cached_summary_is_stamped_when_formatted():
+    results_df = compare_po_lines(*random_weeks(0))
+    summary = summarize_results(results_df)
+    assert summary['total'] == len(results_df)
+    assert summary['split'] == (results_df['Status'] == 'Split').sum()
+
+    subject, body = format_email_content(summary, generated_at=datetime(2024, 11, 18, 9, 30))
+    assert subject == 'PO Comparison Results - 2024-11-18'
+    assert 'Generated: 2024-11-18 09:30:00' in body
+    later_subject, later_body = format_email_content(summary, generated_at=datetime(2024, 11, 25, 9, 30))
+    assert later_subject == 'PO Comparison Results - 2024-11-25'
+    assert later_body.replace('2024-11-25', '2024-11-18') == body
+    assert build_email_content(results_df)[1].split('Generated:')[0] == body.split('Generated:')[0]
+
+
+def test_eml_shares_the_export_buffer():
+    excel_data = os.urandom(200_000)
+    excel_file = io.BytesIO(excel_data)
+    excel_file.seek(123)
+    ok, view = save_as_eml_file('buyer@example.com', 'PO changes', 'Hello', excel_file, 'po.xlsx')
+    assert ok and isinstance(view, memoryview)
+    target = io.BytesIO()
+    assert save_as_eml_file('buyer@example.com', 'PO changes', 'Hello', excel_data, 'po.xlsx', target) == (True, target)
+
+    for raw in (bytes(view), target.getvalue()):
+        message = email.message_from_bytes(raw)
+        [attachment] = [part for part in message.walk() if part.get_filename()]
+        assert attachment.get_payload(decode=True) == excel_data
+    # The in-memory file was read through its buffer, not from its position
+    assert excel_file.tell() == 123
@@ -0,0 +1,23 @@
+import io
+
+import pandas as pd
+
+from conftest import random_weeks
+from po_compare.diff import compare_po_lines
+from po_compare.export import export_to_excel
+
+
+def test_excel_export_into_memory_or_target(tmp_path):
+    results_df = compare_po_lines(*random_weeks(0))
+    view = export_to_excel(results_df)
+    assert isinstance(view, memoryview)
+
+    target = io.BytesIO()
+    assert export_to_excel(results_df, target) is target
+    path = tmp_path / 'results.xlsx'
+    export_to_excel(results_df, str(path))
+
+    for source in (io.BytesIO(view), target, path):
+        df = pd.read_excel(source, sheet_name='Comparison Results')
+        assert df['PO_No'].astype(str).tolist() == results_df['PO_No'].astype(str).tolist()
+        assert df['Days_Pushed'].tolist() == results_df['Days_Pushed'].tolist()
@@ -0,0 +1,104 @@
+import csv
+import email
+import io
+import zipfile
+
+import pandas as pd
+import pytest
+
+from conftest import random_weeks
+from po_compare.diff import compare_po_lines
+from po_compare.fanout import build_messages, partition_results, read_routes, write_archive
+
+ROUTES = {'PN-2': 'buyer.a@example.com', 'PN-3': 'buyer.b@example.com', 'PN-4': 'buyer.b@example.com',
+          'PN-5': 'buyer.a@example.com'}
+
+
+@pytest.fixture(scope='module')
+def results_df():
+    results_df = compare_po_lines(*random_weeks(4, lines=200))
+    # A row without a part number is never routed, not even to the default recipient
+    results_df.loc[results_df.index[0], 'PN'] = None
+    return results_df
+
+
+def routed(results_df, column, routes, default=None):
+    """Each recipient's rows by plain boolean filtering, plus the unrouted row count"""
+    recipients = results_df[column].astype(object).map(
+        lambda value: None if pd.isna(value) else routes.get(str(value), default)
+    )
+    expected = {to: results_df[recipients == to] for to in sorted(set(recipients.dropna()))}
+    return expected, int(recipients.isna().sum())
+
+
+@pytest.mark.parametrize('default', [None, 'fallback@example.com'])
+def test_partitions_match_per_recipient_filters(results_df, default):
+    partitions, unrouted = partition_results(results_df, 'PN', ROUTES, default=default)
+    expected, expected_unrouted = routed(results_df, 'PN', ROUTES, default)
+    assert [to for to, _ in partitions] == list(expected)
+    for to, rows in partitions:
+        pd.testing.assert_frame_equal(rows, expected[to])
+    assert unrouted == expected_unrouted
+    assert sum(len(rows) for _, rows in partitions) + unrouted == len(results_df)
+    if default is None:
+        assert unrouted > 1
+    else:
+        assert unrouted == 1
+        assert 'fallback@example.com' in expected
+
+
+def test_partition_on_numeric_column(results_df):
+    # Routes are matched on each value's text, so numeric PO numbers route by their digits
+    po_no = next(value for value in results_df['PO_No'] if not str(value).startswith('PO'))
+    partitions, unrouted = partition_results(results_df, 'PO_No', {str(po_no): 'x@example.com'})
+    assert [(to, len(rows)) for to, rows in partitions] == [('x@example.com', (results_df['PO_No'] == po_no).sum())]
+    assert unrouted == len(results_df) - len(partitions[0][1])
+    assert partition_results(results_df.iloc[:0], 'PO_Type', ROUTES) == ([], 0)
+
+
+def test_read_routes(tmp_path):
+    path = tmp_path / 'routes.csv'
+    path.write_text('value,recipient\nStandard, a@example.com\nRush,\n4500000001,b@example.com\n', encoding='utf-8-sig')
+    expected = {'Standard': 'a@example.com', '4500000001': 'b@example.com'}
+    assert read_routes(str(path)) == expected
+    assert read_routes(io.BytesIO(path.read_bytes())) == expected
+
+
+def read_attachment(message_bytes):
+    message = email.message_from_bytes(message_bytes)
+    attachment = next(part for part in message.walk() if part.get_filename())
+    return message, attachment.get_filename(), pd.read_excel(io.BytesIO(attachment.get_payload(decode=True)))
+
+
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_archive_round_trip(results_df, tmp_path, max_workers):
+    partitions, _ = partition_results(results_df, 'PN', ROUTES, default='fallback@example.com')
+    messages = build_messages(partitions, 'po_comparison.xlsx', max_workers=max_workers)
+    assert [message['to'] for message in messages] == [to for to, _ in partitions]
+
+    target = tmp_path / 'outbox.zip'
+    write_archive(messages, str(target))
+    with zipfile.ZipFile(target) as archive:
+        manifest = list(csv.DictReader(io.StringIO(archive.read('manifest.csv').decode())))
+        assert [(row['recipient'], int(row['rows'])) for row in manifest] == \
+            [(to, len(rows)) for to, rows in partitions]
+        for row, (to, rows) in zip(manifest, partitions):
+            message, filename, attached = read_attachment(archive.read(row['file']))
+            assert message['To'] == to
+            assert filename == 'po_comparison.xlsx'
+            assert attached['PO_No'].astype(str).tolist() == rows['PO_No'].astype(str).tolist()
+            assert attached['Status'].tolist() == rows['Status'].astype(str).tolist()
+
+
+def test_archive_without_eml(results_df, tmp_path):
+    partitions, _ = partition_results(results_df, 'PN', {'PN-1': 'a@example.com', 'PN-2': 'b/c'})
+    messages = build_messages(partitions, 'lines.xlsx', eml=False, max_workers=1)
+    assert all(message['eml'] is None for message in messages)
+
+    target = io.BytesIO()
+    write_archive(messages, target)
+    with zipfile.ZipFile(target) as archive:
+        # The .xlsx goes in a folder per recipient, with unsafe characters replaced
+        assert archive.namelist() == ['a@example.com/lines.xlsx', 'b_c/lines.xlsx', 'manifest.csv']
+        for name, (_, rows) in zip(archive.namelist(), partitions):
+            assert len(pd.read_excel(io.BytesIO(archive.read(name)))) == len(rows)
@@ -0,0 +1,74 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from conftest import random_weeks
+from po_compare.diff import compare_po_lines
+from po_compare.filters import ResultIndex
+
+
+@pytest.fixture(scope='module')
+def results_df():
+    results_df = compare_po_lines(*random_weeks(3, lines=600))
+    # Some rows without a type or part number, which no type/prefix filter matches
+    results_df.loc[results_df.index[::17], 'PO_Type'] = None
+    results_df.loc[results_df.index[::13], 'PN'] = None
+    return results_df
+
+
+def plain_mask(df, statuses=None, alerts_only=False, po_types=None, pn_prefix=None, days_range=None):
+    """The same filters as ``ResultIndex.mask``, written as plain boolean column tests"""
+    mask = np.ones(len(df), dtype=bool)
+    if statuses is not None:
+        mask &= df['Status'].isin(statuses).to_numpy()
+    if alerts_only:
+        mask &= (df['Alert'] != '').to_numpy()
+    if po_types:
+        mask &= df['PO_Type'].isin(po_types).to_numpy()
+    if pn_prefix:
+        mask &= df['PN'].astype(object).map(lambda pn: isinstance(pn, str) and pn.startswith(pn_prefix)).to_numpy()
+    if days_range is not None:
+        low, high = days_range
+        if low is not None:
+            mask &= (df['Days_Pushed'] >= low).to_numpy()
+        if high is not None:
+            mask &= (df['Days_Pushed'] <= high).to_numpy()
+    return mask
+
+
+def test_counts(results_df):
+    index = ResultIndex(results_df)
+    counts = results_df['Status'].value_counts()
+    assert index.status_counts == {status: int(count) for status, count in counts.items()}
+    assert index.statuses == [status for status in results_df['Status'].cat.categories if counts[status]]
+    assert index.alert_count == (results_df['Alert'] != '').sum()
+    assert index.days_range() == (results_df['Days_Pushed'].min(), results_df['Days_Pushed'].max())
+
+
+def test_masks_match_plain_filtering(results_df):
+    index = ResultIndex(results_df)
+    # Every combination of these, including an empty status selection and one that never occurs
+    options = {
+        'statuses': [None, [], ['Pushed'], ['Pulled Back', 'Split', 'No Such Status']],
+        'alerts_only': [False, True],
+        'po_types': [None, ['Rush'], ['Standard', 'Rush']],
+        'pn_prefix': [None, 'PN-1', 'PN-22', 'XX'],
+        'days_range': [None, (None, 0), (3, None), (-5, 10)],
+    }
+    matched = set()
+    for values in itertools.product(*options.values()):
+        filters = dict(zip(options, values))
+        expected = plain_mask(results_df, **filters)
+        np.testing.assert_array_equal(index.mask(**filters), expected, err_msg=str(filters))
+        assert index.filter(**filters).equals(results_df[expected])
+        matched.add(int(expected.sum()))
+    # The combinations are not all empty or all rows
+    assert len(matched) > 10
+
+
+def test_empty_results():
+    index = ResultIndex(compare_po_lines(*random_weeks(0, lines=20, week_count=1) * 2))
+    assert len(index) == 0
+    assert index.days_range() == (0, 0)
+    assert index.mask(statuses=['Pushed'], pn_prefix='PN', days_range=(1, 2)).shape == (0,)
@@ -0,0 +1,161 @@
+import json
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from po_compare.alerts import AlertRules
+from po_compare.diff import compare_po_lines
+from po_compare.history import HistoryStore, main
+
+
+@pytest.fixture
+def store(tmp_path):
+    return HistoryStore(str(tmp_path / 'history.db'))
+
+
+def test_every_schedule_line_counts_once_per_run(week, store):
+    prev_df = week([('PO1', 10, 'PN-1', '2024-11-04'), ('PO1', 10, 'PN-1', '2024-11-10'),
+                    ('PO2', 10, 'PN-2', '2024-11-04')])
+    curr_df = week([('PO1', 10, 'PN-1', '2024-11-07'), ('PO1', 10, 'PN-1', '2024-11-20'),
+                    ('PO2', 10, 'PN-2', '2024-11-06')])
+    results_df = compare_po_lines(prev_df, curr_df, duplicates='all')
+    assert results_df['Schedule_Line'].tolist() == [1, 2, 1]
+
+    # PO1/10 was pushed on both schedule lines: its largest push is kept, whatever the row order
+    assert store.record_run(results_df.iloc[::-1], 'run-1', recorded_at=datetime(2024, 11, 11)) == 2
+    assert store.pushes_for_line('PO1_10')[['days_pushed', 'from_date', 'to_date']].values.tolist() == \
+        [[10, '2024-11-10', '2024-11-20']]
+    assert store.record_run(results_df, 'run-1') == 0
+
+    # A later run of the same line is a second push, not dropped as a duplicate of the first
+    assert store.record_run(results_df, 'run-2', recorded_at=datetime(2024, 11, 18)) == 2
+    summary = store.push_summary(['PO1_10', 'PO2_10'])
+    assert summary.loc['PO1_10', ['push_count', 'days_pushed']].tolist() == [2, 20]
+    assert summary.loc['PO2_10', ['push_count', 'days_pushed']].tolist() == [2, 4]
+
+
+def weeks_of_pushes(week):
+    """Three weeks: PO1/10 is pushed twice, PO2/10 pulled back, PO3/10 pushed in the last week only"""
+    dates = [
+        ('2024-11-04', '2024-11-05', '2024-11-06'),
+        ('2024-11-09', '2024-11-01', '2024-11-06'),
+        ('2024-11-12', '2024-11-01', '2024-11-16'),
+    ]
+    return [week([('PO1', 10, 'PN-1', po1), ('PO2', 10, 'PN-2', po2), ('PO3', 10, 'PN-1', po3)])
+            for po1, po2, po3 in dates]
+
+
+def by_po(results_df):
+    return results_df.set_index(results_df['PO_No'].astype(str))
+
+
+def test_pushes_are_counted_across_runs(week, store):
+    week1, week2, week3 = weeks_of_pushes(week)
+    first = by_po(compare_po_lines(week1, week2, history=store, run_id='run-1'))
+    assert first.loc['PO1', ['Status', 'Push_Count', 'Cum_Days_Pushed']].tolist() == ['Pushed', 1, 5]
+    assert first.loc['PO2', ['Status', 'Push_Count', 'Cum_Days_Pushed']].tolist() == ['Pulled Back', 0, 0]
+    assert pd.isna(first.loc['PO2', 'First_Push_Date'])
+    assert store.record_run(first, 'run-1', recorded_at=datetime(2024, 11, 11, 9, 30)) == 1
+
+    second = by_po(compare_po_lines(week2, week3, history=store, run_id='run-2'))
+    assert second.loc['PO1', ['Status', 'Push_Count', 'Cum_Days_Pushed']].tolist() == ['Re-Pushed', 2, 8]
+    assert second.loc['PO1', 'First_Push_Date'] == pd.Timestamp('2024-11-11')
+    assert second.loc['PO3', ['Status', 'Push_Count', 'Cum_Days_Pushed']].tolist() == ['Pushed', 1, 10]
+    assert second.loc['PO3', 'First_Push_Date'] == pd.Timestamp.now().normalize()
+    assert 'PO2' not in second.index
+
+    # History replaces the >7-day estimate: a long first push is 'Pushed', and rules can read the counts
+    rules = AlertRules([{'name': 'Twice', 'push_count_at_least': 2}])
+    second = by_po(compare_po_lines(week2, week3, history=store, run_id='run-2', alert_rules=rules))
+    assert second['Alert_Rule'].to_dict() == {'PO1': 'Twice', 'PO3': ''}
+
+
+def test_rerunning_a_recorded_run_does_not_count_itself(week, store):
+    week1, week2, _ = weeks_of_pushes(week)
+    results_df = compare_po_lines(week1, week2, history=store, run_id='run-1')
+    store.record_run(results_df, 'run-1')
+
+    rerun = by_po(compare_po_lines(week1, week2, history=store, run_id='run-1'))
+    assert rerun.loc['PO1', ['Status', 'Push_Count', 'Cum_Days_Pushed']].tolist() == ['Pushed', 1, 5]
+    assert store.record_run(rerun, 'run-1') == 0
+    # Under another run ID the same push is a re-push
+    other = by_po(compare_po_lines(week1, week2, history=store, run_id='run-x'))
+    assert other.loc['PO1', ['Status', 'Push_Count', 'Cum_Days_Pushed']].tolist() == ['Re-Pushed', 2, 10]
+
+
+def test_push_summary_in_one_lookup(store):
+    results_df = pd.DataFrame({
+        'PO_No': ['PO1', 'PO2', 'PO1'],
+        'PO_Line': ['10', '10', '20'],
+        'PN': ['PN-1', 'PN-2', 'PN-1'],
+        'Days_Pushed': [4, 6, -2],
+        'Status': ['Pushed', 'Re-Pushed (>7 days)', 'Pulled Back'],
+        'Prev_ComDate': pd.to_datetime(['2024-11-01'] * 3),
+        'Curr_ComDate': pd.to_datetime(['2024-11-05', '2024-11-07', '2024-10-30']),
+    })
+    store.record_run(results_df, 'run-1', recorded_at=datetime(2024, 11, 4))
+    store.record_run(results_df.iloc[:1], 'run-2', recorded_at=datetime(2024, 11, 11))
+
+    summary = store.push_summary(['PO1_10', 'PO2_10', 'PO1_20', 'PO9_10'])
+    assert sorted(summary.index) == ['PO1_10', 'PO2_10']
+    assert summary.loc['PO1_10', ['push_count', 'days_pushed']].tolist() == [2, 8]
+    assert summary.loc['PO1_10', 'first_push'] == pd.Timestamp('2024-11-04')
+    assert store.push_summary(['PO1_10'], exclude_run_id='run-1').loc['PO1_10', 'push_count'] == 1
+    assert store.pushes_for_pn('PN-1')['run_id'].tolist() == ['run-1', 'run-2']
+
+
+LEGACY_HISTORY = {
+    # Bare push counts, without details
+    'PO001_1': 2,
+    # Detailed pushes, plus one counted without details
+    '4500123456_10': {
+        'po_no': 4500123456,
+        'po_line': 10,
+        'pn': 'PN-001-A',
+        'push_count': 3,
+        'pushes': [
+            {'date': '2025-11-09T13:11:02.298632', 'days_pushed': 5,
+             'from_date': '2024-11-15 00:00:00', 'to_date': '2024-11-20 00:00:00'},
+            {'date': '2025-11-16T09:00:00.000001', 'days_pushed': 4,
+             'from_date': '2024-11-20 00:00:00', 'to_date': '2024-11-24 00:00:00'},
+        ]
+    }
+}
+
+
+def test_legacy_json_import(tmp_path, store):
+    json_path = tmp_path / 'po_history.json'
+    json_path.write_text(json.dumps(LEGACY_HISTORY), encoding='utf-8')
+    assert store.import_legacy_json(str(json_path)) == 5
+
+    counts = store.pushes_for_line('PO001_1')
+    assert counts['run_id'].tolist() == ['legacy-count-1', 'legacy-count-2']
+    assert (counts['po_no'].tolist(), counts['po_line'].tolist()) == (['PO001'] * 2, ['1'] * 2)
+    assert counts[['pn', 'days_pushed', 'from_date', 'to_date']].isna().all().all()
+
+    line = store.pushes_for_line('4500123456_10').set_index('run_id')
+    assert line[['po_no', 'po_line', 'pn']].drop_duplicates().values.tolist() == [['4500123456', '10', 'PN-001-A']]
+    # The push counted without details has no date, so it sorts first
+    assert line.index.tolist() == ['legacy-count-3', 'legacy-2025-11-09T13:11:02.298632',
+                                   'legacy-2025-11-16T09:00:00.000001']
+    assert line[['days_pushed', 'from_date', 'to_date']].iloc[1:].values.tolist() == [
+        [5, '2024-11-15', '2024-11-20'], [4, '2024-11-20', '2024-11-24']
+    ]
+
+    summary = store.push_summary(['PO001_1', '4500123456_10'])
+    assert summary['push_count'].to_dict() == {'4500123456_10': 3, 'PO001_1': 2}
+    assert summary.loc['4500123456_10', 'days_pushed'] == 9
+
+    # Importing again (e.g. the app finding the JSON file next to an emptied store) adds nothing
+    assert store.import_legacy_json(str(json_path)) == 0
+    assert store.push_summary(['PO001_1', '4500123456_10'])['push_count'].sum() == 5
+
+
+def test_legacy_migration_command(tmp_path):
+    json_path, db_path = tmp_path / 'po_history.json', tmp_path / 'po_history.db'
+    assert main([str(json_path), str(db_path)]) == 1
+    json_path.write_text(json.dumps(LEGACY_HISTORY), encoding='utf-8')
+    assert main([str(json_path), str(db_path)]) == 0
+    assert main([str(json_path), str(db_path)]) == 0
+    assert len(HistoryStore(str(db_path)).pushes_for_pn('PN-001-A')) == 3
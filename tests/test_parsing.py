@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from po_compare import parsing
+from po_compare.baseline import compare_incremental
+from po_compare.diff import compare_po_lines
+from po_compare.timeline import build_timeline
+
+
+def test_text_keys_are_categorical(week):
+    df = week([('PO001', 10, 'PN-1', '2024-11-04'), ('PO002', 10, 'PN-2', '2024-11-05')])
+    assert df['PO_No'].dtype == 'category'
+    assert df['PO_Line'].dtype == np.uint8
+
+
+def test_key_types_do_not_change_line_keys(week):
+    text = week([('4500000001', '10', 'PN-1', '2024-11-04')])
+    numeric = week([(4500000001, 10, 'PN-1', '2024-11-11')])
+    assert text['PO_LineID'].tolist() == numeric['PO_LineID'].tolist()
+    results = compare_po_lines(text, numeric)
+    assert results['Days_Pushed'].tolist() == [7]
+
+
+def test_line_key_collision_is_reported(week, monkeypatch):
+    # Every value hashing alike makes distinct lines share a key
+    monkeypatch.setattr(parsing.pd.util, 'hash_array', lambda values: np.zeros(len(values), dtype=np.uint64))
+    with pytest.raises(ValueError, match='collision'):
+        week([('PO001', 10, 'PN-1', '2024-11-04'), ('PO002', 10, 'PN-2', '2024-11-05')])
+    # Repeated rows of one line are not a collision
+    df = week([('PO001', 10, 'PN-1', '2024-11-04'), ('PO001', 10, 'PN-1', '2024-11-05')])
+    assert df['PO_LineID'].nunique() == 1
+
+
+@pytest.mark.parametrize('prev_po, curr_po', [('PO001', 'PO002'), (4500000001, 4500000002), ('PO001', 4500000002)])
+def test_line_key_collision_across_weeks_is_reported(week, monkeypatch, prev_po, curr_po):
+    monkeypatch.setattr(parsing.pd.util, 'hash_array', lambda values: np.zeros(len(values), dtype=np.uint64))
+    # Each week alone is fine, but the weeks' lines share a key
+    prev_df = week([(prev_po, 10, 'PN-1', '2024-11-04'), (prev_po, 10, 'PN-1', '2024-11-06')])
+    curr_df = week([(curr_po, 10, 'PN-1', '2024-11-11')])
+    for compare in (compare_po_lines, compare_incremental, lambda *weeks: build_timeline(weeks)):
+        with pytest.raises(ValueError, match='collision'):
+            compare(prev_df, curr_df)
+    # The same line in both weeks, even read as text in one and as a number in the other
+    same_df = week([(str(prev_po), '10', 'PN-1', '2024-11-11')])
+    assert compare_po_lines(prev_df, same_df)['Days_Pushed'].tolist() == [7]
@@ -0,0 +1,72 @@
+import resource
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from conftest import random_weeks, write_extract
+from po_compare.diff import compare_po_lines
+from po_compare.partitioned import (OPEN_FILES_HEADROOM, compare_out_of_core, compare_partitioned, count_rows,
+                                    max_open_writers, write_partitions)
+
+
+def canonical(results_df):
+    results_df = results_df.astype({col: str for col in ('PO_No', 'PO_Line', 'PN', 'PWO', 'PO_Type', 'Status')})
+    return results_df.sort_values(['PO_No', 'PO_Line', 'Status', 'Curr_ComDate']).reset_index(drop=True)
+
+
+@pytest.mark.parametrize('suffix', ['.csv', '.xlsx'])
+def test_out_of_core_matches_in_memory(tmp_path, suffix):
+    prev_df, curr_df = random_weeks(5, lines=2000)
+    paths = [tmp_path / f'prev{suffix}', tmp_path / f'curr{suffix}']
+    for df, path in zip((prev_df, curr_df), paths):
+        write_extract(df, path)
+    assert [count_rows(str(path)) for path in paths] == [len(prev_df), len(curr_df)]
+
+    for duplicates in ('first', 'all'):
+        expected = compare_po_lines(prev_df, curr_df, duplicates=duplicates)
+        # A 1 MB budget spreads the weeks over several partitions
+        parts = list(compare_out_of_core(*map(str, paths), memory_mb=1, work_dir=str(tmp_path),
+                                         duplicates=duplicates))
+        assert len(parts) > 1
+        pd.testing.assert_frame_equal(canonical(pd.concat(parts, ignore_index=True)), canonical(expected),
+                                      check_dtype=False)
+    # The partitions are removed afterwards
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(path.name for path in paths)
+
+
+def test_open_writers_stay_under_the_file_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(resource, 'getrlimit', lambda _: (OPEN_FILES_HEADROOM + 40, resource.RLIM_INFINITY))
+    assert max_open_writers() == 40
+
+    open_now, most_open = 0, 0
+
+    class CountingWriter(pq.ParquetWriter):
+        def __init__(self, *args, **kwargs):
+            nonlocal open_now, most_open
+            super().__init__(*args, **kwargs)
+            open_now += 1
+            most_open = max(most_open, open_now)
+
+        def close(self):
+            nonlocal open_now
+            open_now -= 1
+            super().close()
+
+    monkeypatch.setattr(pq, 'ParquetWriter', CountingWriter)
+    prev_df, curr_df = random_weeks(6, lines=2000)
+    dirs = []
+    for role, df in (('prev', prev_df), ('curr', curr_df)):
+        write_extract(df, tmp_path / f'{role}.csv')
+        directory = str(tmp_path / role)
+        manifest = write_partitions(str(tmp_path / f'{role}.csv'), directory, 64, chunk_rows=250, open_writers=4)
+        # Recycled writers continue their partition in further segments
+        assert sum(manifest['segments']) > 64
+        dirs.append(directory)
+    assert most_open == 4 and open_now == 0
+
+    for duplicates in ('first', 'all'):
+        parts = [part for part in compare_partitioned(*dirs, duplicates=duplicates) if len(part)]
+        pd.testing.assert_frame_equal(canonical(pd.concat(parts, ignore_index=True)),
+                                      canonical(compare_po_lines(prev_df, curr_df, duplicates=duplicates)),
+                                      check_dtype=False)
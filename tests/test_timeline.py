@@ -0,0 +1,62 @@
+import pandas as pd
+import pytest
+
+from conftest import random_weeks
+from po_compare.diff import _detect_date_changes, dedupe_lines
+from po_compare.timeline import build_timeline, push_trajectories, timeline_changes
+
+CHANGE_COLUMNS = ['PO_No', 'PO_Line', 'Prev_ComDate', 'Curr_ComDate', 'Days_Pushed', 'Status']
+
+
+def snapshots(seed):
+    """Five weeks of the same lines; some lines are missing from the third week"""
+    weeks = random_weeks(seed, week_count=5)
+    weeks[2] = weeks[2].sample(frac=0.85, random_state=seed).sort_index()
+    return weeks
+
+
+def pairwise_changes(weeks, labels, duplicates):
+    """Consecutive two-week comparisons, one after the other"""
+    frames = [
+        _detect_date_changes(prev_df, curr_df, duplicates).assign(Prev_Week=labels[i], Week=labels[i + 1])
+        for i, (prev_df, curr_df) in enumerate(zip(weeks, weeks[1:]))
+    ]
+    return pd.concat(frames, ignore_index=True)
+
+
+def plain(changes):
+    return changes[['Prev_Week', 'Week'] + CHANGE_COLUMNS].astype(
+        {col: str for col in ('Prev_Week', 'Week', 'PO_No', 'PO_Line', 'Status')}
+    ).reset_index(drop=True)
+
+
+@pytest.mark.parametrize('duplicates', ['first', 'earliest', 'latest'])
+@pytest.mark.parametrize('seed', [0, 1])
+def test_timeline_matches_consecutive_pairs(seed, duplicates):
+    weeks = snapshots(seed)
+    labels = [f"W{n}" for n in range(len(weeks))]
+    timeline = build_timeline(weeks, labels=labels, duplicates=duplicates)
+    changes = timeline_changes(timeline)
+    expected = pairwise_changes(weeks, labels, duplicates)
+    assert len(expected) > 100
+    # Same rows, in the same order: week by week, each in current-week file order
+    pd.testing.assert_frame_equal(plain(changes), plain(expected), check_dtype=False)
+    assert changes['Alert'].eq('🚨 ALERT').tolist() == (changes['Days_Pushed'] > 7).tolist()
+
+    trajectories = push_trajectories(timeline, changes).set_index(['PO_No', 'PO_Line'])
+    week_dates = [
+        {(po_no, po_line): com_date
+         for po_no, po_line, com_date in dedupe_lines(week, duplicates)[['PO_No', 'PO_Line', 'ComDate']].itertuples(
+             index=False, name=None)}
+        for week in weeks
+    ]
+    per_line = expected.groupby(['PO_No', 'PO_Line'], sort=False, observed=True)['Days_Pushed']
+    assert len(trajectories) == per_line.ngroups
+    for key, days in per_line:
+        row = trajectories.loc[key]
+        assert (row['Pushes'], row['Pull_Backs']) == ((days > 0).sum(), (days < 0).sum())
+        assert (row['Net_Days_Pushed'], row['Max_Push_Days']) == (days.sum(), days.max())
+        for label, dates in zip(labels, week_dates):
+            # NaT both when the line is undated and when it is missing from the week
+            got, want = row[f"ComDate {label}"], dates.get(key, pd.NaT)
+            assert (pd.isna(got) and pd.isna(want)) or got == want
@@ -0,0 +1,22 @@
+import os
+
+import pytest
+
+from po_compare.warmup import IMPORT_BUDGETS, IMPORT_PRELOADS, check_import_budgets, measure_import
+
+# Wall-clock budgets depend on the machine's load, so they are only asserted on request
+TIMED = os.environ.get('PO_COMPARE_IMPORT_BUDGETS') == '1'
+
+
+@pytest.mark.parametrize('module', list(IMPORT_BUDGETS))
+def test_import_defers_dependencies(module):
+    _, loaded = measure_import(module, IMPORT_PRELOADS.get(module, 'pandas'))
+    unexpected = [name for name in IMPORT_BUDGETS[module][1] if name in loaded]
+    assert not unexpected, f"{module} loads {unexpected}"
+
+
+@pytest.mark.skipif(not TIMED, reason='set PO_COMPARE_IMPORT_BUDGETS=1 to check import times')
+@pytest.mark.parametrize('module', list(IMPORT_BUDGETS))
+def test_import_budget(module):
+    [(_, ms, budget_ms, _, ok)] = check_import_budgets({module: IMPORT_BUDGETS[module]})
+    assert ok, f"{module} took {ms:.1f} ms to import (budget {budget_ms} ms)"